@@ -0,0 +1,291 @@
+"""
+Agregasi histori satu device per bucket waktu (5m/1h/1d) untuk grafik,
+sehingga klien menerima satu baris per bucket, bukan semua pembacaan mentah.
+
+- Hanya avg/min/max/count: dihitung dari tabel rollup (sensor_rollup_1m
+  untuk bucket 5m, _1h, _1d), jadi juga mencakup data yang sudah diarsip
+  atau dihapus retensi.
+- Dengan stddev atau persentil (p50, p95, p99.9, ...): dari data mentah.
+  sensor_data diagregasi di SQL (date_bin, stddev_samp, percentile_cont);
+  bulan yang sudah diarsip (app/archive.py) dengan NumPy langsung dari file
+  kolomnya.
+
+count per parameter = jumlah nilai non-null parameter tersebut (nilai null
+tidak ikut rata-rata); count bucket = jumlah pembacaan.
+
+Bucket sejajar dengan awal jam/hari (timestamp device); start dibulatkan ke
+bawah dan end ke atas ke batas bucket.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import archive, models, rollups
+from app.partitioning import add_months
+
+AGGREGATE_MAX_BUCKETS = int(os.getenv("AGGREGATE_MAX_BUCKETS", "5000"))
+
+SENSOR_FIELDS = models.SENSOR_FIELDS
+ORIGIN = datetime(2000, 1, 1)
+
+# bucket -> (lebar, resolusi rollup sumber)
+BUCKETS = {
+    "5m": (timedelta(minutes=5), "1m"),
+    "1h": (timedelta(hours=1), "1h"),
+    "1d": (timedelta(days=1), "1d"),
+}
+
+# agregat -> ekspresi SQL di sensor_data
+SQL_AGGREGATES = {
+    "avg": "AVG({})",
+    "min": "MIN({})",
+    "max": "MAX({})",
+    "count": "COUNT({})",
+    "stddev": "STDDEV_SAMP({})",
+}
+ROLLUP_AGGREGATES = ("avg", "min", "max", "count")
+
+_PERCENTILE = re.compile(r"^p(100|\d{1,2}(\.\d+)?)$")
+
+
+def _split(value: str) -> List[str]:
+    return list(dict.fromkeys(part.strip() for part in value.split(",") if part.strip()))
+
+
+def parse_fields(value: Optional[str]) -> List[str]:
+    if not value:
+        return list(SENSOR_FIELDS)
+    fields = _split(value)
+    unknown = [field for field in fields if field not in SENSOR_FIELDS]
+    if unknown or not fields:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {', '.join(unknown)}")
+    return fields
+
+
+def parse_aggregates(value: str) -> List[str]:
+    aggregates = _split(value)
+    unknown = [agg for agg in aggregates if agg not in SQL_AGGREGATES and not _PERCENTILE.match(agg)]
+    if unknown or not aggregates:
+        raise HTTPException(status_code=400, detail=f"Unknown aggregate: {', '.join(unknown)}")
+    return aggregates
+
+
+def _fractions(aggregates: List[str]) -> List[float]:
+    return [float(agg[1:]) / 100 for agg in aggregates if _PERCENTILE.match(agg)]
+
+
+def align_range(start: datetime, end: datetime, width: timedelta) -> Tuple[datetime, datetime]:
+    start = start - (start - ORIGIN) % width
+    remainder = (end - ORIGIN) % width
+    if remainder:
+        end = end + (width - remainder)
+    return start, end
+
+
+def _from_rollups(db: Session, device_id: int, start: datetime, end: datetime, width: timedelta,
+                  resolution: str, fields: List[str], aggregates: List[str]) -> List[Dict]:
+    table = rollups.RESOLUTIONS[resolution][0].__tablename__
+    columns = ["SUM(count) AS count"]
+    for field in fields:
+        columns += [f"MIN({field}_min) AS {field}_min", f"MAX({field}_max) AS {field}_max",
+                    f"SUM({field}_sum) AS {field}_sum", f"SUM({field}_count) AS {field}_count"]
+    rows = db.execute(
+        text(
+            f"""
+            SELECT date_bin(:width, bucket, :origin) AS bucket, {", ".join(columns)}
+            FROM {table}
+            WHERE device_id = :device_id AND bucket >= :start AND bucket < :end
+            GROUP BY 1
+            ORDER BY 1
+            """
+        ),
+        {"width": width, "origin": ORIGIN, "device_id": device_id, "start": start, "end": end}
+    ).mappings().all()
+
+    result = []
+    for row in rows:
+        count = int(row["count"])
+        item = {"bucket": row["bucket"], "count": count}
+        for field in fields:
+            field_count = int(row[f"{field}_count"])
+            values = {
+                "avg": rollups.average(row[f"{field}_sum"], field_count),
+                "min": row[f"{field}_min"],
+                "max": row[f"{field}_max"],
+                "count": field_count,
+            }
+            item[field] = {agg: values[agg] for agg in aggregates}
+        result.append(item)
+    return result
+
+
+def _from_sensor_data(db: Session, device_id: int, start: datetime, end: datetime, width: timedelta,
+                      fields: List[str], aggregates: List[str],
+                      excluded: List[Tuple[datetime, datetime]]) -> List[Dict]:
+    fractions = _fractions(aggregates)
+    plain = [agg for agg in aggregates if agg in SQL_AGGREGATES]
+    columns = ["COUNT(*) AS count"]
+    for field in fields:
+        quoted = rollups.quote(field)
+        columns += [f"{SQL_AGGREGATES[agg].format(quoted)} AS {field}_{agg}" for agg in plain]
+        if fractions:
+            columns.append(
+                f"percentile_cont(CAST(:fractions AS DOUBLE PRECISION[])) "
+                f"WITHIN GROUP (ORDER BY {quoted}) AS {field}_percentiles"
+            )
+
+    params = {"width": width, "origin": ORIGIN, "device_id": device_id, "start": start, "end": end,
+              "fractions": fractions}
+    # Bulan yang sudah diarsip dihitung dari file arsip (lihat _from_archive)
+    conditions = []
+    for i, (lo, hi) in enumerate(excluded):
+        conditions.append(f"AND NOT (timestamp >= :excluded_lo_{i} AND timestamp < :excluded_hi_{i})")
+        params[f"excluded_lo_{i}"] = lo
+        params[f"excluded_hi_{i}"] = hi
+
+    rows = db.execute(
+        text(
+            f"""
+            SELECT date_bin(:width, timestamp, :origin) AS bucket, {", ".join(columns)}
+            FROM sensor_data
+            WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end
+            {" ".join(conditions)}
+            GROUP BY 1
+            ORDER BY 1
+            """
+        ),
+        params
+    ).mappings().all()
+
+    percentiles = [agg for agg in aggregates if _PERCENTILE.match(agg)]
+    result = []
+    for row in rows:
+        item = {"bucket": row["bucket"], "count": int(row["count"])}
+        for field in fields:
+            values = {agg: row[f"{field}_{agg}"] for agg in plain}
+            if percentiles:
+                computed = row[f"{field}_percentiles"] or [None] * len(percentiles)
+                values.update(zip(percentiles, computed))
+            item[field] = {agg: values[agg] for agg in aggregates}
+        result.append(item)
+    return result
+
+
+def _to_float(value) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def aggregate_columns(columns: Dict[str, np.ndarray], width: timedelta, fields: List[str],
+                      aggregates: List[str]) -> List[Dict]:
+    """
+    Agregasi kolom pembacaan (terurut timestamp, NaN = null) per bucket
+    dengan operasi vektor NumPy; hasilnya sama dengan jalur SQL.
+    """
+    timestamps = columns["timestamp"]
+    if not len(timestamps):
+        return []
+    origin = np.datetime64(ORIGIN, "us")
+    step = np.timedelta64(width, "us")
+    keys, starts, sizes = np.unique((timestamps - origin) // step, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(keys)), sizes)
+
+    result = [
+        {"bucket": bucket, "count": int(size)}
+        for bucket, size in zip((origin + keys * step).tolist(), sizes)
+    ]
+    percentiles = [agg for agg in aggregates if _PERCENTILE.match(agg)]
+    for field in fields:
+        values = np.asarray(columns[field], dtype=np.float64)
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        empty = counts == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.add.reduceat(np.where(valid, values, 0.0), starts) / counts
+            stats = {
+                "avg": means,
+                "min": np.where(empty, np.nan, np.minimum.reduceat(np.where(valid, values, np.inf), starts)),
+                "max": np.where(empty, np.nan, np.maximum.reduceat(np.where(valid, values, -np.inf), starts)),
+            }
+            if "stddev" in aggregates:
+                deviation = np.where(valid, values - np.repeat(means, sizes), 0.0)
+                variance = np.add.reduceat(deviation ** 2, starts) / (counts - 1)
+                stats["stddev"] = np.where(counts < 2, np.nan, np.sqrt(variance))
+        if percentiles:
+            # Urut per bucket, NaN di akhir; interpolasi linier seperti percentile_cont
+            ordered = values[np.lexsort((values, group))]
+            last = len(ordered) - 1
+            for agg, fraction in zip(percentiles, _fractions(percentiles)):
+                position = starts + fraction * np.maximum(counts - 1, 0)
+                lo = np.clip(np.floor(position).astype(np.int64), 0, last)
+                hi = np.clip(np.ceil(position).astype(np.int64), 0, last)
+                value = ordered[lo] + (ordered[hi] - ordered[lo]) * (position - lo)
+                stats[agg] = np.where(empty, np.nan, value)
+
+        for i, item in enumerate(result):
+            item[field] = {
+                agg: int(counts[i]) if agg == "count" else _to_float(stats[agg][i])
+                for agg in aggregates
+            }
+    return result
+
+
+def _from_archive(db: Session, entry: models.SensorArchive, start: datetime, end: datetime,
+                  width: timedelta, fields: List[str], aggregates: List[str]) -> List[Dict]:
+    columns = archive.open_columns(entry.path)
+    timestamps = columns["timestamp"]
+    lo = int(np.searchsorted(timestamps, np.datetime64(start, "us"), side="left"))
+    hi = int(np.searchsorted(timestamps, np.datetime64(end, "us"), side="left"))
+    columns = {name: values[lo:hi] for name, values in columns.items()}
+
+    # Data terlambat yang masuk sensor_data setelah bulan ini diarsip
+    live = db.execute(
+        text(
+            f"""
+            SELECT id, timestamp, {", ".join(rollups.quote(f) for f in SENSOR_FIELDS)}
+            FROM sensor_data
+            WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end
+            """
+        ),
+        {"device_id": entry.device_id, "start": start, "end": end}
+    ).all()
+    if live:
+        columns = archive.merge_columns(columns, archive.to_columns(live))
+    return aggregate_columns(columns, width, fields, aggregates)
+
+
+def aggregate_history(db: Session, device_id: int, start: datetime, end: datetime, bucket: str,
+                      fields: List[str], aggregates: List[str]) -> List[Dict]:
+    """
+    Satu item per bucket yang berisi data:
+    {bucket, count, <param>: {<agregat>: nilai}} untuk parameter di `fields`.
+    """
+    width, resolution = BUCKETS[bucket]
+    start, end = align_range(start, end, width)
+    if (end - start) / width > AGGREGATE_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large for bucket {bucket} (max {AGGREGATE_MAX_BUCKETS} buckets)"
+        )
+
+    if all(agg in ROLLUP_AGGREGATES for agg in aggregates):
+        return _from_rollups(db, device_id, start, end, width, resolution, fields, aggregates)
+
+    months = []
+    for entry in archive.archived_months(db, device_id, start, end):
+        month_lo = datetime.combine(entry.month, datetime.min.time())
+        month_hi = datetime.combine(add_months(entry.month, 1), datetime.min.time())
+        months.append((entry, max(start, month_lo), min(end, month_hi)))
+
+    result = _from_sensor_data(db, device_id, start, end, width, fields, aggregates,
+                               [(lo, hi) for _, lo, hi in months])
+    for entry, lo, hi in months:
+        if lo < hi:
+            result += _from_archive(db, entry, lo, hi, width, fields, aggregates)
+    result.sort(key=lambda item: item["bucket"])
+    return result
@@ -0,0 +1,388 @@
+"""
+Arsip dingin sensor_data. Pembacaan yang lebih tua dari ARCHIVE_AFTER_DAYS
+dipindahkan per device per bulan ke file kolom di ARCHIVE_DIR lalu dihapus
+dari Postgres, sehingga tabel (dan index-nya) tetap kecil. Manifest ada di
+tabel sensor_archive.
+
+    ARCHIVE_DIR/<device_id>/<YYYY-MM>-<versi>/{id,timestamp,suhu,ph,do,tds,ammonia,salinitas}.npy
+
+Setiap kolom adalah file .npy terpisah (timestamp datetime64[us] terurut,
+nilai float64 dengan NaN untuk NULL). Pembacaan rentang hanya memetakan file
+(mmap) dan memotong lewat binary search di kolom timestamp, jadi arsip
+bertahun-tahun tidak perlu dimuat ke memori. `GET /sensor/`,
+`GET /admin/sensor` (lewat app/sensor_history.py) dan `POST /export/csv`
+menggabungkan arsip dengan baris live secara transparan.
+
+    python -m app.archive run [--before YYYY-MM-DD]
+"""
+import argparse
+import heapq
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from prometheus_client import Counter
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from app import etags, models
+from app.database import engine
+from app.partitioning import add_months, month_start
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
+# File arsip ditulis satu replika dan dibaca semua replika, jadi ARCHIVE_DIR
+# harus volume bersama (mis. PVC ReadWriteMany di k8s/api.yaml). Archiver
+# menolak jalan sampai ini dinyatakan true.
+ARCHIVE_SHARED_STORAGE = os.getenv("ARCHIVE_SHARED_STORAGE", "false").strip().lower() in ("1", "true", "yes")
+
+# Advisory lock agar hanya satu replika yang mengarsipkan
+ARCHIVE_LOCK_KEY = 720013
+
+SENSOR_FIELDS = models.SENSOR_FIELDS
+COLUMNS = ("id", "timestamp") + SENSOR_FIELDS
+
+ARCHIVE_ROWS = Counter(
+    "aquanotes_archive_rows_total",
+    "Baris sensor_data yang dipindahkan ke arsip dingin"
+)
+
+
+class ArchivedReading(NamedTuple):
+    # Atribut sama dengan models.SensorData agar bisa dipakai bergantian
+    id: int
+    device_id: int
+    timestamp: datetime
+    suhu: Optional[float]
+    ph: Optional[float]
+    do: Optional[float]
+    tds: Optional[float]
+    ammonia: Optional[float]
+    salinitas: Optional[float]
+
+
+def _full_path(path: str) -> str:
+    return os.path.join(ARCHIVE_DIR, path)
+
+
+@lru_cache(maxsize=256)
+def open_columns(path: str) -> Dict[str, np.ndarray]:
+    """
+    Kolom satu arsip (path relatif dari manifest) sebagai {nama: array}
+    read-only, terurut menurut timestamp.
+    """
+    # Direktori arsip tidak pernah diubah setelah ditulis (versi baru = path
+    # baru), jadi mmap aman di-cache per path
+    return {
+        name: np.load(os.path.join(_full_path(path), f"{name}.npy"), mmap_mode="r")
+        for name in COLUMNS
+    }
+
+
+def to_columns(rows) -> Dict[str, np.ndarray]:
+    """
+    Baris sensor_data (kolom COLUMNS) ke bentuk kolom yang sama dengan arsip.
+    """
+    columns = {
+        "id": np.array([row.id for row in rows], dtype=np.int64),
+        "timestamp": np.array([row.timestamp for row in rows], dtype="datetime64[us]"),
+    }
+    for field in SENSOR_FIELDS:
+        # None -> NaN
+        columns[field] = np.array([row._mapping[field] for row in rows], dtype=np.float64)
+    return columns
+
+
+def merge_columns(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Gabungkan arsip lama dengan baris baru (data terlambat untuk bulan yang
+    sudah diarsipkan). Timestamp yang sama: versi arsip yang dipertahankan.
+    """
+    merged = {name: np.concatenate([old[name], new[name]]) for name in COLUMNS}
+    order = np.argsort(merged["timestamp"], kind="stable")
+    timestamps = merged["timestamp"][order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = timestamps[1:] != timestamps[:-1]
+    return {name: merged[name][order[keep]] for name in COLUMNS}
+
+
+def _write_columns(path: str, columns: Dict[str, np.ndarray]) -> None:
+    target = _full_path(path)
+    staging = target + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, values in columns.items():
+        with open(os.path.join(staging, f"{name}.npy"), "wb") as f:
+            np.save(f, values)
+            f.flush()
+            os.fsync(f.fileno())
+    os.rename(staging, target)
+
+
+def archive_month(device_id: int, month: date) -> int:
+    """
+    Pindahkan sensor_data satu device untuk satu bulan ke arsip. File ditulis
+    lebih dulu; manifest dan DELETE di-commit dalam satu transaksi, sehingga
+    kegagalan di tengah jalan tidak menghilangkan data.
+    """
+    start = datetime.combine(month, datetime.min.time())
+    params = {"device_id": device_id, "start": start, "end": datetime.combine(add_months(month, 1), datetime.min.time())}
+    new_path = None
+    old_path = None
+    try:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    """
+                    SELECT id, timestamp, suhu, ph, "do", tds, ammonia, salinitas
+                    FROM sensor_data
+                    WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end
+                    ORDER BY timestamp
+                    """
+                ),
+                params
+            ).all()
+            if not rows:
+                return 0
+            old_path = conn.execute(
+                text("SELECT path FROM sensor_archive WHERE device_id = :device_id AND month = :month FOR UPDATE"),
+                {"device_id": device_id, "month": month}
+            ).scalar()
+
+            columns = to_columns(rows)
+            if old_path:
+                columns = merge_columns(open_columns(old_path), columns)
+            new_path = f"{device_id}/{month:%Y-%m}-{int(time.time() * 1000)}"
+            _write_columns(new_path, columns)
+
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO sensor_archive
+                        (device_id, month, path, row_count, first_timestamp, last_timestamp, archived_at)
+                    VALUES (:device_id, :month, :path, :row_count, :first, :last, :now)
+                    ON CONFLICT (device_id, month) DO UPDATE SET
+                        path = EXCLUDED.path,
+                        row_count = EXCLUDED.row_count,
+                        first_timestamp = EXCLUDED.first_timestamp,
+                        last_timestamp = EXCLUDED.last_timestamp,
+                        archived_at = EXCLUDED.archived_at
+                    """
+                ),
+                {
+                    "device_id": device_id,
+                    "month": month,
+                    "path": new_path,
+                    "row_count": len(columns["id"]),
+                    "first": columns["timestamp"][0].item(),
+                    "last": columns["timestamp"][-1].item(),
+                    "now": datetime.utcnow()
+                }
+            )
+            # Hapus tepat baris yang dibaca; baris yang masuk bersamaan
+            # ikut pada putaran berikutnya
+            conn.execute(
+                text(
+                    """
+                    DELETE FROM sensor_data
+                    WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end
+                      AND id = ANY(:ids)
+                    """
+                ),
+                {**params, "ids": [row.id for row in rows]}
+            )
+            etags.bump_data_generation(conn, [device_id])
+    except Exception:
+        if new_path:
+            shutil.rmtree(_full_path(new_path), ignore_errors=True)
+        raise
+
+    if old_path:
+        shutil.rmtree(_full_path(old_path), ignore_errors=True)
+    ARCHIVE_ROWS.inc(len(rows))
+    return len(rows)
+
+
+def archive_before(cutoff: date) -> int:
+    """
+    Arsipkan semua bulan penuh sebelum bulan `cutoff`.
+    """
+    boundary = datetime.combine(month_start(cutoff), datetime.min.time())
+    with engine.connect() as conn:
+        candidates = conn.execute(
+            text(
+                """
+                SELECT DISTINCT device_id, CAST(date_trunc('month', timestamp) AS DATE) AS month
+                FROM sensor_data
+                WHERE timestamp < :boundary AND device_id IS NOT NULL
+                ORDER BY month, device_id
+                """
+            ),
+            {"boundary": boundary}
+        ).all()
+
+    archived = 0
+    for device_id, month in candidates:
+        count = archive_month(device_id, month)
+        if count:
+            logger.info(f"Archived {count} readings of device {device_id} for {month:%Y-%m}")
+        archived += count
+    return archived
+
+
+def run_archive(cutoff: Optional[date] = None) -> int:
+    """
+    Jalankan archiver sekali (default batas: hari ini - ARCHIVE_AFTER_DAYS).
+    Mengembalikan 0 jika replika lain sedang mengarsipkan.
+    """
+    if cutoff is None:
+        if ARCHIVE_AFTER_DAYS <= 0:
+            return 0
+        cutoff = datetime.utcnow().date() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ARCHIVE_LOCK_KEY}).scalar():
+            logger.info("Archiver already running elsewhere, skipping")
+            return 0
+        try:
+            return archive_before(cutoff)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ARCHIVE_LOCK_KEY})
+
+
+def archive_loop() -> None:
+    logger.info("Starting sensor data archiver")
+    while True:
+        try:
+            run_archive()
+        except Exception as e:
+            logger.error(f"Error in sensor data archiver: {str(e)}")
+        time.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+
+
+def start_archiver() -> None:
+    if ARCHIVE_AFTER_DAYS > 0 and not ARCHIVE_SHARED_STORAGE:
+        # ARCHIVE_DIR lokal per pod: replika lain tidak melihat file arsipnya
+        logger.error("Sensor data archiver not started: ARCHIVE_DIR is not marked as shared storage (set ARCHIVE_SHARED_STORAGE=true)")
+        return
+    thread = threading.Thread(target=archive_loop, daemon=True)
+    thread.start()
+
+
+def archived_months(db: Session, device_id: int, start: Optional[datetime],
+                    end: Optional[datetime]) -> List[models.SensorArchive]:
+    query = db.query(models.SensorArchive).filter(models.SensorArchive.device_id == device_id)
+    if start is not None:
+        query = query.filter(models.SensorArchive.last_timestamp >= start)
+    if end is not None:
+        query = query.filter(models.SensorArchive.first_timestamp <= end)
+    return query.order_by(models.SensorArchive.month.asc()).all()
+
+
+def _bounds(columns: Dict[str, np.ndarray], start: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int]:
+    # Rentang inklusif [start, end]
+    timestamps = columns["timestamp"]
+    lo = 0 if start is None else int(np.searchsorted(timestamps, np.datetime64(start, "us"), side="left"))
+    hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, np.datetime64(end, "us"), side="right"))
+    return lo, hi
+
+
+def count_archived(entries: Iterable[models.SensorArchive], start: Optional[datetime],
+                   end: Optional[datetime]) -> int:
+    total = 0
+    for entry in entries:
+        lo, hi = _bounds(open_columns(entry.path), start, end)
+        total += max(hi - lo, 0)
+    return total
+
+
+def iter_archived(entries: List[models.SensorArchive], start: Optional[datetime], end: Optional[datetime],
+                  descending: bool = False, chunk_size: int = 1000) -> Iterator[ArchivedReading]:
+    """
+    Stream pembacaan arsip dalam rentang [start, end], terurut timestamp.
+    Hanya potongan chunk_size baris yang dikonversi ke objek Python sekaligus.
+    """
+    for entry in (reversed(entries) if descending else entries):
+        columns = open_columns(entry.path)
+        lo, hi = _bounds(columns, start, end)
+        offsets = range(lo, hi, chunk_size)
+        for offset in (reversed(offsets) if descending else offsets):
+            stop = min(offset + chunk_size, hi)
+            part = [columns[name][offset:stop].tolist() for name in COLUMNS]
+            rows = zip(*part)
+            for row in (reversed(list(rows)) if descending else rows):
+                values = [None if value != value else value for value in row[2:]]  # NaN -> None
+                yield ArchivedReading(row[0], entry.device_id, row[1], *values)
+
+
+def merge_readings(archived: Iterable, live: Iterable, descending: bool = False) -> Iterator:
+    """
+    Gabungkan dua aliran terurut (arsip dan sensor_data). Pembacaan yang
+    timestamp-nya sudah ada di arsip (replay yang masuk lagi setelah bulannya
+    diarsipkan, sebelum archiver berikutnya melipatnya) tidak diulang.
+    """
+    previous = None
+    for reading in heapq.merge(archived, live, key=lambda r: r.timestamp, reverse=descending):
+        if reading.timestamp == previous:
+            continue
+        previous = reading.timestamp
+        yield reading
+
+
+def delete_device_archive(db: Session, device_ids: Iterable[int],
+                          archived_before: Optional[datetime] = None) -> List[str]:
+    """
+    Hapus manifest arsip device. Dengan `archived_before`, hanya bulan yang
+    diarsipkan sebelum waktu tersebut atau bulannya sudah lewat (termasuk
+    yang diarsipkan bersamaan dengan purge). Mengembalikan path yang harus
+    dihapus dengan remove_archive_files setelah commit.
+    """
+    query = db.query(models.SensorArchive).filter(
+        models.SensorArchive.device_id.in_(list(device_ids))
+    )
+    if archived_before is not None:
+        query = query.filter(or_(
+            models.SensorArchive.archived_at <= archived_before,
+            models.SensorArchive.month < month_start(archived_before.date())
+        ))
+    entries = query.all()
+    paths = [entry.path for entry in entries]
+    for entry in entries:
+        db.delete(entry)
+    return paths
+
+
+def remove_archive_files(paths: Iterable[str]) -> None:
+    for path in paths:
+        shutil.rmtree(_full_path(path), ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Arsipkan bulan penuh sebelum batas")
+    run_parser.add_argument(
+        "--before",
+        help="YYYY-MM-DD; bulan sebelum bulan tanggal ini diarsipkan (default: hari ini - ARCHIVE_AFTER_DAYS)"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not args.before and ARCHIVE_AFTER_DAYS <= 0:
+        raise SystemExit("Set ARCHIVE_AFTER_DAYS or pass --before")
+    if not ARCHIVE_SHARED_STORAGE:
+        raise SystemExit("ARCHIVE_DIR must be shared by all API replicas; set ARCHIVE_SHARED_STORAGE=true")
+    archived = run_archive(date.fromisoformat(args.before) if args.before else None)
+    logger.info(f"Archive finished: {archived} readings moved")
+
+
+if __name__ == "__main__":
+    main()
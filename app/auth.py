@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from app import models, database
 from datetime import datetime, timedelta
+from typing import Optional
 import uuid
 
 security = HTTPBearer()
@@ -29,6 +30,22 @@ def create_auth_token(db: Session, user_id: int, expires_hours: int = 720) -> st
     db.commit()
     return token
 
+def get_user_by_token(db: Session, token: str) -> Optional[models.User]:
+    """
+    Cari user pemilik token yang belum kedaluwarsa (dipakai juga oleh WebSocket).
+    """
+    db_token = db.query(models.AuthToken).filter(
+        models.AuthToken.token == token,
+        models.AuthToken.expires_at > datetime.utcnow()
+    ).first()
+    
+    if not db_token:
+        return None
+        
+    return db.query(models.User).filter(
+        models.User.id == db_token.user_id
+    ).first()
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(database.get_db)
@@ -40,18 +57,7 @@ def get_current_user(
     )
     
     try:
-        token = credentials.credentials
-        db_token = db.query(models.AuthToken).filter(
-            models.AuthToken.token == token,
-            models.AuthToken.expires_at > datetime.utcnow()
-        ).first()
-        
-        if not db_token:
-            raise credentials_exception
-            
-        user = db.query(models.User).filter(
-            models.User.id == db_token.user_id
-        ).first()
+        user = get_user_by_token(db, credentials.credentials)
         
         if not user:
             raise credentials_exception
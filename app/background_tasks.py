@@ -6,6 +6,11 @@ from sqlalchemy.orm import Session
 from app import models
 from app.database import SessionLocal
 from app.firebase_service import send_fcm_notification
+from app.jobs import start_job_worker
+from app.archive import start_archiver
+from app.last_seen import last_seen_tracker
+from app.partitioning import start_partition_maintenance
+from app.retention import start_retention
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,18 +23,15 @@ def check_thresholds():
     while True:
         try:
             db = SessionLocal()
-            devices = db.query(models.Device).filter(
+            # Satu join ke device_latest, bukan satu query per device
+            rows = db.query(models.Device, models.DeviceLatest).join(
+                models.DeviceLatest, models.DeviceLatest.device_id == models.Device.id
+            ).filter(
                 models.Device.user_id.isnot(None),
                 models.Device.is_active == True
             ).all()
             
-            for device in devices:
-                latest = db.query(models.SensorData).filter(
-                    models.SensorData.device_id == device.id
-                ).order_by(models.SensorData.timestamp.desc()).first()
-                
-                if not latest:
-                    continue
+            for device, latest in rows:
 
                 user = db.query(models.User).get(device.user_id)
                 cooldown_minutes = 30
@@ -163,6 +165,9 @@ def check_device_status():
     logger.info("Starting background device status checker")
     while True:
         try:
+            # Tulis last_seen yang masih di memori agar perhitungan status akurat
+            last_seen_tracker.flush()
+
             db = SessionLocal()
             now = datetime.now(timezone.utc)
             
@@ -178,6 +183,7 @@ def check_device_status():
                     device.status = "offline"
                     device.last_seen = None
                     db.add(device)
+                    last_seen_tracker.forget(device.id)
                     continue
                 if device.status == 'maintenance':
                     continue
@@ -196,6 +202,7 @@ def check_device_status():
                         old_status = device.status
                         device.status = 'offline'
                         db.add(device)
+                        last_seen_tracker.forget(device.id)
                         
                         if device.user_id:
                             user = db.query(models.User).get(device.user_id)
@@ -252,5 +259,10 @@ def start_background_task():
     
     thread_status = threading.Thread(target=check_device_status, daemon=True)
     thread_status.start()
+    last_seen_tracker.start()
+    start_partition_maintenance()
+    start_archiver()
+    start_job_worker()
+    start_retention()
     
     logger.info("All background tasks started")
@@ -0,0 +1,180 @@
+"""
+Hapus duplikat sensor_data (device_id, timestamp) secara bertahap lalu pasang
+unique constraint uq_sensor_data_device_timestamp.
+
+Baris dengan id terkecil dipertahankan. Penghapusan berjalan per rentang id
+dalam transaksi pendek sehingga tabel tidak terkunci dan ingest tetap jalan.
+
+Database lama tanpa constraint ditangani otomatis oleh job
+`compact_sensor_data` (app/jobs.py) yang di-enqueue sekali saat startup;
+CLI di bawah menjalankan langkah yang sama secara manual.
+
+Contoh:
+    python -m app.compact_sensor_data --chunk-size 20000 --sleep-ms 100
+"""
+import argparse
+import logging
+import time
+from typing import Callable, Dict, Tuple
+
+from sqlalchemy import text
+
+from app import etags
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+CONSTRAINT_NAME = "uq_sensor_data_device_timestamp"
+# Index lama yang sudah tercakup unique constraint
+REDUNDANT_INDEX = "ix_sensor_data_device_timestamp"
+
+_DELETE_CHUNK_SQL = text(
+    """
+    DELETE FROM sensor_data AS s
+    USING sensor_data AS d
+    WHERE s.id >= :lo AND s.id < :hi
+      AND d.device_id = s.device_id
+      AND d.timestamp = s.timestamp
+      AND d.id < s.id
+    """
+)
+
+
+def remove_duplicates(start_id: int = 0, chunk_size: int = 20000, sleep_ms: int = 100) -> Tuple[int, int]:
+    """
+    Hapus duplikat untuk id >= start_id. Mengembalikan (jumlah baris terhapus,
+    id awal untuk pass berikutnya).
+    """
+    with engine.connect() as conn:
+        max_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM sensor_data")).scalar()
+
+    removed = 0
+    lo = start_id
+    while lo <= max_id:
+        hi = lo + chunk_size
+        with engine.begin() as conn:
+            deleted = conn.execute(_DELETE_CHUNK_SQL, {"lo": lo, "hi": hi}).rowcount
+        removed += deleted
+        if deleted:
+            logger.info(f"ids [{lo}, {hi}): removed {deleted} duplicates")
+        lo = hi
+        if sleep_ms:
+            time.sleep(sleep_ms / 1000.0)
+    return removed, max_id + 1
+
+
+def constraint_exists(bind=engine) -> bool:
+    # Cek constraint (bukan index): index dengan nama yang sama bisa
+    # tertinggal INVALID atau belum dijadikan constraint
+    with bind.connect() as conn:
+        return bool(conn.execute(
+            text(
+                """
+                SELECT 1
+                FROM pg_constraint
+                WHERE conrelid = to_regclass('public.sensor_data')
+                  AND conname = :name
+                """
+            ),
+            {"name": CONSTRAINT_NAME}
+        ).scalar())
+
+
+def add_unique_constraint(bind=engine) -> bool:
+    """
+    Bangun unique index secara CONCURRENTLY lalu jadikan constraint.
+    Mengembalikan False jika ada duplikat (termasuk yang baru muncul selama
+    index dibangun).
+    """
+    autocommit = bind.execution_options(isolation_level="AUTOCOMMIT")
+    with autocommit.connect() as conn:
+        invalid = conn.execute(
+            text(
+                """
+                SELECT 1
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = :name AND NOT i.indisvalid
+                """
+            ),
+            {"name": CONSTRAINT_NAME}
+        ).scalar()
+        if invalid:
+            # Sisa build yang gagal; IF NOT EXISTS akan melewatinya
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {CONSTRAINT_NAME}"))
+        try:
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {CONSTRAINT_NAME} "
+                "ON sensor_data (device_id, timestamp)"
+            ))
+        except Exception as e:
+            logger.warning(f"Unique index build failed: {str(e)}")
+            # Index INVALID yang tertinggal harus dibuang sebelum dicoba lagi
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {CONSTRAINT_NAME}"))
+            return False
+        conn.execute(text(
+            f"ALTER TABLE sensor_data ADD CONSTRAINT {CONSTRAINT_NAME} "
+            f"UNIQUE USING INDEX {CONSTRAINT_NAME}"
+        ))
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {REDUNDANT_INDEX}"))
+    return True
+
+
+def compact(progress: Dict[str, int], report: Callable[[Dict[str, int]], None],
+            chunk_size: int = 20000, sleep_ms: int = 100, retries: int = 3) -> None:
+    """
+    Hapus duplikat lalu pasang constraint; diulang jika duplikat baru masuk
+    selama index dibangun. Raise RuntimeError jika tetap gagal.
+    """
+    next_id = 0
+    for _ in range(retries):
+        removed, next_id = remove_duplicates(next_id, chunk_size, sleep_ms)
+        progress["duplicates_removed"] = progress.get("duplicates_removed", 0) + removed
+        report(progress)
+        if removed:
+            logger.info(f"Removed {removed} duplicate readings")
+            with engine.begin() as conn:
+                etags.bump_data_generation(conn)
+        if add_unique_constraint():
+            logger.info("Unique constraint added")
+            return
+    raise RuntimeError("Could not add unique constraint; rerun during lower ingest load")
+
+
+def compact_job(payload: dict, progress: Dict[str, int], report: Callable[[Dict[str, int]], None]) -> None:
+    """
+    Job compact_sensor_data. Aman diulang: selesai langsung jika constraint
+    sudah ada (mis. job kedua dari replika lain).
+    """
+    if constraint_exists():
+        return
+    compact(progress, report)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=20000, help="Jumlah id per transaksi")
+    parser.add_argument("--sleep-ms", type=int, default=100, help="Jeda antar chunk")
+    parser.add_argument("--retries", type=int, default=3, help="Percobaan ulang pemasangan constraint")
+    parser.add_argument("--skip-constraint", action="store_true", help="Hanya hapus duplikat")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if constraint_exists():
+        logger.info("Unique constraint already present, nothing to compact")
+        return
+
+    if args.skip_constraint:
+        removed, _ = remove_duplicates(chunk_size=args.chunk_size, sleep_ms=args.sleep_ms)
+        logger.info(f"Removed {removed} duplicate readings")
+        return
+
+    try:
+        compact({}, lambda progress: None, args.chunk_size, args.sleep_ms, args.retries)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Perbandingan histori beberapa device sekaligus (GET /sensor/compare), mis.
+semua kolam satu tambak: satu query otorisasi dan satu query rentang untuk
+semua device, bukan satu panggilan /sensor/ (cek kepemilikan, COUNT, page)
+per device.
+
+- Tanpa bucket: pembacaan mentah [start, end) per device, masing-masing
+  dengan array timestamp sendiri (sensor_data + arsip dingin).
+- Dengan bucket (5m/1h/1d): rata-rata/min/max per bucket dari tabel rollup,
+  disejajarkan pada satu sumbu timestamp bersama; bucket tanpa data di
+  suatu device bernilai null.
+"""
+import os
+from datetime import datetime
+from itertools import takewhile
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import aggregates, archive, models, rollups
+
+COMPARE_MAX_DEVICES = int(os.getenv("COMPARE_MAX_DEVICES", "50"))
+COMPARE_MAX_ROWS = int(os.getenv("COMPARE_MAX_ROWS", "50000"))
+
+
+def resolve_devices(db: Session, user_id: int, uids: Optional[List[str]],
+                    tambak_id: Optional[int]) -> List[models.Device]:
+    """
+    Device milik user yang dibandingkan: daftar UID (urutan dipertahankan)
+    atau device yang terpasang di kolam tambak_id. Satu query; 404 jika ada
+    UID/tambak yang bukan milik user.
+    """
+    if tambak_id is not None:
+        tambak = db.query(models.Tambak.id).filter(
+            models.Tambak.id == tambak_id,
+            models.Tambak.user_id == user_id
+        ).first()
+        if not tambak:
+            raise HTTPException(status_code=404, detail="Tambak tidak ditemukan atau tidak memiliki akses")
+        devices = db.query(models.Device).join(models.Kolam, models.Kolam.device_id == models.Device.id).filter(
+            models.Kolam.tambak_id == tambak_id,
+            models.Device.user_id == user_id
+        ).order_by(models.Kolam.id).all()
+    else:
+        found = {
+            device.uid: device
+            for device in db.query(models.Device).filter(
+                models.Device.uid.in_(uids),
+                models.Device.user_id == user_id
+            )
+        }
+        missing = [uid for uid in uids if uid not in found]
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Device tidak ditemukan atau tidak memiliki akses: {', '.join(missing)}"
+            )
+        devices = [found[uid] for uid in uids]
+
+    if len(devices) > COMPARE_MAX_DEVICES:
+        raise HTTPException(status_code=400, detail=f"Too many devices (max {COMPARE_MAX_DEVICES})")
+    return devices
+
+
+def _raw_series(db: Session, device_ids: List[int], start: datetime, end: datetime,
+                fields: List[str]) -> Dict[int, Dict[str, list]]:
+    live = db.execute(
+        text(
+            f"""
+            SELECT device_id, id, timestamp, {", ".join(rollups.quote(f) for f in fields)}
+            FROM sensor_data
+            WHERE device_id = ANY(CAST(:device_ids AS INTEGER[]))
+              AND timestamp >= :start AND timestamp < :end
+            ORDER BY device_id, timestamp
+            LIMIT :limit
+            """
+        ),
+        {"device_ids": device_ids, "start": start, "end": end, "limit": COMPARE_MAX_ROWS + 1}
+    ).all()
+    by_device: Dict[int, list] = {device_id: [] for device_id in device_ids}
+    for row in live:
+        by_device[row.device_id].append(row)
+
+    archived: Dict[int, list] = {}
+    for entry in db.query(models.SensorArchive).filter(
+        models.SensorArchive.device_id.in_(device_ids),
+        models.SensorArchive.last_timestamp >= start,
+        models.SensorArchive.first_timestamp < end
+    ).order_by(models.SensorArchive.month.asc()):
+        archived.setdefault(entry.device_id, []).append(entry)
+
+    series = {}
+    total = len(live)
+    for device_id in device_ids:
+        rows = by_device[device_id]
+        if device_id in archived:
+            merged = archive.merge_readings(archive.iter_archived(archived[device_id], start, end), rows)
+            # Rentang arsip inklusif, rentang compare eksklusif di end
+            rows = list(takewhile(lambda r: r.timestamp < end, merged))
+            total += len(rows) - len(by_device[device_id])
+        if total > COMPARE_MAX_ROWS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many readings (max {COMPARE_MAX_ROWS}); narrow the range or use bucket"
+            )
+        columns = {"timestamp": [row.timestamp for row in rows]}
+        for field in fields:
+            columns[field] = [getattr(row, field) for row in rows]
+        series[device_id] = columns
+    return series
+
+
+def _bucketed_series(db: Session, device_ids: List[int], start: datetime, end: datetime,
+                     bucket: str, fields: List[str], agg: str) -> tuple:
+    width, resolution = aggregates.BUCKETS[bucket]
+    start, end = aggregates.align_range(start, end, width)
+    if (end - start) / width > aggregates.AGGREGATE_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range too large for bucket {bucket} (max {aggregates.AGGREGATE_MAX_BUCKETS} buckets)"
+        )
+
+    table = rollups.RESOLUTIONS[resolution][0].__tablename__
+    if agg == "avg":
+        columns = [f"SUM({field}_sum) / NULLIF(SUM({field}_count), 0) AS {field}" for field in fields]
+    else:
+        columns = [f"{agg.upper()}({field}_{agg}) AS {field}" for field in fields]
+    rows = db.execute(
+        text(
+            f"""
+            SELECT device_id, date_bin(:width, bucket, :origin) AS bucket, {", ".join(columns)}
+            FROM {table}
+            WHERE device_id = ANY(CAST(:device_ids AS INTEGER[]))
+              AND bucket >= :start AND bucket < :end
+            GROUP BY 1, 2
+            ORDER BY 2
+            """
+        ),
+        {"width": width, "origin": aggregates.ORIGIN, "device_ids": device_ids, "start": start, "end": end}
+    ).all()
+
+    # Sumbu bersama: semua bucket yang berisi data di salah satu device
+    axis = sorted({row.bucket for row in rows})
+    position = {value: i for i, value in enumerate(axis)}
+    series = {
+        device_id: {field: [None] * len(axis) for field in fields}
+        for device_id in device_ids
+    }
+    for row in rows:
+        i = position[row.bucket]
+        values = series[row.device_id]
+        for field in fields:
+            values[field][i] = getattr(row, field)
+    return axis, series
+
+
+def compare_devices(db: Session, devices: List[models.Device], start: datetime, end: datetime,
+                    fields: List[str], bucket: Optional[str] = None, agg: str = "avg") -> dict:
+    """
+    {bucket, timestamp, devices: [{device_id, uid, name, timestamp?, values}]}.
+    Tanpa bucket tiap device membawa array timestamp sendiri; dengan bucket
+    semua `values` sejajar dengan `timestamp` di tingkat atas.
+    """
+    device_ids = [device.id for device in devices]
+    result = {"bucket": bucket, "timestamp": None, "devices": []}
+    if bucket is None:
+        series = _raw_series(db, device_ids, start, end, fields) if devices else {}
+        for device in devices:
+            columns = series[device.id]
+            result["devices"].append({
+                "device_id": device.id,
+                "uid": device.uid,
+                "name": device.name,
+                "timestamp": columns.pop("timestamp"),
+                "values": columns
+            })
+        return result
+
+    axis, series = _bucketed_series(db, device_ids, start, end, bucket, fields, agg) if devices else ([], {})
+    result["timestamp"] = axis
+    for device in devices:
+        result["devices"].append({
+            "device_id": device.id,
+            "uid": device.uid,
+            "name": device.name,
+            "timestamp": None,
+            "values": series[device.id]
+        })
+    return result
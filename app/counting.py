@@ -0,0 +1,93 @@
+"""
+X-Total-Count untuk endpoint list dengan tiga mode (query param `count`):
+
+- exact: COUNT(*) sebenarnya. Untuk histori sensor di-cache
+  COUNT_CACHE_SECONDS per (device, rentang) sehingga scroll halaman demi
+  halaman tidak menghitung ulang setiap kali.
+- estimated: perkiraan murah (jumlah di rollup harian untuk histori
+  sensor, atau estimasi planner Postgres).
+- none: tanpa header.
+
+Header X-Total-Count-Mode memberi tahu klien mode yang dipakai.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Literal, Optional
+
+from fastapi import Response
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
+
+COUNT_CACHE_SECONDS = float(os.getenv("COUNT_CACHE_SECONDS", "30"))
+COUNT_CACHE_MAX_SIZE = int(os.getenv("COUNT_CACHE_MAX_SIZE", "10000"))
+
+CountMode = Literal["exact", "estimated", "none"]
+
+
+class CountCache:
+    """
+    Cache TTL + LRU in-process untuk hasil COUNT exact.
+    """
+
+    def __init__(self, ttl_seconds: float = COUNT_CACHE_SECONDS, max_size: int = COUNT_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (expires_at, count)
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        count = compute()
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, count)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+def planner_estimate(db: Session, query: Query) -> int:
+    """
+    Perkiraan jumlah baris query dari statistik planner (EXPLAIN, tanpa
+    mengeksekusi query).
+    """
+    compiled = query.statement.compile(dialect=postgresql.dialect())
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params
+    ).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def set_total_count(response: Response, mode: CountMode, key: Optional[Hashable],
+                    exact: Callable[[], int], estimate: Callable[[], Optional[int]]) -> None:
+    """
+    Isi X-Total-Count sesuai mode. `estimate` boleh mengembalikan None
+    (tidak ada data perkiraan), lalu jatuh ke hitungan exact. Hitungan exact
+    di-cache per `key`; key None berarti selalu dihitung.
+    """
+    if mode == "none":
+        response.headers["X-Total-Count-Mode"] = "none"
+        return
+    if mode == "estimated":
+        total = estimate()
+        if total is not None:
+            response.headers["X-Total-Count"] = str(total)
+            response.headers["X-Total-Count-Mode"] = "estimated"
+            return
+    total = exact() if key is None else count_cache.get_or_compute(key, exact)
+    response.headers["X-Total-Count"] = str(total)
+    response.headers["X-Total-Count-Mode"] = "exact"
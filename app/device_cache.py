@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+
+DEVICE_CACHE_TTL_SECONDS = float(os.getenv("DEVICE_CACHE_TTL_SECONDS", "60"))
+DEVICE_CACHE_MAX_SIZE = int(os.getenv("DEVICE_CACHE_MAX_SIZE", "10000"))
+
+
+class DeviceState(NamedTuple):
+    id: int
+    uid: str
+    user_id: Optional[int]
+    is_active: bool
+    deactivate_at: Optional[datetime]
+
+
+def _to_state(device: models.Device) -> DeviceState:
+    return DeviceState(
+        id=device.id,
+        uid=device.uid,
+        user_id=device.user_id,
+        is_active=device.is_active is not False,
+        deactivate_at=device.deactivate_at
+    )
+
+
+class DeviceRegistry:
+    """
+    Cache uid -> DeviceState untuk jalur ingest (TTL + LRU berbatas).
+    UID yang tidak terdaftar juga di-cache (sebagai None) supaya UID asing
+    tidak membanjiri database; endpoint yang mengubah device wajib memanggil
+    `invalidate`. Antar replika, TTL membatasi lama data basi.
+    """
+
+    def __init__(self, ttl_seconds: float = DEVICE_CACHE_TTL_SECONDS, max_size: int = DEVICE_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # uid -> (expires_at, DeviceState | None)
+        self._lock = threading.Lock()
+
+    def _lookup(self, uid: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return False, None
+            expires_at, state = entry
+            if expires_at <= now:
+                del self._entries[uid]
+                return False, None
+            self._entries.move_to_end(uid)
+            return True, state
+
+    def _store(self, uid: str, state: Optional[DeviceState]) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[uid] = (expires_at, state)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def peek(self, uid: str) -> Tuple[bool, Optional[DeviceState]]:
+        """
+        Cek cache tanpa menyentuh database: (hit, state). state None pada hit
+        berarti UID tidak terdaftar.
+        """
+        return self._lookup(uid)
+
+    def get(self, db: Session, uid: str) -> Optional[DeviceState]:
+        return self.get_many(db, [uid]).get(uid)
+
+    def get_many(self, db: Session, uids: Iterable[str]) -> Dict[str, DeviceState]:
+        """
+        Resolve banyak UID; hanya UID yang belum ada di cache yang di-query
+        (satu query untuk semuanya). UID tak dikenal tidak ada di hasil.
+        """
+        result = {}
+        missing = set()
+        for uid in set(uids):
+            hit, state = self._lookup(uid)
+            if not hit:
+                missing.add(uid)
+            elif state is not None:
+                result[uid] = state
+
+        if missing:
+            devices = db.query(models.Device).filter(
+                models.Device.uid.in_(missing)
+            ).all()
+            for device in devices:
+                state = _to_state(device)
+                self._store(device.uid, state)
+                result[device.uid] = state
+                missing.discard(device.uid)
+            for uid in missing:
+                self._store(uid, None)
+
+        return result
+
+    def invalidate(self, uid: str) -> None:
+        with self._lock:
+            self._entries.pop(uid, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+device_registry = DeviceRegistry()
@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import case, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+SENSOR_FIELDS = models.SENSOR_FIELDS
+
+
+def upsert_latest(db: Session, rows: List[dict], inserted: Dict) -> None:
+    """
+    Perbarui device_latest dari baris sensor_data yang baru tersimpan.
+    Hanya pembacaan dengan timestamp >= yang tersimpan yang menang, sehingga
+    replay data lama (out-of-order) tidak memundurkan nilai terbaru;
+    last_sensor_data_id tetap naik untuk semua pembacaan baru. Commit oleh
+    caller.
+    """
+    newest = {}
+    last_ids = {}
+    for row in rows:
+        row_id = inserted.get((row["device_id"], row["timestamp"]))
+        if row_id is None:
+            continue
+        last_ids[row["device_id"]] = max(row_id, last_ids.get(row["device_id"], row_id))
+        current = newest.get(row["device_id"])
+        if current is None or row["timestamp"] > current["timestamp"]:
+            newest[row["device_id"]] = {
+                "device_id": row["device_id"],
+                "sensor_data_id": row_id,
+                "timestamp": row["timestamp"],
+                **{field: row.get(field) for field in SENSOR_FIELDS},
+                "updated_at": datetime.utcnow()
+            }
+    if not newest:
+        return
+    for device_id, values in newest.items():
+        values["last_sensor_data_id"] = last_ids[device_id]
+
+    # Urutkan per device_id agar urutan lock konsisten antar transaksi
+    values = [newest[device_id] for device_id in sorted(newest)]
+    statement = insert(models.DeviceLatest).values(values)
+    excluded = statement.excluded
+    newer = models.DeviceLatest.timestamp <= excluded.timestamp
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[models.DeviceLatest.device_id],
+            set_={
+                **{
+                    name: case((newer, getattr(excluded, name)), else_=getattr(models.DeviceLatest, name))
+                    for name in ("sensor_data_id", "timestamp", *SENSOR_FIELDS, "updated_at")
+                },
+                "last_sensor_data_id": func.greatest(
+                    models.DeviceLatest.last_sensor_data_id, excluded.last_sensor_data_id
+                )
+            }
+        )
+    )
+
+
+def delete_latest(db: Session, device_ids: Iterable[int]) -> None:
+    db.query(models.DeviceLatest).filter(
+        models.DeviceLatest.device_id.in_(list(device_ids))
+    ).delete(synchronize_session=False)
+
+
+def backfill_latest(conn) -> int:
+    """
+    Isi device_latest untuk device yang belum punya baris, dari pembacaan
+    terbaru di sensor_data (satu index scan per device).
+    """
+    return conn.execute(
+        text(
+            """
+            INSERT INTO device_latest
+                (device_id, sensor_data_id, last_sensor_data_id, timestamp,
+                 suhu, ph, "do", tds, ammonia, salinitas, updated_at)
+            SELECT d.id, s.id, s.id, s.timestamp, s.suhu, s.ph, s."do", s.tds, s.ammonia, s.salinitas, now() AT TIME ZONE 'utc'
+            FROM devices AS d
+            CROSS JOIN LATERAL (
+                SELECT id, timestamp, suhu, ph, "do", tds, ammonia, salinitas
+                FROM sensor_data
+                WHERE device_id = d.id AND timestamp IS NOT NULL
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) AS s
+            WHERE NOT EXISTS (SELECT 1 FROM device_latest AS l WHERE l.device_id = d.id)
+            ON CONFLICT (device_id) DO NOTHING
+            """
+        )
+    ).rowcount
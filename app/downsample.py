@@ -0,0 +1,92 @@
+"""
+Decimasi histori sensor untuk grafik (parameter max_points di GET /sensor/
+dan GET /admin/sensor): dari halaman yang sudah diambil, pilih paling banyak
+max_points pembacaan yang mempertahankan bentuk kurva.
+
+- lttb: Largest-Triangle-Three-Buckets. Per bucket dipilih titik yang
+  membentuk segitiga terluas dengan titik terpilih sebelumnya dan rata-rata
+  bucket berikutnya; lonjakan/penurunan tajam tetap terpilih.
+- minmax: titik minimum dan maksimum tiap bucket.
+
+Setiap parameter dipilih terpisah (budget max_points dibagi rata) lalu
+indeksnya digabung, sehingga respons tetap berisi pembacaan utuh dalam
+urutan asli. Pembacaan pertama dan terakhir selalu ikut agar cursor
+halaman tetap berlaku.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+from app import models
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indeks titik terpilih (terurut). y boleh berisi NaN (dilewati).
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if n <= threshold or threshold < 3:
+        return valid
+    x, y = x[valid], y[valid]
+
+    # threshold - 2 bucket di antara titik pertama dan terakhir, ditambah
+    # "bucket" terakhir berisi titik terakhir saja
+    edges = np.append(np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64), n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi, next_hi = edges[i], edges[i + 1], edges[i + 2]
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return valid[selected]
+
+
+def minmax(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indeks minimum dan maksimum tiap bucket (threshold // 2 bucket).
+    """
+    n = len(y)
+    buckets = threshold // 2
+    if n <= threshold or buckets < 1:
+        return np.flatnonzero(~np.isnan(y))
+
+    edges = np.floor(np.linspace(0, n, buckets + 1)).astype(np.int64)
+    starts = edges[:-1]
+    segment = np.repeat(np.arange(buckets), np.diff(edges))
+    # Urut per bucket lalu per nilai; NaN di akhir bucket
+    order = np.lexsort((y, segment))
+    counts = np.add.reduceat((~np.isnan(y)).astype(np.int64), starts)
+    filled = counts > 0
+    lows = order[starts[filled]]
+    highs = order[starts[filled] + counts[filled] - 1]
+    return np.unique(np.concatenate([lows, highs]))
+
+
+def downsample(rows: Sequence, max_points: int, method: str = "lttb",
+               fields: Sequence[str] = models.SENSOR_FIELDS) -> List:
+    """
+    Kurangi rows (ORM SensorData atau ArchivedReading, terurut waktu) menjadi
+    paling banyak sekitar max_points baris.
+    """
+    if len(rows) <= max_points:
+        return list(rows)
+    select = lttb if method == "lttb" else minmax
+    x = np.array([row.timestamp for row in rows], dtype="datetime64[us]").astype(np.int64).astype(np.float64)
+    budget = max(max_points // len(fields), 3)
+
+    keep = [np.array([0, len(rows) - 1])]
+    for field in fields:
+        # None -> NaN
+        y = np.array([getattr(row, field) for row in rows], dtype=np.float64)
+        keep.append(select(x, y, budget))
+    return [rows[i] for i in np.unique(np.concatenate(keep))]
@@ -0,0 +1,63 @@
+"""
+ETag / conditional GET untuk endpoint yang sering di-polling.
+
+Endpoint menghitung validator murah (mis. id/timestamp pembacaan terakhir,
+jumlah dan id notifikasi terbesar) sebelum memuat data. Jika sama dengan
+If-None-Match dari klien, langsung dibalas 304 tanpa query baris ORM dan
+tanpa serialisasi pydantic. Validator hanya bergantung pada isi database
+sehingga sama di semua replika.
+"""
+import hashlib
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import text
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Perbandingan lemah: prefix W/ diabaikan
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def check(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Pasang ETag di response. Mengembalikan respons 304 jika klien sudah
+    memiliki versi ini (endpoint langsung me-return-nya), selain itu None.
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    header = request.headers.get("if-none-match")
+    if header and _matches(header, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def bump_data_generation(conn, device_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Naikkan devices.data_generation setelah pembacaan dihapus (retensi,
+    purge, arsip) agar ETag histori berubah walaupun pembacaan terbaru
+    device tetap sama. Tanpa device_ids: semua device. Commit oleh caller.
+    """
+    if device_ids is None:
+        conn.execute(text("UPDATE devices SET data_generation = data_generation + 1"))
+        return
+    conn.execute(
+        text("UPDATE devices SET data_generation = data_generation + 1 WHERE id = ANY(CAST(:ids AS INTEGER[]))"),
+        {"ids": sorted(set(device_ids))}
+    )
@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app import device_latest, live_notify, models, rollups
+from app.device_cache import DeviceState, device_registry
+from app.last_seen import last_seen_tracker
+
+SENSOR_FIELDS = models.SENSOR_FIELDS
+
+
+def parse_device_timestamp(raw: str) -> datetime:
+    """
+    Parse timestamp ISO-8601 dari device TANPA konversi timezone.
+    Raise ValueError jika format tidak valid.
+    """
+    device_timestamp = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+
+    # Jika timestamp memiliki timezone, strip informasi timezone-nya
+    if device_timestamp.tzinfo is not None:
+        device_timestamp = device_timestamp.replace(tzinfo=None)
+    return device_timestamp
+
+
+def reading_timestamp(value) -> datetime:
+    """
+    Timestamp dari payload biner sudah berupa datetime; dari JSON masih string.
+    """
+    if isinstance(value, datetime):
+        return value
+    return parse_device_timestamp(value)
+
+def to_row(device_id: int, reading: dict) -> dict:
+    """
+    Bentuk baris sensor_data dari pembacaan (JSON atau biner) yang sudah
+    di-decode. Raise ValueError jika timestamp tidak valid.
+    """
+    return {
+        "device_id": device_id,
+        # Simpan timestamp persis seperti dari device (tanpa timezone)
+        "timestamp": reading_timestamp(reading["timestamp"]),
+        **{field: reading[field] for field in SENSOR_FIELDS}
+    }
+
+
+def resolve_devices(db: Session, uids: Iterable[str], now: datetime) -> Dict[str, DeviceState]:
+    """
+    Resolve UID ke DeviceState lewat device_registry (tanpa query jika cache hit).
+    Device yang jadwal deactivate_at-nya sudah lewat langsung dinonaktifkan
+    dan di-commit, lalu dikembalikan dengan is_active=False.
+    """
+    states = device_registry.get_many(db, uids)
+    due = [
+        state for state in states.values()
+        if state.is_active and state.deactivate_at and state.deactivate_at <= now
+    ]
+    if due:
+        db.query(models.Device).filter(
+            models.Device.id.in_([state.id for state in due])
+        ).update(
+            {
+                models.Device.is_active: False,
+                models.Device.status: "offline",
+                models.Device.last_seen: None
+            },
+            synchronize_session=False
+        )
+        db.commit()
+        for state in due:
+            device_registry.invalidate(state.uid)
+            last_seen_tracker.forget(state.id)
+            states[state.uid] = state._replace(is_active=False)
+    return states
+
+
+def touch_devices(db: Session, device_ids: Iterable[int], now: datetime) -> None:
+    """
+    Catat last_seen device (waktu server). Hanya transisi ke online yang
+    ditulis langsung; sisanya di-flush berkala oleh last_seen_tracker.
+    """
+    last_seen_tracker.touch(db, device_ids, now)
+
+
+ReadingKey = Tuple[int, datetime]
+
+
+def reading_key(row: dict) -> ReadingKey:
+    return row["device_id"], row["timestamp"]
+
+
+def insert_readings(db: Session, rows: List[dict]) -> Dict[ReadingKey, int]:
+    """
+    Simpan banyak baris sensor_data dengan multi-row
+    INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Mengembalikan {(device_id, timestamp): id} hanya untuk baris yang baru;
+    baris yang sudah ada (retry firmware) dilewati. Rollup dan device_latest
+    ikut diperbarui dari baris baru saja, dan proses API lain diberi tahu
+    lewat NOTIFY (app/live_notify.py) saat transaksi di-commit. Commit oleh
+    caller.
+    """
+    if not rows:
+        return {}
+    result = db.execute(
+        insert(models.SensorData).on_conflict_do_nothing().returning(
+            models.SensorData.id,
+            models.SensorData.device_id,
+            models.SensorData.timestamp
+        ),
+        rows
+    )
+    inserted = {(row.device_id, row.timestamp): row.id for row in result}
+
+    # Duplikat di dalam batch yang sama hanya satu yang tersimpan
+    seen = set()
+    new_rows = []
+    for row in rows:
+        key = reading_key(row)
+        if key in inserted and key not in seen:
+            seen.add(key)
+            new_rows.append(row)
+    rollups.apply_readings(db, new_rows)
+    device_latest.upsert_latest(db, new_rows, inserted)
+    live_notify.notify_readings(db, inserted)
+    return inserted
@@ -0,0 +1,348 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from app import models
+from app.database import SessionLocal
+from app.ingest import ReadingKey, insert_readings, touch_devices
+from app.live_hub import live_hub
+from app.monitoring_cache import monitoring_cache
+
+logger = logging.getLogger(__name__)
+
+# "sync": setiap request commit sendiri (perilaku lama)
+# "buffered": request hanya enqueue, flusher yang menulis ke database
+INGEST_DURABILITY = os.getenv("INGEST_DURABILITY", "sync").strip().lower()
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "500"))
+INGEST_FLUSH_MAX_ROWS = int(os.getenv("INGEST_FLUSH_MAX_ROWS", "1000"))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "20000"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+# Batas waktu menguras antrian saat shutdown, termasuk retry saat database down
+INGEST_STOP_TIMEOUT_SECONDS = float(os.getenv("INGEST_STOP_TIMEOUT_SECONDS", "30"))
+
+INGEST_QUEUE_SIZE = Gauge(
+    "aquanotes_ingest_queue_size",
+    "Jumlah pembacaan sensor yang menunggu di-flush"
+)
+INGEST_FLUSH_LATENCY = Gauge(
+    "aquanotes_ingest_flush_latency_seconds",
+    "Durasi flush terakhir ke tabel sensor_data"
+)
+INGEST_FLUSHED_ROWS = Counter(
+    "aquanotes_ingest_flushed_rows_total",
+    "Total pembacaan sensor yang berhasil di-flush"
+)
+INGEST_DEAD_LETTER_ROWS = Counter(
+    "aquanotes_ingest_dead_letter_rows_total",
+    "Pembacaan yang dipindah ke ingest_dead_letter setelah gagal berulang"
+)
+
+# Database tidak bisa dihubungi: batch dicoba lagi utuh, bukan dipecah
+_TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+# Jeda retry flush saat shutdown (detik), berlipat dua sampai batas ini
+_STOP_RETRY_MIN = 0.5
+_STOP_RETRY_MAX = 5.0
+
+# (baris, jumlah percobaan yang sudah gagal)
+Entry = Tuple[dict, int]
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class IngestBufferStopped(IngestQueueFull):
+    # Buffer sedang berhenti (shutdown); baris baru ditolak agar tidak hilang
+    pass
+
+
+class IngestBuffer:
+    """
+    Antrian in-process untuk pembacaan sensor yang sudah tervalidasi.
+    Flusher thread menguras antrian setiap `flush_interval_ms` atau saat
+    `flush_max_rows` baris terkumpul, lalu menyimpannya dengan satu bulk
+    insert per batch.
+
+    Batch yang gagal karena isinya (mis. FK device yang sudah dihapus, nilai
+    tidak valid) dipecah dua dan dicoba lagi sampai baris penyebabnya
+    ketemu; baris itu dikembalikan ke belakang antrian dan setelah
+    `max_attempts` kali gagal dipindah ke tabel ingest_dead_letter, sehingga
+    satu baris rusak tidak menahan ingest lainnya.
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = INGEST_FLUSH_INTERVAL_MS,
+        flush_max_rows: int = INGEST_FLUSH_MAX_ROWS,
+        queue_max: int = INGEST_QUEUE_MAX,
+        max_attempts: int = INGEST_MAX_ATTEMPTS,
+        session_factory=SessionLocal
+    ):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_max_rows = flush_max_rows
+        self.queue_max = queue_max
+        self.max_attempts = max_attempts
+        self.session_factory = session_factory
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def enqueue_many(self, rows: List[dict]) -> List[str]:
+        """
+        Masukkan baris (dict kolom sensor_data) ke antrian.
+        Raise IngestQueueFull jika antrian penuh (semua atau tidak sama sekali)
+        dan IngestBufferStopped setelah stop() dipanggil.
+        """
+        with self._cond:
+            if self._stopping:
+                raise IngestBufferStopped()
+            if len(self._queue) + len(rows) > self.queue_max:
+                raise IngestQueueFull()
+            ingest_ids = []
+            for row in rows:
+                ingest_ids.append(str(uuid.uuid4()))
+                self._queue.append((row, 0))
+            INGEST_QUEUE_SIZE.set(len(self._queue))
+            if len(self._queue) >= self.flush_max_rows:
+                self._cond.notify()
+        return ingest_ids
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        logger.info("Ingest buffer flusher started")
+
+    def stop(self, timeout: float = INGEST_STOP_TIMEOUT_SECONDS) -> None:
+        """
+        Hentikan flusher dan flush semua sisa antrian (dipanggil saat shutdown).
+        Baris yang di-enqueue setelah ini ditolak (IngestBufferStopped).
+
+        Gangguan database dicoba lagi dengan backoff sampai `timeout` habis;
+        baris yang masih tersisa setelah itu dipindah ke ingest_dead_letter
+        (atau setidaknya jumlahnya dicatat di log), tidak hilang diam-diam.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self.flush(deadline)
+        remaining = self._take_all()
+        if remaining:
+            self._dead_letter_remaining(remaining)
+        logger.info("Ingest buffer stopped")
+
+    def flush(self, deadline: Optional[float] = None) -> int:
+        """
+        Kuras antrian sampai kosong. Mengembalikan jumlah baris yang diproses
+        (tersimpan, dijadwalkan ulang atau dipindah ke dead letter).
+
+        Tanpa `deadline` flush berhenti pada gangguan database pertama (baris
+        tetap di antrian); dengan `deadline` (time.monotonic()) flush dicoba
+        lagi dengan backoff sampai batas waktu itu.
+        """
+        written = 0
+        delay = _STOP_RETRY_MIN
+        while True:
+            count = self._flush_batch()
+            if count == 0:
+                return written
+            if count > 0:
+                written += count
+                delay = _STOP_RETRY_MIN
+                continue
+            left = deadline - time.monotonic() if deadline is not None else 0
+            if left <= 0:
+                return written
+            time.sleep(min(delay, left))
+            delay = min(delay * 2, _STOP_RETRY_MAX)
+
+    def _take_batch(self) -> List[Entry]:
+        with self._cond:
+            batch = []
+            while self._queue and len(batch) < self.flush_max_rows:
+                batch.append(self._queue.popleft())
+            INGEST_QUEUE_SIZE.set(len(self._queue))
+            return batch
+
+    def _take_all(self) -> List[Entry]:
+        with self._cond:
+            batch = list(self._queue)
+            self._queue.clear()
+            INGEST_QUEUE_SIZE.set(0)
+            return batch
+
+    def _requeue(self, batch: List[Entry]) -> None:
+        with self._cond:
+            self._queue.extendleft(reversed(batch))
+            INGEST_QUEUE_SIZE.set(len(self._queue))
+
+    def _flush_batch(self) -> int:
+        with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            rows = [row for row, _ in batch]
+            inserted = {}
+            try:
+                inserted = self._write(rows)
+                written = len(batch)
+            except _TRANSIENT_ERRORS as e:
+                # Kembalikan ke antrian, akan dicoba lagi pada flush berikutnya
+                self._requeue(batch)
+                logger.error(f"Error flushing ingest buffer: {str(e)}")
+                return -1
+            except Exception as e:
+                logger.warning(f"Ingest batch of {len(batch)} rows failed, retrying in parts: {str(e)}")
+                middle = len(batch) // 2
+                written = 0
+                for part in (batch[:middle], batch[middle:]) if middle else (batch,):
+                    written += self._write_split(part, inserted)
+
+            INGEST_FLUSH_LATENCY.set(time.perf_counter() - started)
+            INGEST_FLUSHED_ROWS.inc(written)
+            # Hanya untuk klien/cache di proses ini (kosong di app.ingest_gateway);
+            # proses API lain menerima NOTIFY dari insert_readings
+            live_hub.publish_readings(rows, inserted)
+            monitoring_cache.invalidate_devices(device_id for device_id, _ in inserted)
+            return len(batch)
+
+    def _write(self, rows: List[dict]) -> Dict[ReadingKey, int]:
+        db = self.session_factory()
+        try:
+            inserted = self._persist(db, rows)
+            db.commit()
+            return inserted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_split(self, batch: List[Entry], inserted: Dict[ReadingKey, int]) -> int:
+        """
+        Tulis batch; jika gagal, pecah dua secara rekursif sampai baris yang
+        gagal terisolasi. Mengembalikan jumlah baris yang tersimpan.
+        """
+        try:
+            inserted.update(self._write([row for row, _ in batch]))
+            return len(batch)
+        except _TRANSIENT_ERRORS as e:
+            self._requeue(batch)
+            logger.error(f"Error flushing ingest buffer: {str(e)}")
+            return 0
+        except Exception as e:
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                return self._write_split(batch[:middle], inserted) + self._write_split(batch[middle:], inserted)
+            self._reject(batch[0], e)
+            return 0
+
+    def _reject(self, entry: Entry, error: Exception) -> None:
+        row, attempts = entry
+        attempts += 1
+        if attempts < self.max_attempts:
+            # Ke belakang antrian supaya baris lain tidak tertahan
+            with self._cond:
+                self._queue.append((row, attempts))
+                INGEST_QUEUE_SIZE.set(len(self._queue))
+            return
+
+        INGEST_DEAD_LETTER_ROWS.inc()
+        payload = _payload(row)
+        db = self.session_factory()
+        try:
+            db.add(models.IngestDeadLetter(
+                device_id=row.get("device_id"),
+                payload=payload,
+                error=str(error)[:500],
+                attempts=attempts
+            ))
+            db.commit()
+            logger.error(f"Ingest row moved to dead letter after {attempts} attempts: {payload}: {str(error)}")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Dropping ingest row after {attempts} attempts: {payload}: {str(error)} ({str(e)})")
+        finally:
+            db.close()
+
+    def _dead_letter_remaining(self, batch: List[Entry]) -> None:
+        """
+        Pindahkan sisa antrian yang tidak sempat di-flush saat shutdown ke
+        ingest_dead_letter dalam satu transaksi. Jika database tetap tidak
+        bisa dihubungi, jumlah baris yang hilang dicatat di log.
+        """
+        db = self.session_factory()
+        try:
+            db.add_all(
+                models.IngestDeadLetter(
+                    device_id=row.get("device_id"),
+                    payload=_payload(row),
+                    error="ingest buffer stopped before flush",
+                    attempts=attempts
+                )
+                for row, attempts in batch
+            )
+            db.commit()
+            INGEST_DEAD_LETTER_ROWS.inc(len(batch))
+            logger.error(f"Moved {len(batch)} unflushed ingest rows to dead letter on shutdown")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Dropping {len(batch)} unflushed ingest rows on shutdown: {str(e)}")
+        finally:
+            db.close()
+
+    def _persist(self, db, batch: List[dict]) -> Dict[ReadingKey, int]:
+        inserted = insert_readings(db, batch)
+
+        # Update last_seen sekali per device untuk seluruh batch
+        touch_devices(db, (row["device_id"] for row in batch), datetime.utcnow())
+        return inserted
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._queue) < self.flush_max_rows:
+                    self._cond.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            try:
+                if self._flush_batch() < 0:
+                    # Database bermasalah, beri jeda sebelum mencoba lagi
+                    time.sleep(1)
+            except Exception as e:
+                logger.error(f"Error in ingest flusher: {str(e)}")
+                time.sleep(1)
+
+
+def _payload(row: dict) -> dict:
+    # Baris sensor_data sebagai JSON untuk kolom ingest_dead_letter.payload
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+def is_buffered() -> bool:
+    return INGEST_DURABILITY == "buffered"
+
+
+ingest_buffer = IngestBuffer()
@@ -0,0 +1,329 @@
+"""
+Gateway ingest asyncio untuk site yang tidak nyaman memakai HTTP.
+
+Listener (TCP dan UDP memakai nomor port yang sama):
+    --line-port    pembacaan per baris, JSON (field sama dengan POST /sensor)
+                   atau CSV: uid,timestamp,suhu,ph,do,tds,ammonia,salinitas
+    --binary-port  record biner 64 byte (lihat app.reading_codec)
+
+TCP membalas setiap pembacaan: mode baris "OK" / "ERR <alasan>", mode biner
+satu byte status (lihat STATUS_CODES). UDP tidak membalas.
+
+Pembacaan divalidasi terhadap registry device yang sama dengan API
+(device_cache + resolve_devices) lalu dimasukkan ke IngestBuffer sehingga
+ditulis dengan bulk insert yang sama dengan /sensor/batch. Proses ini tidak
+punya klien WebSocket maupun cache monitoring; proses API menerima
+pembacaannya lewat NOTIFY saat commit (app/live_notify.py).
+
+    python -m app.ingest_gateway --line-port 9100 --binary-port 9101 --metrics-port 9102
+"""
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+from prometheus_client import Counter, Gauge, start_http_server
+from pydantic import ValidationError
+
+from app import ingest, reading_codec, schemas
+from app.database import SessionLocal
+from app.device_cache import DeviceState, device_registry
+from app.ingest_buffer import IngestBuffer, IngestQueueFull
+from app.last_seen import last_seen_tracker
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_HOST = os.getenv("GATEWAY_HOST", "0.0.0.0")
+GATEWAY_LINE_PORT = int(os.getenv("GATEWAY_LINE_PORT", "9100"))
+GATEWAY_BINARY_PORT = int(os.getenv("GATEWAY_BINARY_PORT", "9101"))
+GATEWAY_METRICS_PORT = int(os.getenv("GATEWAY_METRICS_PORT", "9102"))
+GATEWAY_IDLE_TIMEOUT = float(os.getenv("GATEWAY_IDLE_TIMEOUT", "900"))
+GATEWAY_DB_WORKERS = int(os.getenv("GATEWAY_DB_WORKERS", "4"))
+GATEWAY_MAX_LINE = 4096
+
+STATUS_CODES = {
+    "ok": 0,
+    "unknown": 1,
+    "inactive": 2,
+    "invalid": 3,
+    "busy": 4,
+}
+
+GATEWAY_CONNECTIONS = Gauge(
+    "aquanotes_gateway_connections",
+    "Koneksi TCP device yang sedang terbuka",
+    ["mode"]
+)
+GATEWAY_READINGS = Counter(
+    "aquanotes_gateway_readings_total",
+    "Pembacaan yang diterima gateway per hasil",
+    ["transport", "result"]
+)
+
+
+def parse_line(line: bytes) -> dict:
+    """
+    Parse satu baris JSON atau CSV. Raise ValueError jika tidak valid.
+    """
+    text = line.strip().decode("utf-8", "replace")
+    if text.startswith("{"):
+        try:
+            return schemas.SensorDataCreate.model_validate_json(text).model_dump()
+        except ValidationError as e:
+            raise ValueError(str(e))
+
+    parts = text.split(",")
+    if len(parts) != 2 + len(ingest.SENSOR_FIELDS):
+        raise ValueError("Expected uid,timestamp," + ",".join(ingest.SENSOR_FIELDS))
+    reading = {"uid": parts[0].strip(), "timestamp": parts[1].strip()}
+    for field, value in zip(ingest.SENSOR_FIELDS, parts[2:]):
+        reading[field] = float(value)
+    return reading
+
+
+class IngestGateway:
+    def __init__(self, buffer: IngestBuffer, db_workers: int = GATEWAY_DB_WORKERS):
+        self.buffer = buffer
+        # Lookup database (cache miss) dijalankan di thread pool kecil agar
+        # event loop tidak terblokir dan koneksi pool tidak habis
+        self._executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="gateway-db")
+        self._waiters = {}  # uid -> Future[DeviceState | None]
+        self._tasks = set()
+
+    def _resolve_blocking(self, uids: List[str], now: datetime) -> Dict[str, DeviceState]:
+        db = SessionLocal()
+        try:
+            return ingest.resolve_devices(db, uids, now)
+        finally:
+            db.close()
+
+    async def _resolve_pending(self) -> None:
+        # Cache miss dari semua koneksi dalam satu putaran event loop
+        # digabung jadi satu query (badai reconnect tidak jadi N query)
+        await asyncio.sleep(0)
+        waiters, self._waiters = self._waiters, {}
+        loop = asyncio.get_running_loop()
+        try:
+            states = await loop.run_in_executor(
+                self._executor, self._resolve_blocking, list(waiters), datetime.utcnow()
+            )
+        except Exception as e:
+            for future in waiters.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for uid, future in waiters.items():
+            if not future.done():
+                future.set_result(states.get(uid))
+
+    async def resolve(self, uids, now: datetime) -> Dict[str, DeviceState]:
+        states = {}
+        missing = {}
+        for uid in set(uids):
+            hit, state = device_registry.peek(uid)
+            due = state is not None and state.is_active and state.deactivate_at and state.deactivate_at <= now
+            if hit and not due:
+                if state is not None:
+                    states[uid] = state
+                continue
+            future = self._waiters.get(uid)
+            if future is None:
+                if not self._waiters:
+                    task = asyncio.ensure_future(self._resolve_pending())
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                future = self._waiters[uid] = asyncio.get_running_loop().create_future()
+            missing[uid] = future
+        for uid, future in missing.items():
+            state = await future
+            if state is not None:
+                states[uid] = state
+        return states
+
+    async def accept(self, readings: List[dict], transport: str) -> List[str]:
+        """
+        Validasi dan enqueue pembacaan. Mengembalikan status per pembacaan
+        (kunci STATUS_CODES).
+        """
+        now = datetime.utcnow()
+        states = await self.resolve((reading["uid"] for reading in readings), now)
+
+        statuses = []
+        rows = []
+        row_indexes = []
+        for reading in readings:
+            state = states.get(reading["uid"])
+            if state is None:
+                statuses.append("unknown")
+                continue
+            if not state.is_active:
+                statuses.append("inactive")
+                continue
+            try:
+                rows.append(ingest.to_row(state.id, reading))
+            except ValueError:
+                statuses.append("invalid")
+                continue
+            row_indexes.append(len(statuses))
+            statuses.append("ok")
+
+        if rows:
+            try:
+                self.buffer.enqueue_many(rows)
+            except IngestQueueFull:
+                for index in row_indexes:
+                    statuses[index] = "busy"
+
+        for status in statuses:
+            GATEWAY_READINGS.labels(transport, status).inc()
+        return statuses
+
+    async def handle_lines(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        GATEWAY_CONNECTIONS.labels("line").inc()
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), GATEWAY_IDLE_TIMEOUT)
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    reading = parse_line(line)
+                except ValueError:
+                    GATEWAY_READINGS.labels("tcp", "invalid").inc()
+                    writer.write(b"ERR invalid\n")
+                else:
+                    status = (await self.accept([reading], "tcp"))[0]
+                    writer.write(b"OK\n" if status == "ok" else f"ERR {status}\n".encode())
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            GATEWAY_CONNECTIONS.labels("line").dec()
+            writer.close()
+
+    async def handle_binary(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        GATEWAY_CONNECTIONS.labels("binary").inc()
+        try:
+            while True:
+                record = await asyncio.wait_for(
+                    reader.readexactly(reading_codec.RECORD_SIZE), GATEWAY_IDLE_TIMEOUT
+                )
+                readings = reading_codec.decode_records(record)
+                status = (await self.accept(readings, "tcp"))[0]
+                writer.write(bytes([STATUS_CODES[status]]))
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            GATEWAY_CONNECTIONS.labels("binary").dec()
+            writer.close()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, gateway: IngestGateway, binary: bool):
+        self.gateway = gateway
+        self.binary = binary
+        # Simpan referensi task agar tidak dikumpulkan GC sebelum selesai
+        self._pending = set()
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            if self.binary:
+                readings = reading_codec.decode_records(data)
+            else:
+                readings = [parse_line(line) for line in data.splitlines() if line.strip()]
+        except ValueError:
+            GATEWAY_READINGS.labels("udp", "invalid").inc()
+            return
+        if readings:
+            task = asyncio.ensure_future(self.gateway.accept(readings, "udp"))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+
+async def run(host: str, line_port: int, binary_port: int, metrics_port: int) -> None:
+    buffer = IngestBuffer()
+    buffer.start()
+    last_seen_tracker.start()
+    gateway = IngestGateway(buffer)
+    loop = asyncio.get_running_loop()
+
+    if metrics_port:
+        start_http_server(metrics_port)
+
+    servers = []
+    transports = []
+    if line_port:
+        servers.append(await asyncio.start_server(
+            gateway.handle_lines, host, line_port, limit=GATEWAY_MAX_LINE, backlog=4096
+        ))
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(gateway, binary=False), local_addr=(host, line_port)
+        )
+        transports.append(transport)
+    if binary_port:
+        servers.append(await asyncio.start_server(
+            gateway.handle_binary, host, binary_port, backlog=4096
+        ))
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(gateway, binary=True), local_addr=(host, binary_port)
+        )
+        transports.append(transport)
+    logger.info(f"Ingest gateway listening on {host} (line={line_port}, binary={binary_port}, metrics={metrics_port})")
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    await stop.wait()
+
+    logger.info("Shutting down ingest gateway")
+    for server in servers:
+        server.close()
+    for transport in transports:
+        transport.close()
+    # Beri kesempatan pembacaan UDP yang masih diproses untuk masuk antrian
+    await asyncio.sleep(0.5)
+    await loop.run_in_executor(None, buffer.stop)
+    await loop.run_in_executor(None, last_seen_tracker.stop)
+    gateway.close()
+
+
+def _raise_fd_limit() -> None:
+    # Puluhan ribu koneksi device butuh file descriptor sebanyak itu;
+    # naikkan soft limit sampai hard limit proses
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+    logger.info(f"File descriptor limit: {resource.getrlimit(resource.RLIMIT_NOFILE)[0]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=GATEWAY_HOST)
+    parser.add_argument("--line-port", type=int, default=GATEWAY_LINE_PORT, help="0 untuk menonaktifkan")
+    parser.add_argument("--binary-port", type=int, default=GATEWAY_BINARY_PORT, help="0 untuk menonaktifkan")
+    parser.add_argument("--metrics-port", type=int, default=GATEWAY_METRICS_PORT, help="0 untuk menonaktifkan")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    _raise_fd_limit()
+    asyncio.run(run(args.host, args.line_port, args.binary_port, args.metrics_port))
+
+
+if __name__ == "__main__":
+    main()
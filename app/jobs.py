@@ -0,0 +1,155 @@
+"""
+Antrian job background di tabel jobs.
+
+Job dibuat dengan `enqueue` di transaksi yang sama dengan perubahan yang
+memicunya, lalu diambil worker (thread di setiap replika API) dengan
+SELECT ... FOR UPDATE SKIP LOCKED sehingga beberapa replika bisa berjalan
+bersamaan tanpa mengambil job yang sama. Progres dan heartbeat ditulis per
+batch; job berstatus running yang heartbeat-nya lebih tua dari
+JOB_LEASE_SECONDS (worker mati) diambil ulang. Handler harus aman diulang.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from prometheus_client import Counter
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app import compact_sensor_data, models, purge
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+
+JOBS_FINISHED = Counter(
+    "aquanotes_jobs_finished_total",
+    "Job background yang selesai atau gagal",
+    ["type", "status"]
+)
+
+HANDLERS = {
+    "purge_device": purge.purge_device,
+    "purge_user": purge.purge_user,
+    "compact_sensor_data": compact_sensor_data.compact_job,
+}
+
+
+def enqueue(db: Session, job_type: str, payload: dict, created_by: Optional[int] = None) -> models.Job:
+    """
+    Tambahkan job (commit oleh caller). Worker membangunkan diri pada
+    polling berikutnya.
+    """
+    job = models.Job(
+        type=job_type,
+        status="pending",
+        payload=payload,
+        progress={},
+        attempts=0,
+        created_by=created_by,
+        created_at=datetime.utcnow()
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def claim_job(db: Session) -> Optional[models.Job]:
+    now = datetime.utcnow()
+    job = db.query(models.Job).filter(
+        or_(
+            models.Job.status == "pending",
+            and_(
+                models.Job.status == "running",
+                models.Job.heartbeat_at < now - timedelta(seconds=JOB_LEASE_SECONDS)
+            )
+        )
+    ).order_by(models.Job.id.asc()).with_for_update(skip_locked=True).first()
+    if not job:
+        db.rollback()
+        return None
+    job.status = "running"
+    job.attempts += 1
+    job.started_at = job.started_at or now
+    job.heartbeat_at = now
+    db.commit()
+    return job
+
+
+def _update(job_id: int, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.Job).filter(models.Job.id == job_id).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_job(job_id: int, job_type: str, payload: dict, progress: Dict[str, int], attempts: int) -> bool:
+    def report(current: Dict[str, int]) -> None:
+        _update(job_id, progress=dict(current), heartbeat_at=datetime.utcnow())
+
+    handler = HANDLERS.get(job_type)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job type {job_type}")
+        handler(payload, progress, report)
+    except Exception as e:
+        logger.error(f"Job {job_id} ({job_type}) failed on attempt {attempts}: {str(e)}")
+        failed = handler is None or attempts >= JOB_MAX_ATTEMPTS
+        _update(
+            job_id,
+            status="failed" if failed else "pending",
+            progress=dict(progress),
+            error=str(e)[:500],
+            finished_at=datetime.utcnow() if failed else None
+        )
+        if failed:
+            JOBS_FINISHED.labels(job_type, "failed").inc()
+        return False
+
+    _update(job_id, status="done", progress=dict(progress), error=None, finished_at=datetime.utcnow())
+    JOBS_FINISHED.labels(job_type, "done").inc()
+    logger.info(f"Job {job_id} ({job_type}) done: {progress}")
+    return True
+
+
+def run_pending() -> int:
+    """
+    Jalankan job yang tersedia sampai antrian kosong atau ada yang gagal
+    (dicoba lagi pada polling berikutnya). Mengembalikan jumlah job selesai.
+    """
+    done = 0
+    while True:
+        db = SessionLocal()
+        try:
+            job = claim_job(db)
+            if not job:
+                return done
+            claimed = (job.id, job.type, dict(job.payload), dict(job.progress or {}), job.attempts)
+        finally:
+            db.close()
+        if not run_job(*claimed):
+            return done
+        done += 1
+
+
+def job_worker_loop() -> None:
+    logger.info("Starting job worker")
+    while True:
+        try:
+            run_pending()
+        except Exception as e:
+            logger.error(f"Error in job worker: {str(e)}")
+        time.sleep(JOB_POLL_SECONDS)
+
+
+def start_job_worker() -> None:
+    thread = threading.Thread(target=job_worker_loop, daemon=True)
+    thread.start()
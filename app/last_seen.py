@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+LAST_SEEN_FLUSH_SECONDS = float(os.getenv("LAST_SEEN_FLUSH_SECONDS", "5"))
+
+_FLUSH_SQL = text(
+    """
+    UPDATE devices AS d
+    SET last_seen = GREATEST(d.last_seen, v.last_seen),
+        status = 'online'
+    FROM unnest(CAST(:ids AS INTEGER[]), CAST(:seen AS TIMESTAMP[])) AS v(id, last_seen)
+    WHERE d.id = v.id
+      AND d.is_active IS NOT FALSE
+    """
+)
+
+
+class LastSeenTracker:
+    """
+    Menyimpan last_seen device di memori dan menulisnya ke tabel devices
+    dengan satu bulk UPDATE setiap LAST_SEEN_FLUSH_SECONDS.
+
+    Device yang belum diketahui online di proses ini ditulis langsung
+    (transisi offline -> online terlihat segera); pembacaan berikutnya
+    hanya memperbarui nilai di memori.
+    """
+
+    def __init__(self, flush_seconds: float = LAST_SEEN_FLUSH_SECONDS, session_factory=SessionLocal):
+        self.flush_seconds = flush_seconds
+        self.session_factory = session_factory
+        self._pending = {}  # device_id -> last_seen
+        self._online = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def touch(self, db: Session, device_ids: Iterable[int], now: datetime) -> None:
+        """
+        Catat pembacaan untuk device. Device yang statusnya belum online
+        di-UPDATE pada session `db` (commit oleh caller).
+        """
+        immediate = []
+        with self._lock:
+            for device_id in set(device_ids):
+                if device_id in self._online:
+                    self._pending[device_id] = now
+                else:
+                    immediate.append(device_id)
+                    self._online.add(device_id)
+                    self._pending.pop(device_id, None)
+
+        if immediate:
+            db.query(models.Device).filter(
+                models.Device.id.in_(immediate)
+            ).update(
+                {models.Device.last_seen: now, models.Device.status: "online"},
+                synchronize_session=False
+            )
+
+    def forget(self, device_id: int) -> None:
+        """
+        Dipanggil saat status device diubah di luar ingest (offline,
+        maintenance, dinonaktifkan, dilepas) agar pembacaan berikutnya
+        ditulis langsung dan nilai lama tidak di-flush.
+        """
+        with self._lock:
+            self._online.discard(device_id)
+            self._pending.pop(device_id, None)
+
+    def get(self, device_id: int) -> Optional[datetime]:
+        with self._lock:
+            return self._pending.get(device_id)
+
+    def flush(self) -> int:
+        """
+        Tulis semua last_seen yang tertunda dalam satu UPDATE.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        if not pending:
+            return 0
+
+        db = self.session_factory()
+        try:
+            db.execute(_FLUSH_SQL, {
+                "ids": list(pending.keys()),
+                "seen": list(pending.values())
+            })
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Kembalikan nilai yang belum tertulis tanpa menimpa yang lebih baru
+            with self._lock:
+                for device_id, seen in pending.items():
+                    current = self._pending.get(device_id)
+                    if current is None or current < seen:
+                        self._pending[device_id] = seen
+            raise
+        finally:
+            db.close()
+        return len(pending)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        logger.info("Starting last_seen flusher")
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing last_seen: {str(e)}")
+
+
+last_seen_tracker = LastSeenTracker()
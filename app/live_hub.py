@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Set
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+LIVE_QUEUE_MAX = int(os.getenv("LIVE_QUEUE_MAX", "100"))
+
+LIVE_CLIENTS = Gauge(
+    "aquanotes_live_clients",
+    "Jumlah klien WebSocket monitoring yang terhubung"
+)
+LIVE_DROPPED = Counter(
+    "aquanotes_live_dropped_total",
+    "Pesan live yang dibuang karena antrian klien penuh"
+)
+
+
+class LiveSubscriber:
+    """
+    Satu koneksi WebSocket. Pesan diantre di event loop milik koneksi;
+    jika klien lambat dan antrian penuh, pesan terlama dibuang.
+    """
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, queue_max: int = LIVE_QUEUE_MAX):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_max)
+        self.device_ids: Set[int] = set()
+
+    def _put(self, message: dict) -> None:
+        # Dipanggil di event loop subscriber
+        if self.queue.full():
+            self.queue.get_nowait()
+            LIVE_DROPPED.inc()
+        self.queue.put_nowait(message)
+
+
+class LiveHub:
+    """
+    Fan-out in-process pembacaan baru ke klien WebSocket, diindeks per device.
+    `publish` aman dipanggil dari thread mana pun (handler sync FastAPI,
+    flusher ingest buffer, listener NOTIFY); tanpa subscriber untuk device
+    tersebut biayanya hanya satu lookup dict. Pembacaan dari proses lain
+    (replika API, app.ingest_gateway) masuk lewat app.live_notify.
+    """
+
+    def __init__(self):
+        self._by_device: Dict[int, Set[LiveSubscriber]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber: LiveSubscriber, device_ids: Iterable[int]) -> None:
+        device_ids = set(device_ids)
+        with self._lock:
+            for device_id in subscriber.device_ids - device_ids:
+                subscribers = self._by_device.get(device_id)
+                if subscribers:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._by_device[device_id]
+            for device_id in device_ids - subscriber.device_ids:
+                self._by_device.setdefault(device_id, set()).add(subscriber)
+            subscriber.device_ids = device_ids
+
+    def unsubscribe(self, subscriber: LiveSubscriber) -> None:
+        self.subscribe(subscriber, ())
+
+    def has_subscribers(self) -> bool:
+        return bool(self._by_device)
+
+    def subscribed_devices(self, device_ids: Iterable[int]) -> Set[int]:
+        with self._lock:
+            return {device_id for device_id in device_ids if device_id in self._by_device}
+
+    def publish(self, device_id: int, message: dict) -> None:
+        with self._lock:
+            subscribers = list(self._by_device.get(device_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._put, message)
+            except RuntimeError:
+                # Event loop sudah ditutup (shutdown)
+                pass
+
+    def publish_readings(self, rows: List[dict], inserted: Dict) -> None:
+        """
+        Kirim baris yang baru tersimpan (hasil insert_readings, setelah commit).
+        Duplikat (retry firmware) tidak dikirim ulang.
+        """
+        if not self._by_device:
+            return
+        for row in rows:
+            row_id = inserted.get((row["device_id"], row["timestamp"]))
+            if row_id is None:
+                continue
+            self.publish(row["device_id"], {
+                "type": "reading",
+                "device_id": row["device_id"],
+                "data": {
+                    "id": row_id,
+                    **{key: value for key, value in row.items() if key != "device_id"},
+                    "timestamp": row["timestamp"].isoformat()
+                }
+            })
+
+
+live_hub = LiveHub()
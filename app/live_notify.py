@@ -0,0 +1,181 @@
+"""
+Sinyal pembacaan baru antar proses lewat PostgreSQL LISTEN/NOTIFY.
+
+live_hub (WebSocket monitoring) dan monitoring_cache hanya hidup di satu
+proses, sehingga pembacaan yang disimpan replika API lain atau
+app.ingest_gateway tidak terlihat di sana. insert_readings mengirim NOTIFY
+di transaksi penulisnya (terkirim saat commit, tidak pernah untuk
+transaksi yang di-rollback) berisi (device_id, id, timestamp) baris baru.
+`LiveListener` di setiap proses API menerima notifikasi dari proses lain,
+menginvalidasi cache monitoring untuk device tersebut dan meneruskan
+pembacaannya ke klien WebSocket yang subscribe. Notifikasi dari proses
+sendiri dilewati karena sudah dikirim langsung setelah commit.
+
+Notifikasi yang terkirim saat listener sedang reconnect hilang; cache
+monitoring tetap dibatasi MONITORING_CACHE_TTL_SECONDS dan klien WebSocket
+menerima snapshot baru saat menyambung ulang.
+"""
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal, engine
+from app.live_hub import live_hub
+from app.monitoring_cache import monitoring_cache
+
+logger = logging.getLogger(__name__)
+
+LIVE_NOTIFY = os.getenv("LIVE_NOTIFY", "on").strip().lower()
+LIVE_NOTIFY_RETRY_SECONDS = float(os.getenv("LIVE_NOTIFY_RETRY_SECONDS", "5"))
+
+CHANNEL = "aquanotes_readings"
+# Payload NOTIFY dibatasi 8000 byte; satu baris sekitar 50 byte
+_ROWS_PER_NOTIFY = 100
+
+# Penanda proses ini, untuk melewati notifikasi sendiri
+SOURCE = uuid.uuid4().hex
+
+_NOTIFY_SQL = text(f"SELECT pg_notify('{CHANNEL}', payload) FROM unnest(CAST(:payloads AS TEXT[])) AS payload")
+
+_FETCH_SQL = text(
+    f"""
+    SELECT id, device_id, timestamp, {", ".join(f'"{field}"' for field in models.SENSOR_FIELDS)}
+    FROM sensor_data
+    WHERE id = ANY(CAST(:ids AS INTEGER[]))
+      AND timestamp >= :start AND timestamp <= :end
+    ORDER BY timestamp
+    """
+)
+
+
+def is_enabled() -> bool:
+    return LIVE_NOTIFY == "on"
+
+
+def notify_readings(db: Session, inserted: Dict) -> None:
+    """
+    Antrekan NOTIFY untuk baris yang baru disimpan ({(device_id, timestamp):
+    id}, hasil insert_readings). Dikirim Postgres saat `db` commit.
+    """
+    if not inserted or not is_enabled():
+        return
+    entries = [
+        [device_id, row_id, timestamp.isoformat()]
+        for (device_id, timestamp), row_id in inserted.items()
+    ]
+    payloads = [
+        json.dumps({"s": SOURCE, "r": entries[i:i + _ROWS_PER_NOTIFY]}, separators=(",", ":"))
+        for i in range(0, len(entries), _ROWS_PER_NOTIFY)
+    ]
+    db.execute(_NOTIFY_SQL, {"payloads": payloads})
+
+
+class LiveListener:
+    """
+    Thread yang LISTEN pada CHANNEL dengan koneksi khusus (di luar pool)
+    dan menyambung ulang setelah LIVE_NOTIFY_RETRY_SECONDS jika koneksi
+    putus.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if not is_enabled() or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _run(self) -> None:
+        logger.info(f"Listening for readings on {CHANNEL}")
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"Live notify listener error: {str(e)}")
+                self._stop.wait(LIVE_NOTIFY_RETRY_SECONDS)
+
+    def _listen(self) -> None:
+        connection = engine.raw_connection()
+        dbapi = connection.driver_connection
+        # Koneksi yang sedang LISTEN tidak boleh kembali ke pool
+        connection.detach()
+        try:
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while not self._stop.is_set():
+                if not select.select([dbapi], [], [], 1.0)[0]:
+                    continue
+                dbapi.poll()
+                payloads = [notify.payload for notify in dbapi.notifies]
+                dbapi.notifies.clear()
+                if payloads:
+                    self.handle(payloads)
+        finally:
+            dbapi.close()
+
+    def handle(self, payloads: Iterable[str]) -> None:
+        entries: List[list] = []
+        for payload in payloads:
+            try:
+                message = json.loads(payload)
+            except ValueError:
+                continue
+            if message.get("s") != SOURCE:
+                entries.extend(message.get("r", ()))
+        if not entries:
+            return
+
+        monitoring_cache.invalidate_devices(device_id for device_id, _, _ in entries)
+        if not live_hub.has_subscribers():
+            return
+        subscribed = live_hub.subscribed_devices(device_id for device_id, _, _ in entries)
+        wanted = [
+            (row_id, datetime.fromisoformat(timestamp))
+            for device_id, row_id, timestamp in entries
+            if device_id in subscribed
+        ]
+        if wanted:
+            self._publish(wanted)
+
+    def _publish(self, wanted: List[tuple]) -> None:
+        timestamps = [timestamp for _, timestamp in wanted]
+        db = self.session_factory()
+        try:
+            result = db.execute(_FETCH_SQL, {
+                "ids": [row_id for row_id, _ in wanted],
+                # Rentang timestamp untuk partition pruning
+                "start": min(timestamps),
+                "end": max(timestamps)
+            }).mappings().all()
+        finally:
+            db.close()
+        rows = []
+        inserted = {}
+        for record in result:
+            row = dict(record)
+            inserted[(row["device_id"], row["timestamp"])] = row.pop("id")
+            rows.append(row)
+        live_hub.publish_readings(rows, inserted)
+
+
+live_listener = LiveListener()
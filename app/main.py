@@ -10,15 +10,27 @@ from app.routers import (
     monitoring, 
     export,
     device_threshold,
-    notifications
+    notifications,
+    jobs
 )
 from app.background_tasks import start_background_task
+from app.ingest_buffer import ingest_buffer, is_buffered
+from app.last_seen import last_seen_tracker
+from app.live_notify import live_listener
 from app.database import engine, Base
 from app.migrations import (
     ensure_user_role_column,
     ensure_user_notification_cooldown_column,
     ensure_device_is_active_column,
-    ensure_device_deactivate_at_column
+    ensure_device_deactivate_at_column,
+    ensure_device_data_generation_column,
+    ensure_sensor_data_unique_reading,
+    ensure_sensor_data_partitioned,
+    ensure_sensor_rollups_backfilled,
+    ensure_sensor_rollup_field_counts,
+    ensure_retention_indexes,
+    ensure_device_latest_last_id_column,
+    ensure_device_latest_backfilled
 )
 import logging
 import os
@@ -48,6 +60,7 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Mode", "X-Next-Cursor", "X-Prev-Cursor", "X-Downsampled-From", "ETag"],
 )
 
 # Include routers
@@ -61,6 +74,7 @@ app.include_router(monitoring.router)
 app.include_router(export.router)
 app.include_router(device_threshold.router)
 app.include_router(notifications.router)
+app.include_router(jobs.router)
 
 # Create tables and start background task on startup
 @app.on_event("startup")
@@ -71,7 +85,27 @@ async def startup_event():
     ensure_user_notification_cooldown_column(engine)
     ensure_device_is_active_column(engine)
     ensure_device_deactivate_at_column(engine)
+    ensure_device_data_generation_column(engine)
+    ensure_sensor_data_unique_reading(engine)
+    ensure_sensor_data_partitioned(engine)
+    ensure_sensor_rollups_backfilled(engine)
+    ensure_sensor_rollup_field_counts(engine)
+    ensure_retention_indexes(engine)
+    ensure_device_latest_last_id_column(engine)
+    ensure_device_latest_backfilled(engine)
     
     # Jalankan background tasks
     start_background_task()
+    if is_buffered():
+        ingest_buffer.start()
+    live_listener.start()
     logger.info("Application startup complete")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    # Pastikan semua data sensor yang masih di antrian tersimpan
+    if is_buffered():
+        ingest_buffer.stop()
+    last_seen_tracker.stop()
+    live_listener.stop()
+    logger.info("Application shutdown complete")
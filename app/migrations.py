@@ -1,4 +1,12 @@
+import logging
+
 from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import compact_sensor_data, jobs, models, partitioning, rollups
+from app.device_latest import backfill_latest
+
+logger = logging.getLogger(__name__)
 
 
 def ensure_user_role_column(engine) -> None:
@@ -94,3 +102,182 @@ def ensure_device_deactivate_at_column(engine) -> None:
                     "ADD COLUMN deactivate_at TIMESTAMP NULL"
                 )
             )
+
+
+def ensure_device_data_generation_column(engine) -> None:
+    """
+    Best-effort migration for adding devices.data_generation on existing databases.
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text(
+                """
+                SELECT 1
+                FROM information_schema.columns
+                WHERE table_name = 'devices'
+                  AND column_name = 'data_generation'
+                """
+            )
+        ).scalar()
+        if not exists:
+            conn.execute(
+                text(
+                    "ALTER TABLE devices "
+                    "ADD COLUMN data_generation INTEGER NOT NULL DEFAULT 0"
+                )
+            )
+
+
+def ensure_sensor_data_unique_reading(engine) -> None:
+    """
+    Best-effort migration for adding the (device_id, timestamp) unique constraint
+    on sensor_data. Startup does not build the index itself: a
+    compact_sensor_data job (app/jobs.py) is enqueued once, which removes
+    duplicate readings in small batches, builds the index CONCURRENTLY and
+    attaches it with ADD CONSTRAINT ... USING INDEX. If that job failed it is
+    not enqueued again; fix the cause and run `python -m app.compact_sensor_data`.
+    Once the constraint exists the redundant ix_sensor_data_device_timestamp
+    index is dropped.
+    """
+    if compact_sensor_data.constraint_exists(engine):
+        with engine.connect() as conn:
+            redundant = conn.execute(
+                text("SELECT 1 FROM pg_indexes WHERE tablename = 'sensor_data' AND indexname = :name"),
+                {"name": compact_sensor_data.REDUNDANT_INDEX}
+            ).scalar()
+        if redundant:
+            autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+            with autocommit.connect() as conn:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {compact_sensor_data.REDUNDANT_INDEX}"))
+        return
+
+    with engine.connect() as conn:
+        if partitioning.is_partitioned(conn):
+            # Tabel partitioned selalu dibuat dengan constraint ini, dan
+            # CREATE INDEX CONCURRENTLY tidak didukung pada tabel induknya
+            logger.warning("Partitioned sensor_data has no unique (device_id, timestamp) constraint")
+            return
+
+    with Session(bind=engine) as db:
+        job = db.query(models.Job).filter(
+            models.Job.type == "compact_sensor_data"
+        ).order_by(models.Job.id.desc()).first()
+        if job is None:
+            jobs.enqueue(db, "compact_sensor_data", {})
+            db.commit()
+            logger.info("sensor_data has no unique (device_id, timestamp) constraint; compact job enqueued")
+        elif job.status in ("failed", "done"):
+            logger.warning(
+                f"compact_sensor_data job {job.id} is {job.status} ({job.error}) but the unique constraint "
+                "is missing. Run `python -m app.compact_sensor_data`."
+            )
+
+
+def ensure_sensor_data_partitioned(engine) -> None:
+    """
+    Best-effort migration for converting sensor_data to monthly partitions.
+    Empty tables (new databases) are converted right away; tables with data
+    must be migrated in batches with `python -m app.partitioning migrate`.
+    Future partitions are maintained by the partition maintenance thread.
+    """
+    partitioning.ensure_partitioned_if_empty(engine)
+
+
+def ensure_sensor_rollups_backfilled(engine) -> None:
+    """
+    Rollup tables are created by create_all and filled at ingest. Existing
+    readings are not backfilled automatically because it can take long;
+    warn so it can be run with `python -m app.rollups recompute`.
+    """
+    with engine.begin() as conn:
+        has_rollups = conn.execute(text("SELECT 1 FROM sensor_rollup_1d LIMIT 1")).scalar()
+        if has_rollups:
+            return
+        has_readings = conn.execute(text("SELECT 1 FROM sensor_data LIMIT 1")).scalar()
+        if has_readings:
+            logger.warning(
+                "Rollup tables are empty but sensor_data has readings. "
+                "Run `python -m app.rollups recompute` to backfill them."
+            )
+
+
+def ensure_sensor_rollup_field_counts(engine) -> None:
+    """
+    Best-effort migration for adding the per-field non-null counts
+    (<param>_count) to the rollup tables on existing databases. Old rows
+    only know the reading count, so it is used for fields that have values
+    (exact unless some readings had that parameter null); sums of all-null
+    buckets that an earlier merge turned into 0 are reset to NULL. Days that
+    still have raw readings can be made exact with
+    `python -m app.rollups recompute`.
+    """
+    with engine.begin() as conn:
+        for model, _, _ in rollups.RESOLUTIONS.values():
+            table = model.__tablename__
+            existing = set(conn.execute(
+                text("SELECT column_name FROM information_schema.columns WHERE table_name = :table"),
+                {"table": table}
+            ).scalars())
+            missing = [f for f in rollups.SENSOR_FIELDS if f"{f}_count" not in existing]
+            if not missing:
+                continue
+            for f in missing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {f}_count INTEGER NOT NULL DEFAULT 0"))
+            conn.execute(text(
+                f"UPDATE {table} SET "
+                + ", ".join(
+                    f"{f}_sum = CASE WHEN {f}_min IS NULL THEN NULL ELSE {f}_sum END, "
+                    f"{f}_count = CASE WHEN {f}_min IS NULL THEN 0 ELSE count END"
+                    for f in missing
+                )
+            ))
+            logger.info(f"Added per-field counts to {table} ({', '.join(missing)})")
+
+
+def ensure_retention_indexes(engine) -> None:
+    """
+    Best-effort migration for the indexes used by the retention job
+    (notifications.timestamp, auth_tokens.expires_at) on existing databases.
+    Built CONCURRENTLY so startup does not block writes.
+    """
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    with autocommit.connect() as conn:
+        for index, table, column in (
+            ("ix_notifications_timestamp", "notifications", "timestamp"),
+            ("ix_auth_tokens_expires_at", "auth_tokens", "expires_at"),
+        ):
+            exists = conn.execute(
+                text("SELECT 1 FROM pg_indexes WHERE indexname = :name"),
+                {"name": index}
+            ).scalar()
+            if not exists:
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} ({column})"))
+
+
+def ensure_device_latest_last_id_column(engine) -> None:
+    """
+    Best-effort migration for adding device_latest.last_sensor_data_id on existing databases.
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text(
+                """
+                SELECT 1
+                FROM information_schema.columns
+                WHERE table_name = 'device_latest'
+                  AND column_name = 'last_sensor_data_id'
+                """
+            )
+        ).scalar()
+        if not exists:
+            conn.execute(text("ALTER TABLE device_latest ADD COLUMN last_sensor_data_id INTEGER NULL"))
+            conn.execute(text("UPDATE device_latest SET last_sensor_data_id = sensor_data_id"))
+
+
+def ensure_device_latest_backfilled(engine) -> None:
+    """
+    Best-effort migration for filling device_latest on existing databases
+    (devices that have readings but no device_latest row yet).
+    """
+    with engine.begin() as conn:
+        backfill_latest(conn)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime, Boolean, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -25,7 +25,7 @@ class AuthToken(Base):
     token = Column(String(36), primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
     
     user = relationship("User")
 
@@ -71,11 +71,15 @@ class Device(Base):
     last_seen = Column(DateTime)  # Timestamp terakhir komunikasi
     status = Column(String(10), default='offline')  # 'online', 'offline', 'maintenance'
     connection_interval = Column(Integer, default=5)  # Dalam menit
+    # Naik setiap kali pembacaan device dihapus (retensi, purge, arsip);
+    # bagian dari ETag histori (app/sensor_history.py)
+    data_generation = Column(Integer, nullable=False, default=0, server_default="0")
     
     owner = relationship("User", back_populates="devices")
     kolam = relationship("Kolam", back_populates="device", uselist=False)
     sensor_data = relationship("SensorData", back_populates="device")
     notifications = relationship("Notification", back_populates="device")
+    latest = relationship("DeviceLatest", uselist=False, viewonly=True)
 
 class Kolam(Base):
     __tablename__ = "kolam"
@@ -94,6 +98,8 @@ class Kolam(Base):
     device = relationship("Device", back_populates="kolam")
 
 class SensorData(Base):
+    # Di database tabel ini dipartisi per bulan pada kolom timestamp,
+    # lihat app/partitioning.py
     __tablename__ = "sensor_data"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -109,9 +115,115 @@ class SensorData(Base):
     device = relationship("Device", back_populates="sensor_data")
     
     __table_args__ = (
-        Index('ix_sensor_data_device_timestamp', 'device_id', 'timestamp'),
+        # Satu pembacaan per device per timestamp device (ingest idempotent)
+        UniqueConstraint('device_id', 'timestamp', name='uq_sensor_data_device_timestamp'),
     )
 
+# Kolom parameter kualitas air yang dikirim device
+SENSOR_FIELDS = ("suhu", "ph", "do", "tds", "ammonia", "salinitas")
+
+class SensorRollupMixin:
+    # Agregat per device per bucket waktu, dijaga oleh app/rollups.py.
+    # count = jumlah pembacaan, <param>_count = jumlah nilai non-null
+    # parameter tersebut; rata-rata = <param>_sum / <param>_count
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Awal bucket (timestamp device)
+    count = Column(Integer, nullable=False, default=0)
+    suhu_min = Column(Float)
+    suhu_max = Column(Float)
+    suhu_sum = Column(Float)
+    suhu_count = Column(Integer, nullable=False, default=0)
+    ph_min = Column(Float)
+    ph_max = Column(Float)
+    ph_sum = Column(Float)
+    ph_count = Column(Integer, nullable=False, default=0)
+    do_min = Column(Float)
+    do_max = Column(Float)
+    do_sum = Column(Float)
+    do_count = Column(Integer, nullable=False, default=0)
+    tds_min = Column(Float)
+    tds_max = Column(Float)
+    tds_sum = Column(Float)
+    tds_count = Column(Integer, nullable=False, default=0)
+    ammonia_min = Column(Float)
+    ammonia_max = Column(Float)
+    ammonia_sum = Column(Float)
+    ammonia_count = Column(Integer, nullable=False, default=0)
+    salinitas_min = Column(Float)
+    salinitas_max = Column(Float)
+    salinitas_sum = Column(Float)
+    salinitas_count = Column(Integer, nullable=False, default=0)
+
+class SensorRollup1m(SensorRollupMixin, Base):
+    __tablename__ = "sensor_rollup_1m"
+
+class SensorRollup1h(SensorRollupMixin, Base):
+    __tablename__ = "sensor_rollup_1h"
+
+class SensorRollup1d(SensorRollupMixin, Base):
+    __tablename__ = "sensor_rollup_1d"
+
+class DeviceLatest(Base):
+    # Pembacaan terbaru per device (berdasarkan timestamp device),
+    # di-upsert saat ingest oleh app/device_latest.py
+    __tablename__ = "device_latest"
+    
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    sensor_data_id = Column(Integer)
+    # id sensor_data terbesar yang pernah disimpan untuk device, termasuk
+    # pembacaan terlambat (tidak mengubah kolom "terbaru" lainnya)
+    last_sensor_data_id = Column(Integer)
+    timestamp = Column(DateTime, nullable=False)
+    suhu = Column(Float)
+    ph = Column(Float)
+    do = Column(Float)
+    tds = Column(Float)
+    ammonia = Column(Float)
+    salinitas = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Waktu server
+
+class SensorArchive(Base):
+    # Manifest arsip dingin: satu baris per device per bulan yang sudah
+    # dipindahkan dari sensor_data ke file kolom di ARCHIVE_DIR (app/archive.py)
+    __tablename__ = "sensor_archive"
+    
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    path = Column(String(255), nullable=False)  # Relatif terhadap ARCHIVE_DIR
+    row_count = Column(Integer, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class Job(Base):
+    # Antrian job background (app/jobs.py), mis. purge data device/user
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="pending", index=True)  # 'pending', 'running', 'done', 'failed'
+    payload = Column(JSON, nullable=False)
+    progress = Column(JSON)  # Jumlah baris terhapus per tabel
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String(500))
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # Diperbarui setiap batch; job macet diambil ulang
+    finished_at = Column(DateTime)
+
+class IngestDeadLetter(Base):
+    # Pembacaan yang tetap gagal disimpan oleh ingest buffer setelah
+    # INGEST_MAX_ATTEMPTS percobaan (mis. device sudah dihapus)
+    __tablename__ = "ingest_dead_letter"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer)  # Tanpa FK: device-nya bisa sudah tidak ada
+    payload = Column(JSON, nullable=False)
+    error = Column(String(500))
+    attempts = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Notification(Base):
     __tablename__ = "notifications"
     
@@ -124,7 +236,7 @@ class Notification(Base):
     current_value = Column(Float)
     is_read = Column(Boolean, default=False)
     fcm_sent = Column(Boolean, default=False)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     
     user = relationship("User", back_populates="notifications")
     device = relationship("Device", back_populates="notifications")
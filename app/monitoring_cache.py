@@ -0,0 +1,113 @@
+"""
+Cache respons GET /monitoring per (user, last_n) (LRU berbatas).
+
+Entri dihapus tepat saat isinya berubah:
+- `invalidate_devices` setelah commit pembacaan baru (jalur ingest), untuk
+  semua user yang kolamnya memakai device tersebut;
+- `invalidate_user` setelah relasi kolam/device user berubah (kolam dibuat,
+  diubah, dihapus, device dipindah/dilepas/diganti nama).
+
+Respons yang dihitung bersamaan dengan invalidasi tidak disimpan (lihat
+`start`/`store`) supaya tidak ada data basi yang tertinggal. Ingest dari
+replika lain atau app.ingest_gateway menginvalidasi lewat NOTIFY
+(app/live_notify.py); MONITORING_CACHE_TTL_SECONDS tetap membatasi umur
+entri jika notifikasi terlewat atau LIVE_NOTIFY=off.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+MONITORING_CACHE_TTL_SECONDS = float(os.getenv("MONITORING_CACHE_TTL_SECONDS", "60"))
+MONITORING_CACHE_MAX_SIZE = int(os.getenv("MONITORING_CACHE_MAX_SIZE", "5000"))
+
+CacheKey = Tuple[int, int]  # (user_id, last_n)
+
+
+class MonitoringCache:
+
+    def __init__(self, ttl_seconds: float = MONITORING_CACHE_TTL_SECONDS,
+                 max_size: int = MONITORING_CACHE_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key -> (expires_at, device_ids, response)
+        self._by_device: Dict[int, Set[CacheKey]] = {}
+        # Nomor urut invalidasi terakhir per device/user
+        self._sequence = itertools.count(1)
+        self._device_seq: Dict[int, int] = {}
+        self._user_seq: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for device_id in entry[1]:
+            keys = self._by_device.get(device_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_device[device_id]
+
+    def get(self, user_id: int, last_n: int) -> Optional[Any]:
+        key = (user_id, last_n)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def start(self) -> int:
+        """
+        Tandai awal perhitungan respons; nilai ini diberikan ke `store`.
+        """
+        with self._lock:
+            return next(self._sequence)
+
+    def store(self, user_id: int, last_n: int, device_ids: Iterable[int], response: Any, started: int) -> None:
+        """
+        Simpan respons kecuali user atau salah satu device-nya diinvalidasi
+        sejak `started`.
+        """
+        key = (user_id, last_n)
+        device_ids = frozenset(device_ids)
+        with self._lock:
+            if self._user_seq.get(user_id, 0) > started:
+                return
+            if any(self._device_seq.get(device_id, 0) > started for device_id in device_ids):
+                return
+            self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, device_ids, response)
+            for device_id in device_ids:
+                self._by_device.setdefault(device_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_devices(self, device_ids: Iterable[int]) -> None:
+        with self._lock:
+            seq = next(self._sequence)
+            for device_id in set(device_ids):
+                self._device_seq[device_id] = seq
+                for key in list(self._by_device.get(device_id, ())):
+                    self._drop(key)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._user_seq[user_id] = next(self._sequence)
+            for key in [key for key in self._entries if key[0] == user_id]:
+                self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_device.clear()
+
+
+monitoring_cache = MonitoringCache()
@@ -0,0 +1,437 @@
+"""
+Partisi bulanan (declarative RANGE partitioning on timestamp) untuk sensor_data.
+
+Skema setelah migrasi:
+    sensor_data             partitioned table, PK (id, timestamp),
+                            UNIQUE (device_id, timestamp), index (timestamp)
+    sensor_data_pYYYYMM     satu partisi per bulan [awal bulan, awal bulan berikut)
+    sensor_data_default     menampung timestamp di luar partisi yang ada
+                            (jam device salah, replay sangat lama)
+
+Migrasi database yang sudah berisi data (batch per rentang id, ingest tetap
+jalan; hanya langkah swap terakhir yang mengunci tulis sebentar):
+    python -m app.partitioning migrate --batch-size 50000 --sleep-ms 50
+
+Tabel lama disimpan sebagai sensor_data_legacy untuk verifikasi, hapus manual
+setelah yakin. Baris dengan timestamp NULL tidak ikut dipindah.
+
+Pemeliharaan (juga dijalankan berkala oleh background task):
+    python -m app.partitioning maintain
+    python -m app.partitioning detach-before 2024-01 [--drop]
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+SENSOR_PARTITION_PREMAKE_MONTHS = int(os.getenv("SENSOR_PARTITION_PREMAKE_MONTHS", "3"))
+# 0 = simpan semua partisi
+SENSOR_PARTITION_RETENTION_MONTHS = int(os.getenv("SENSOR_PARTITION_RETENTION_MONTHS", "0"))
+# "detach": lepas dari sensor_data tapi tabel tetap ada; "drop": hapus
+SENSOR_PARTITION_DROP_MODE = os.getenv("SENSOR_PARTITION_DROP_MODE", "detach").strip().lower()
+SENSOR_PARTITION_MAINTENANCE_HOURS = float(os.getenv("SENSOR_PARTITION_MAINTENANCE_HOURS", "24"))
+
+PARENT = "sensor_data"
+DEFAULT_PARTITION = "sensor_data_default"
+STAGING = "sensor_data_new"
+LEGACY = "sensor_data_legacy"
+
+# DDL maintenance tidak boleh menahan ingest lama-lama; jika lock tidak
+# didapat, coba lagi di putaran berikutnya
+DDL_LOCK_TIMEOUT = "5s"
+
+# Advisory lock agar konversi/swap tidak dijalankan dua proses sekaligus
+# (replika yang start bersamaan, CLI migrate)
+PARTITION_LOCK_KEY = 720009
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_p{month.year:04d}{month.month:02d}"
+
+
+def parse_partition_name(name: str) -> Optional[date]:
+    prefix = f"{PARENT}_p"
+    if not name.startswith(prefix) or len(name) != len(prefix) + 6:
+        return None
+    try:
+        return date(int(name[-6:-2]), int(name[-2:]), 1)
+    except ValueError:
+        return None
+
+
+def _lock_conversion(conn) -> None:
+    # Dilepas otomatis di akhir transaksi
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+
+
+def is_partitioned(conn, table: str = PARENT) -> bool:
+    return bool(conn.execute(
+        text(
+            """
+            SELECT 1
+            FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = :table
+              AND c.relnamespace = 'public'::regnamespace
+            """
+        ),
+        {"table": table}
+    ).scalar())
+
+
+def list_partitions(conn, parent: str = PARENT) -> List[str]:
+    return list(conn.execute(
+        text(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = :parent
+              AND p.relnamespace = 'public'::regnamespace
+            ORDER BY c.relname
+            """
+        ),
+        {"parent": parent}
+    ).scalars())
+
+
+def _create_partitioned_table(conn, name: str) -> None:
+    """
+    Buat tabel partitioned dengan kolom sama seperti models.SensorData.
+    Nama constraint/index memakai prefix `name` dan di-rename saat swap.
+    Index (device_id, timestamp) lama tidak dibuat lagi karena sudah
+    tercakup unique constraint.
+    """
+    conn.execute(text(
+        f"""
+        CREATE TABLE {name} (
+            id INTEGER NOT NULL DEFAULT nextval('sensor_data_id_seq'),
+            device_id INTEGER REFERENCES devices (id) ON DELETE CASCADE,
+            timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            suhu DOUBLE PRECISION,
+            ph DOUBLE PRECISION,
+            "do" DOUBLE PRECISION,
+            tds DOUBLE PRECISION,
+            ammonia DOUBLE PRECISION,
+            salinitas DOUBLE PRECISION,
+            CONSTRAINT {name}_pkey PRIMARY KEY (id, timestamp),
+            CONSTRAINT {name}_device_timestamp_key UNIQUE (device_id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """
+    ))
+    conn.execute(text(f"CREATE INDEX {name}_timestamp_idx ON {name} (timestamp)"))
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {name} DEFAULT"))
+
+
+def create_partition(conn, month: date, parent: str = PARENT) -> bool:
+    """
+    Buat partisi untuk satu bulan jika belum ada. Baris bulan tersebut yang
+    terlanjur masuk ke partisi default dipindahkan dulu. Partisi dibuat
+    terpisah lalu di-ATTACH (lock SHARE UPDATE EXCLUSIVE, ingest tidak
+    terblokir) alih-alih CREATE TABLE ... PARTITION OF (ACCESS EXCLUSIVE).
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": f"public.{name}"}).scalar():
+        return False
+
+    start, end = month, add_months(month, 1)
+    bounds = {"start": datetime.combine(start, datetime.min.time()), "end": datetime.combine(end, datetime.min.time())}
+    conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(
+        text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds "
+            f"CHECK (timestamp >= '{bounds['start']}' AND timestamp < '{bounds['end']}')"
+        )
+    )
+    conn.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE timestamp >= :start AND timestamp < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """
+        ),
+        bounds
+    )
+    conn.execute(text(
+        f"ALTER TABLE {parent} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    # CHECK hanya dipakai agar ATTACH tidak perlu scan ulang
+    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+    return True
+
+
+def ensure_future_partitions(months_ahead: int = SENSOR_PARTITION_PREMAKE_MONTHS, today: Optional[date] = None) -> List[str]:
+    """
+    Pastikan partisi bulan ini sampai `months_ahead` bulan ke depan ada.
+    Setiap partisi dibuat dalam transaksi sendiri.
+    """
+    current = month_start(today or datetime.utcnow())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        try:
+            with engine.begin() as conn:
+                if create_partition(conn, month):
+                    created.append(partition_name(month))
+        except Exception as e:
+            logger.warning(f"Could not create partition {partition_name(month)}: {str(e)}")
+    if created:
+        logger.info(f"Created sensor_data partitions: {', '.join(created)}")
+    return created
+
+
+def detach_partitions_before(cutoff: date, drop: bool = False) -> List[str]:
+    """
+    Lepas (dan opsional hapus) partisi yang seluruh isinya sebelum `cutoff`.
+    Partisi default tidak pernah disentuh.
+    """
+    cutoff = month_start(cutoff)
+    with engine.connect() as conn:
+        partitions = list_partitions(conn)
+
+    removed = []
+    for name in partitions:
+        month = parse_partition_name(name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'"))
+                conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+                if drop:
+                    conn.execute(text(f"DROP TABLE {name}"))
+            removed.append(name)
+        except Exception as e:
+            logger.warning(f"Could not detach partition {name}: {str(e)}")
+    if removed:
+        logger.info(f"{'Dropped' if drop else 'Detached'} sensor_data partitions: {', '.join(removed)}")
+    return removed
+
+
+def maintain(months_ahead: int = SENSOR_PARTITION_PREMAKE_MONTHS) -> None:
+    """
+    Buat partisi ke depan dan, jika SENSOR_PARTITION_RETENTION_MONTHS diset,
+    lepas/hapus partisi yang lebih tua.
+    """
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return
+    ensure_future_partitions(months_ahead)
+    if SENSOR_PARTITION_RETENTION_MONTHS > 0:
+        cutoff = add_months(month_start(datetime.utcnow()), -SENSOR_PARTITION_RETENTION_MONTHS)
+        detach_partitions_before(cutoff, drop=SENSOR_PARTITION_DROP_MODE == "drop")
+
+
+def _months_with_data(conn, table: str) -> List[date]:
+    return [
+        month.date() for month in conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', timestamp) FROM {table} WHERE timestamp IS NOT NULL"
+        )).scalars()
+    ]
+
+
+def _create_staging(conn) -> None:
+    """
+    Buat sensor_data_new beserta partisi untuk setiap bulan yang berisi data
+    lama dan bulan ini sampai beberapa bulan ke depan.
+    """
+    _create_partitioned_table(conn, STAGING)
+    current = month_start(datetime.utcnow())
+    months = set(_months_with_data(conn, PARENT))
+    months.update(add_months(current, offset) for offset in range(SENSOR_PARTITION_PREMAKE_MONTHS + 1))
+    for month in sorted(months):
+        create_partition(conn, month, parent=STAGING)
+
+
+def _copy_batch(conn, lo: int, hi: int) -> int:
+    return conn.execute(
+        text(
+            f"""
+            INSERT INTO {STAGING} (id, device_id, timestamp, suhu, ph, "do", tds, ammonia, salinitas)
+            SELECT id, device_id, timestamp, suhu, ph, "do", tds, ammonia, salinitas
+            FROM {PARENT}
+            WHERE id >= :lo AND id < :hi AND timestamp IS NOT NULL
+            ON CONFLICT DO NOTHING
+            """
+        ),
+        {"lo": lo, "hi": hi}
+    ).rowcount
+
+
+def _swap(conn) -> None:
+    """
+    Tukar tabel: sensor_data -> sensor_data_legacy, sensor_data_new -> sensor_data.
+    Dipanggil dalam transaksi yang sudah memegang lock EXCLUSIVE pada sensor_data.
+    """
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {LEGACY}"))
+    for old in (
+        "sensor_data_pkey",
+        "uq_sensor_data_device_timestamp",
+        "ix_sensor_data_device_timestamp",
+        "ix_sensor_data_timestamp",
+        "ix_sensor_data_id",
+    ):
+        conn.execute(text(f"ALTER INDEX IF EXISTS {old} RENAME TO {old.replace('sensor_data', LEGACY, 1)}"))
+    conn.execute(text(f"ALTER TABLE {LEGACY} ALTER COLUMN id DROP DEFAULT"))
+
+    conn.execute(text(f"ALTER TABLE {STAGING} RENAME TO {PARENT}"))
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME CONSTRAINT {STAGING}_pkey TO sensor_data_pkey"))
+    conn.execute(text(
+        f"ALTER TABLE {PARENT} RENAME CONSTRAINT {STAGING}_device_timestamp_key "
+        "TO uq_sensor_data_device_timestamp"
+    ))
+    conn.execute(text(
+        f"ALTER TABLE {PARENT} RENAME CONSTRAINT {STAGING}_device_id_fkey TO sensor_data_device_id_fkey"
+    ))
+    conn.execute(text(f"ALTER INDEX {STAGING}_timestamp_idx RENAME TO ix_sensor_data_timestamp"))
+    conn.execute(text(f"ALTER SEQUENCE sensor_data_id_seq OWNED BY {PARENT}.id"))
+
+
+def migrate(batch_size: int = 50000, sleep_ms: int = 50) -> bool:
+    """
+    Migrasi sensor_data heap ke partitioned table. Bisa diulang: salinan
+    yang sudah ada di sensor_data_new dilanjutkan dari id terbesar.
+    Mengembalikan False jika sensor_data sudah partitioned.
+    """
+    with engine.begin() as conn:
+        _lock_conversion(conn)
+        if is_partitioned(conn):
+            return False
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": f"public.{LEGACY}"}).scalar():
+            raise RuntimeError(f"{LEGACY} already exists; drop or rename it before migrating again")
+        if not conn.execute(text("SELECT to_regclass(:name)"), {"name": f"public.{STAGING}"}).scalar():
+            _create_staging(conn)
+            logger.info(f"Created {STAGING}")
+        start_id = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {STAGING}")).scalar()
+        max_id = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {PARENT}")).scalar()
+
+    copied = 0
+    lo = start_id
+    while lo <= max_id:
+        hi = lo + batch_size
+        with engine.begin() as conn:
+            copied += _copy_batch(conn, lo, hi)
+        logger.info(f"Copied ids [{lo}, {hi}) ({copied} rows so far)")
+        lo = hi
+        if sleep_ms:
+            time.sleep(sleep_ms / 1000.0)
+
+    # Langkah akhir: kunci tulis sebentar, salin sisa baris baru, lalu swap
+    with engine.begin() as conn:
+        _lock_conversion(conn)
+        if is_partitioned(conn):
+            # Proses lain sudah menyelesaikan swap
+            return False
+        conn.execute(text(f"LOCK TABLE {PARENT} IN EXCLUSIVE MODE"))
+        copied += _copy_batch(conn, lo, 2 ** 31)
+        skipped = conn.execute(text(f"SELECT COUNT(*) FROM {PARENT} WHERE timestamp IS NULL")).scalar()
+        _swap(conn)
+
+    logger.info(f"sensor_data is now partitioned ({copied} rows copied)")
+    if skipped:
+        logger.warning(f"{skipped} rows with NULL timestamp were left in {LEGACY}")
+    logger.info(f"Old table kept as {LEGACY}; drop it after verification")
+    return True
+
+
+def ensure_partitioned_if_empty(engine=engine) -> None:
+    """
+    Dipanggil saat startup: database baru (sensor_data kosong) langsung
+    dikonversi. Database berisi data harus dimigrasi lewat CLI. Replika yang
+    start bersamaan antre di advisory lock dan memeriksa ulang keadaan
+    setelah mendapatkannya, sehingga hanya satu yang mengonversi.
+    """
+    with engine.connect() as conn:
+        if is_partitioned(conn):
+            return
+    with engine.begin() as conn:
+        _lock_conversion(conn)
+        if is_partitioned(conn):
+            return
+        if conn.execute(text(f"SELECT 1 FROM {PARENT} LIMIT 1")).scalar():
+            logger.warning(
+                "sensor_data is not partitioned. Run `python -m app.partitioning migrate` "
+                "to convert it in batches."
+            )
+            return
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": f"public.{STAGING}"}).scalar():
+            return
+        conn.execute(text(f"LOCK TABLE {PARENT} IN EXCLUSIVE MODE"))
+        _create_staging(conn)
+        _copy_batch(conn, 0, 2 ** 31)
+        _swap(conn)
+        conn.execute(text(f"DROP TABLE {LEGACY}"))
+    logger.info("Converted empty sensor_data to a partitioned table")
+
+
+def partition_maintenance_loop() -> None:
+    logger.info("Starting sensor_data partition maintenance")
+    while True:
+        try:
+            maintain()
+        except Exception as e:
+            logger.error(f"Error in partition maintenance: {str(e)}")
+        time.sleep(SENSOR_PARTITION_MAINTENANCE_HOURS * 3600)
+
+
+def start_partition_maintenance() -> None:
+    thread = threading.Thread(target=partition_maintenance_loop, daemon=True)
+    thread.start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Konversi sensor_data ke partitioned table")
+    migrate_parser.add_argument("--batch-size", type=int, default=50000, help="Jumlah id per transaksi")
+    migrate_parser.add_argument("--sleep-ms", type=int, default=50, help="Jeda antar batch")
+
+    maintain_parser = commands.add_parser("maintain", help="Buat partisi ke depan (dan retensi jika dikonfigurasi)")
+    maintain_parser.add_argument("--months-ahead", type=int, default=SENSOR_PARTITION_PREMAKE_MONTHS)
+
+    detach_parser = commands.add_parser("detach-before", help="Lepas partisi sebelum bulan YYYY-MM")
+    detach_parser.add_argument("month", help="YYYY-MM")
+    detach_parser.add_argument("--drop", action="store_true", help="Hapus tabel partisi setelah dilepas")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "migrate":
+        if not migrate(args.batch_size, args.sleep_ms):
+            logger.info("sensor_data is already partitioned")
+        ensure_future_partitions()
+    elif args.command == "maintain":
+        maintain(args.months_ahead)
+    elif args.command == "detach-before":
+        cutoff = datetime.strptime(args.month, "%Y-%m").date()
+        detach_partitions_before(cutoff, drop=args.drop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Pelepasan device/user dan penghapusan histori pemilik lama.
+
+Bagian yang murah (lepas kolam, reset device, device_latest, rollup hari
+ini, token) dijalankan di transaksi request sehingga device langsung bisa
+di-claim user lain. Histori besar (sensor_data, rollup, notifikasi, arsip)
+dihapus oleh job `purge_device` / `purge_user` (app/jobs.py) per batch kecil.
+Batas yang dicatat saat pelepasan (id sensor_data terakhir, waktu pelepasan)
+memastikan data pemilik baru tidak ikut terhapus.
+"""
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import archive, device_latest, etags, models, rollups
+from app.auth import get_password_hash
+from app.database import SessionLocal, engine
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "5000"))
+PURGE_SLEEP_MS = int(os.getenv("PURGE_SLEEP_MS", "50"))
+
+Report = Callable[[Dict[str, int]], None]
+
+
+def release_device(db: Session, device: models.Device) -> dict:
+    """
+    Kembalikan device ke kondisi awal (commit oleh caller). Mengembalikan
+    payload untuk job purge_device.
+    """
+    now = datetime.utcnow()
+    today = datetime.combine(now.date(), datetime.min.time())
+
+    # Lepas relasi kolam agar device bisa dipakai ulang
+    kolam = db.query(models.Kolam).filter(
+        models.Kolam.device_id == device.id
+    ).first()
+    if kolam:
+        kolam.device_id = None
+        db.add(kolam)
+
+    # Bucket rollup hari ini (jumlahnya kecil) dihapus sekarang agar bucket
+    # yang sama tidak tercampur pembacaan pemilik baru; sisanya oleh job
+    device_latest.delete_latest(db, [device.id])
+    for model, _, _ in rollups.RESOLUTIONS.values():
+        db.query(model).filter(
+            model.device_id == device.id,
+            model.bucket >= today
+        ).delete(synchronize_session=False)
+
+    # Reset device menjadi kondisi awal agar bisa di-claim user lain
+    device.user_id = None
+    device.name = None
+    device.last_seen = None
+    device.status = "offline"
+    device.connection_interval = 5
+    device.temp_min_threshold = None
+    device.temp_max_threshold = None
+    device.ph_min_threshold = None
+    device.ph_max_threshold = None
+    device.do_min_threshold = None
+    device.tds_max_threshold = None
+    device.ammonia_max_threshold = None
+    device.salinitas_min_threshold = None
+    device.salinitas_max_threshold = None
+
+    # MAX(id) global memakai ujung index primary key tiap partisi (murah);
+    # pembacaan pemilik baru selalu mendapat id yang lebih besar
+    max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM sensor_data")).scalar()
+    return {
+        "device_id": device.id,
+        "max_sensor_data_id": max_id,
+        "released_at": now.isoformat(),
+        "rollup_before": today.isoformat(),
+    }
+
+
+def release_user(db: Session, user: models.User) -> dict:
+    """
+    Cabut akses user dan lepas semua device/tambak/kolam miliknya (commit
+    oleh caller). Baris user sendiri dihapus oleh job purge_user setelah
+    notifikasinya habis. Mengembalikan payload job.
+    """
+    db.query(models.AuthToken).filter(
+        models.AuthToken.user_id == user.id
+    ).delete(synchronize_session=False)
+    # Password acak: user tidak bisa login lagi selama job berjalan
+    user.password_hash = get_password_hash(uuid.uuid4().hex)
+    user.fcm_token = None
+
+    tambak_ids = [
+        tambak_id for (tambak_id,) in
+        db.query(models.Tambak.id).filter(models.Tambak.user_id == user.id).all()
+    ]
+    if tambak_ids:
+        db.query(models.Kolam).filter(
+            models.Kolam.tambak_id.in_(tambak_ids)
+        ).delete(synchronize_session=False)
+        db.query(models.Tambak).filter(
+            models.Tambak.id.in_(tambak_ids)
+        ).delete(synchronize_session=False)
+
+    devices = db.query(models.Device).filter(models.Device.user_id == user.id).all()
+    device_payloads = [release_device(db, device) for device in devices]
+
+    return {
+        "user_id": user.id,
+        "device_uids": [device.uid for device in devices],
+        "devices": device_payloads,
+    }
+
+
+def _delete_in_batches(sql: str, params: dict, key: str, progress: Dict[str, int], report: Report) -> None:
+    """
+    Ulangi DELETE ... IN (SELECT ... LIMIT batch) sampai habis, satu
+    transaksi per batch, melaporkan progres setiap batch.
+    """
+    while True:
+        with engine.begin() as conn:
+            deleted = conn.execute(text(sql), {**params, "batch": PURGE_BATCH_SIZE}).rowcount
+        progress[key] = progress.get(key, 0) + deleted
+        report(progress)
+        if deleted < PURGE_BATCH_SIZE:
+            return
+        if PURGE_SLEEP_MS:
+            time.sleep(PURGE_SLEEP_MS / 1000.0)
+
+
+def purge_device(payload: dict, progress: Dict[str, int], report: Report) -> None:
+    """
+    Job purge_device: hapus histori device sampai batas pelepasan. Aman
+    diulang (setiap langkah hanya menghapus yang tersisa).
+    """
+    device_id = payload["device_id"]
+    released_at = datetime.fromisoformat(payload["released_at"])
+
+    _delete_in_batches(
+        """
+        DELETE FROM sensor_data
+        WHERE (id, timestamp) IN (
+            SELECT id, timestamp FROM sensor_data
+            WHERE device_id = :device_id AND id <= :max_id
+            LIMIT :batch
+        )
+        """,
+        {"device_id": device_id, "max_id": payload["max_sensor_data_id"]},
+        "sensor_data", progress, report
+    )
+    with engine.begin() as conn:
+        etags.bump_data_generation(conn, [device_id])
+    for model, _, _ in rollups.RESOLUTIONS.values():
+        table = model.__tablename__
+        _delete_in_batches(
+            f"""
+            DELETE FROM {table}
+            WHERE (device_id, bucket) IN (
+                SELECT device_id, bucket FROM {table}
+                WHERE device_id = :device_id AND bucket < :before
+                LIMIT :batch
+            )
+            """,
+            {"device_id": device_id, "before": datetime.fromisoformat(payload["rollup_before"])},
+            table, progress, report
+        )
+    _delete_in_batches(
+        """
+        DELETE FROM notifications
+        WHERE id IN (
+            SELECT id FROM notifications
+            WHERE device_id = :device_id AND timestamp <= :released_at
+            LIMIT :batch
+        )
+        """,
+        {"device_id": device_id, "released_at": released_at},
+        "notifications", progress, report
+    )
+
+    db = SessionLocal()
+    try:
+        paths = archive.delete_device_archive(db, [device_id], archived_before=released_at)
+        if paths:
+            etags.bump_data_generation(db, [device_id])
+        db.commit()
+    finally:
+        db.close()
+    archive.remove_archive_files(paths)
+    progress["archive_months"] = progress.get("archive_months", 0) + len(paths)
+    report(progress)
+
+
+def purge_user(payload: dict, progress: Dict[str, int], report: Report) -> None:
+    """
+    Job purge_user: histori semua device milik user, sisa notifikasi dan
+    token, lalu baris user.
+    """
+    user_id = payload["user_id"]
+    for device_payload in payload["devices"]:
+        purge_device(device_payload, progress, report)
+
+    _delete_in_batches(
+        """
+        DELETE FROM notifications
+        WHERE id IN (
+            SELECT id FROM notifications
+            WHERE user_id = :user_id
+            LIMIT :batch
+        )
+        """,
+        {"user_id": user_id},
+        "notifications", progress, report
+    )
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM auth_tokens WHERE user_id = :user_id"), {"user_id": user_id})
+        progress["users"] = conn.execute(
+            text("DELETE FROM users WHERE id = :user_id"), {"user_id": user_id}
+        ).rowcount
+    report(progress)
@@ -0,0 +1,73 @@
+"""
+Format biner ringkas untuk pembacaan sensor dari device ESP.
+
+Satu record = 64 byte little-endian:
+    36s  uid (ASCII, diisi NUL di kanan)
+    I    timestamp device (uint32): detik sejak 1970-01-01 00:00 menurut jam
+         dinding LOKAL device, BUKAN Unix epoch UTC. Disimpan apa adanya
+         tanpa konversi timezone, sama seperti jalur JSON yang membuang
+         offset (2025-07-18T06:00:00+08:00 disimpan 06:00). Firmware yang
+         hanya punya Unix time harus menambahkan offset timezone-nya dulu.
+    6f   suhu, ph, do, tds, ammonia, salinitas (float32, dibulatkan ke
+         4 desimal agar nilai sama dengan yang dikirim lewat JSON). NaN dan
+         +/-Inf (sensor gagal dibaca) disimpan sebagai NULL.
+
+Body request berisi satu record (POST /sensor) atau beberapa record
+berurutan (POST /sensor/batch) dengan Content-Type CONTENT_TYPE.
+"""
+import math
+import struct
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Sequence
+
+from app.ingest import SENSOR_FIELDS
+
+CONTENT_TYPE = "application/x-aquanotes-reading"
+
+RECORD = struct.Struct("<36sI6f")
+RECORD_SIZE = RECORD.size
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _value(raw: float) -> Optional[float]:
+    return round(raw, 4) if math.isfinite(raw) else None
+
+
+def decode_records(body: bytes) -> List[dict]:
+    """
+    Decode body biner menjadi list dict pembacaan {uid, timestamp, <param>}.
+    Timestamp sudah berupa datetime naive (waktu lokal device) sehingga tidak
+    perlu di-parse lagi; parameter yang NaN/Inf menjadi None.
+    Raise ValueError jika panjang body bukan kelipatan RECORD_SIZE.
+    """
+    if not body or len(body) % RECORD_SIZE:
+        raise ValueError(f"Binary body must be a multiple of {RECORD_SIZE} bytes")
+
+    readings = []
+    for uid, epoch, suhu, ph, do, tds, ammonia, salinitas in RECORD.iter_unpack(body):
+        readings.append({
+            "uid": uid.rstrip(b"\0").decode("ascii", "replace"),
+            "timestamp": _EPOCH + timedelta(seconds=epoch),
+            "suhu": _value(suhu),
+            "ph": _value(ph),
+            "do": _value(do),
+            "tds": _value(tds),
+            "ammonia": _value(ammonia),
+            "salinitas": _value(salinitas)
+        })
+    return readings
+
+
+def encode_record(uid: str, epoch: int, values: Sequence[float]) -> bytes:
+    """
+    Encode satu pembacaan (dipakai firmware reference, simulator dan benchmark).
+    `values` mengikuti urutan SENSOR_FIELDS.
+    """
+    if len(values) != len(SENSOR_FIELDS):
+        raise ValueError(f"Expected {len(SENSOR_FIELDS)} values")
+    return RECORD.pack(uid.encode("ascii"), epoch, *values)
+
+
+def encode_records(records: Iterable[tuple]) -> bytes:
+    return b"".join(encode_record(uid, epoch, values) for uid, epoch, values in records)
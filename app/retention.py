@@ -0,0 +1,267 @@
+"""
+Retensi data: sensor_data mentah, notifikasi dan token yang sudah kedaluwarsa.
+
+- sensor_data lebih tua dari RAW_RETENTION_DAYS dihapus. Rollup
+  (sensor_rollup_*) sudah diperbarui saat ingest dan tidak disentuh,
+  sehingga histori panjang tetap tersedia. Jika tabel dipartisi, partisi
+  bulanan yang seluruhnya lewat batas langsung di-DROP; sisanya dihapus per
+  batch.
+- notifications lebih tua dari NOTIFICATION_RETENTION_DAYS dihapus.
+- auth_tokens yang expires_at-nya sudah lewat dihapus.
+
+Penghapusan berjalan per batch kecil lewat index (timestamp/expires_at)
+dengan jeda antar batch supaya ingest tidak tertahan. Nilai 0 menonaktifkan
+retensi untuk tabel tersebut.
+
+    python -m app.retention run
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+
+from app import etags, partitioning
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "0"))
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "0"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+RETENTION_SLEEP_MS = int(os.getenv("RETENTION_SLEEP_MS", "200"))
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "6"))
+
+# Advisory lock agar hanya satu replika yang menjalankan retensi
+RETENTION_LOCK_KEY = 720011
+
+RETENTION_ROWS_REMOVED = Counter(
+    "aquanotes_retention_rows_removed_total",
+    "Baris yang dihapus oleh job retensi",
+    ["table"]
+)
+RETENTION_DURATION = Gauge(
+    "aquanotes_retention_duration_seconds",
+    "Durasi proses retensi terakhir per tabel",
+    ["table"]
+)
+RETENTION_LAST_SUCCESS = Gauge(
+    "aquanotes_retention_last_success_timestamp_seconds",
+    "Waktu (epoch) job retensi terakhir selesai tanpa error"
+)
+
+
+def _delete_in_batches(table: str, select_sql: str, params: dict,
+                       batch_size: int = RETENTION_BATCH_SIZE, sleep_ms: int = RETENTION_SLEEP_MS) -> int:
+    """
+    Ulangi DELETE ... WHERE <key> IN (SELECT <key> ... LIMIT batch) sampai
+    tidak ada lagi baris. Setiap batch transaksi sendiri.
+    """
+    removed = 0
+    while True:
+        with engine.begin() as conn:
+            deleted = conn.execute(text(select_sql), {**params, "batch": batch_size}).rowcount
+        removed += deleted
+        RETENTION_ROWS_REMOVED.labels(table).inc(deleted)
+        if deleted < batch_size:
+            return removed
+        if sleep_ms:
+            time.sleep(sleep_ms / 1000.0)
+
+
+def _next_reading_day(after: Optional[date] = None) -> Optional[date]:
+    """
+    Hari pertama (>= after) yang masih punya data mentah, lewat index timestamp.
+    """
+    query = "SELECT MIN(timestamp) FROM sensor_data"
+    params = {}
+    if after is not None:
+        query += " WHERE timestamp >= :after"
+        params["after"] = datetime.combine(after, datetime.min.time())
+    with engine.connect() as conn:
+        oldest = conn.execute(text(query), params).scalar()
+    return oldest.date() if oldest else None
+
+
+def _drop_month_partition(month: date) -> Optional[int]:
+    """
+    Drop partisi bulan `month`. Mengembalikan jumlah baris di dalamnya, atau
+    None jika partisi tidak ada/gagal dilepas (misalnya lock timeout).
+    """
+    name = partitioning.partition_name(month)
+    with engine.connect() as conn:
+        if name not in partitioning.list_partitions(conn):
+            return None
+        count = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+    if name not in partitioning.detach_partitions_before(partitioning.add_months(month, 1), drop=True):
+        return None
+    return count
+
+
+def raw_data_cutoff(today: Optional[date] = None) -> Optional[date]:
+    """
+    Hari pertama yang data mentahnya tidak dihapus oleh retensi
+    (RAW_RETENTION_DAYS dan SENSOR_PARTITION_RETENTION_MONTHS); None jika
+    keduanya nonaktif. Partisi yang di-detach manual tidak terdeteksi.
+    """
+    today = today or datetime.utcnow().date()
+    cutoffs = []
+    if RAW_RETENTION_DAYS > 0:
+        cutoffs.append(today - timedelta(days=RAW_RETENTION_DAYS))
+    if partitioning.SENSOR_PARTITION_RETENTION_MONTHS > 0:
+        cutoffs.append(partitioning.add_months(
+            partitioning.month_start(today), -partitioning.SENSOR_PARTITION_RETENTION_MONTHS
+        ))
+    return max(cutoffs) if cutoffs else None
+
+
+def _bump_generation(removed: int) -> None:
+    # Retensi menghapus per rentang waktu untuk semua device sekaligus
+    if removed:
+        with engine.begin() as conn:
+            etags.bump_data_generation(conn)
+
+
+def purge_sensor_data(retention_days: int = RAW_RETENTION_DAYS, today: Optional[date] = None) -> int:
+    """
+    Hapus pembacaan mentah sebelum (hari ini - retention_days). Rollup
+    tidak dihitung ulang: isinya sudah lengkap dari ingest, sedangkan hitung
+    ulang perlu lock tabel rollup (menahan ingest) dan akan menyusutkan
+    rollup jika run sebelumnya berhenti di tengah penghapusan satu hari.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=retention_days)
+
+    with engine.connect() as conn:
+        partitioned = partitioning.is_partitioned(conn)
+
+    removed = 0
+    day = _next_reading_day()
+    while day is not None and day < cutoff:
+        month = partitioning.month_start(day)
+        month_end = partitioning.add_months(month, 1)
+        if partitioned and month_end <= cutoff:
+            # Seluruh bulan lewat batas: drop partisinya
+            count = _drop_month_partition(month)
+            if count is not None:
+                removed += count
+                RETENTION_ROWS_REMOVED.labels("sensor_data").inc(count)
+                _bump_generation(count)
+                day = _next_reading_day(month_end)
+                continue
+            # Data ada di partisi default atau partisi gagal dilepas:
+            # hapus per batch seperti tabel biasa
+
+        start = datetime.combine(day, datetime.min.time())
+        count = _delete_in_batches(
+            "sensor_data",
+            """
+            DELETE FROM sensor_data
+            WHERE (id, timestamp) IN (
+                SELECT id, timestamp FROM sensor_data
+                WHERE timestamp >= :start AND timestamp < :end
+                LIMIT :batch
+            )
+            """,
+            {"start": start, "end": start + timedelta(days=1)}
+        )
+        removed += count
+        _bump_generation(count)
+        day = _next_reading_day(day + timedelta(days=1))
+    return removed
+
+
+def purge_notifications(retention_days: int = NOTIFICATION_RETENTION_DAYS) -> int:
+    if retention_days <= 0:
+        return 0
+    return _delete_in_batches(
+        "notifications",
+        """
+        DELETE FROM notifications
+        WHERE id IN (
+            SELECT id FROM notifications
+            WHERE timestamp < :cutoff
+            LIMIT :batch
+        )
+        """,
+        {"cutoff": datetime.utcnow() - timedelta(days=retention_days)}
+    )
+
+
+def purge_expired_tokens() -> int:
+    return _delete_in_batches(
+        "auth_tokens",
+        """
+        DELETE FROM auth_tokens
+        WHERE token IN (
+            SELECT token FROM auth_tokens
+            WHERE expires_at < :now
+            LIMIT :batch
+        )
+        """,
+        {"now": datetime.utcnow()}
+    )
+
+
+def run_retention() -> dict:
+    """
+    Jalankan semua kebijakan retensi sekali. Mengembalikan jumlah baris
+    terhapus per tabel (kosong jika replika lain sedang menjalankannya).
+    """
+    with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as lock_conn:
+        if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": RETENTION_LOCK_KEY}).scalar():
+            logger.info("Retention already running elsewhere, skipping")
+            return {}
+        try:
+            results = {}
+            for table, purge in (
+                ("sensor_data", purge_sensor_data),
+                ("notifications", purge_notifications),
+                ("auth_tokens", purge_expired_tokens),
+            ):
+                started = time.perf_counter()
+                results[table] = purge()
+                elapsed = time.perf_counter() - started
+                RETENTION_DURATION.labels(table).set(elapsed)
+                if results[table]:
+                    logger.info(f"Retention removed {results[table]} rows from {table} in {elapsed:.1f}s")
+            RETENTION_LAST_SUCCESS.set(time.time())
+            return results
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RETENTION_LOCK_KEY})
+
+
+def retention_loop() -> None:
+    logger.info("Starting retention job")
+    while True:
+        try:
+            run_retention()
+        except Exception as e:
+            logger.error(f"Error in retention job: {str(e)}")
+        time.sleep(RETENTION_INTERVAL_HOURS * 3600)
+
+
+def start_retention() -> None:
+    thread = threading.Thread(target=retention_loop, daemon=True)
+    thread.start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("run", help="Jalankan retensi sekali dengan konfigurasi dari environment")
+    parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = run_retention()
+    logger.info(f"Retention finished: {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Rollup sensor_data per device: bucket 1 menit, 1 jam dan 1 hari
+(tabel sensor_rollup_1m / _1h / _1d).
+
+Rollup ditambah secara incremental di jalur ingest (insert_readings) dari
+baris yang benar-benar baru, sehingga data terlambat atau tidak berurutan
+langsung masuk ke bucket yang benar dan retry firmware tidak dihitung dua
+kali. Untuk data lama (sebelum fitur ini) atau perbaikan setelah nilai data
+mentah diubah (mis. duplikat dibersihkan), hitung ulang dari sensor_data per
+device per hari:
+
+    python -m app.rollups recompute --start 2024-01-01 --end 2024-02-01 [--uid <uid>]
+
+Jangan menghitung ulang setelah data mentah dihapus: rollup adalah
+satu-satunya sumber histori untuk data yang sudah lewat retensi atau
+diarsip, dan hitung ulang akan menyusutkannya. Rentang sebelum batas
+retensi ditolak, hari yang sudah diarsip atau tidak lagi punya data mentah
+dilewati.
+"""
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app import models, retention
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+SENSOR_FIELDS = models.SENSOR_FIELDS
+
+# resolusi -> (model, unit date_trunc, lebar bucket)
+RESOLUTIONS = {
+    "1m": (models.SensorRollup1m, "minute", timedelta(minutes=1)),
+    "1h": (models.SensorRollup1h, "hour", timedelta(hours=1)),
+    "1d": (models.SensorRollup1d, "day", timedelta(days=1)),
+}
+
+# Batas rentang untuk resolution=auto: pilih resolusi terhalus yang
+# menghasilkan paling banyak ~1500 bucket per device
+AUTO_MAX_RANGE = (
+    ("1m", timedelta(hours=24)),
+    ("1h", timedelta(days=60)),
+)
+
+
+def quote(field: str) -> str:
+    # "do" adalah keyword SQL
+    return f'"{field}"'
+
+
+def _aggregate_columns() -> str:
+    return ", ".join(
+        f"MIN({quote(f)}), MAX({quote(f)}), SUM({quote(f)}), COUNT({quote(f)})" for f in SENSOR_FIELDS
+    )
+
+
+def _rollup_columns() -> str:
+    return ", ".join(f"{f}_min, {f}_max, {f}_sum, {f}_count" for f in SENSOR_FIELDS)
+
+
+def _merge_set() -> str:
+    parts = ["count = r.count + EXCLUDED.count"]
+    for f in SENSOR_FIELDS:
+        parts.append(f"{f}_min = LEAST(r.{f}_min, EXCLUDED.{f}_min)")
+        parts.append(f"{f}_max = GREATEST(r.{f}_max, EXCLUDED.{f}_max)")
+        # Bucket yang semua nilainya null tetap null, bukan 0
+        parts.append(
+            f"{f}_sum = CASE WHEN r.{f}_sum IS NULL AND EXCLUDED.{f}_sum IS NULL THEN NULL "
+            f"ELSE COALESCE(r.{f}_sum, 0) + COALESCE(EXCLUDED.{f}_sum, 0) END"
+        )
+        parts.append(f"{f}_count = r.{f}_count + EXCLUDED.{f}_count")
+    return ", ".join(parts)
+
+
+def average(total: Optional[float], count: Optional[int]) -> Optional[float]:
+    # Rata-rata dari <param>_sum dan <param>_count (jumlah nilai non-null)
+    return total / count if total is not None and count else None
+
+
+def _build_apply_sql():
+    source = ", ".join(
+        ["CAST(:device_id AS INTEGER[])", "CAST(:timestamp AS TIMESTAMP[])"]
+        + [f"CAST(:{f} AS DOUBLE PRECISION[])" for f in SENSOR_FIELDS]
+    )
+    alias = ", ".join(["device_id", "timestamp"] + [quote(f) for f in SENSOR_FIELDS])
+    statements = []
+    for resolution, (model, unit, _) in RESOLUTIONS.items():
+        statements.append(
+            f"""
+            ins_{resolution} AS (
+                INSERT INTO {model.__tablename__} AS r (device_id, bucket, count, {_rollup_columns()})
+                SELECT device_id, date_trunc('{unit}', timestamp), COUNT(*), {_aggregate_columns()}
+                FROM src
+                GROUP BY 1, 2
+                ON CONFLICT (device_id, bucket) DO UPDATE SET {_merge_set()}
+                RETURNING 1
+            )"""
+        )
+    return text(
+        f"WITH src AS (SELECT * FROM unnest({source}) AS s({alias})),"
+        + ",".join(statements)
+        + " SELECT (SELECT COUNT(*) FROM ins_1m), (SELECT COUNT(*) FROM ins_1h), (SELECT COUNT(*) FROM ins_1d)"
+    )
+
+
+_APPLY_SQL = _build_apply_sql()
+
+
+def apply_readings(db: Session, rows: List[dict]) -> None:
+    """
+    Tambahkan baris sensor_data yang baru tersimpan ke ketiga tabel rollup
+    (satu statement, transaksi yang sama dengan insert). Commit oleh caller.
+    """
+    if not rows:
+        return
+    params = {
+        "device_id": [row["device_id"] for row in rows],
+        "timestamp": [row["timestamp"] for row in rows],
+    }
+    for field in SENSOR_FIELDS:
+        params[field] = [row.get(field) for row in rows]
+    db.execute(_APPLY_SQL, params)
+
+
+def recompute_day(conn, day: date, device_id: int) -> Optional[int]:
+    """
+    Hitung ulang bucket satu device pada satu hari dari sensor_data.
+
+    Baris device dikunci FOR UPDATE selama transaksi. Setiap INSERT
+    sensor_data memegang FOR KEY SHARE pada baris device yang sama (cek FK)
+    sampai commit, jadi lock ini menunggu ingest device tersebut yang sedang
+    berjalan lalu menahan ingest berikutnya untuk device ini saja sampai
+    selesai; pembacaan yang masuk bersamaan tidak hilang atau terhitung dua
+    kali, dan device lain tidak tertahan.
+
+    Mengembalikan None tanpa mengubah rollup jika hari itu sudah diarsip
+    atau tidak lagi punya data mentah padahal rollup-nya ada.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    params = {"start": start, "end": start + timedelta(days=1), "device_id": device_id}
+
+    if conn.execute(text("SELECT 1 FROM devices WHERE id = :device_id FOR UPDATE"), params).scalar() is None:
+        return None
+    archived = conn.execute(
+        text(
+            """
+            SELECT 1 FROM sensor_archive
+            WHERE device_id = :device_id AND first_timestamp < :end AND last_timestamp >= :start
+            LIMIT 1
+            """
+        ),
+        params
+    ).scalar()
+    if archived:
+        return None
+    has_readings = conn.execute(
+        text("SELECT 1 FROM sensor_data WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end LIMIT 1"),
+        params
+    ).scalar()
+    if not has_readings:
+        has_rollup = conn.execute(
+            text("SELECT 1 FROM sensor_rollup_1d WHERE device_id = :device_id AND bucket = :start"),
+            params
+        ).scalar()
+        return None if has_rollup else 0
+
+    written = 0
+    for model, unit, _ in RESOLUTIONS.values():
+        conn.execute(
+            text(
+                f"DELETE FROM {model.__tablename__} "
+                "WHERE device_id = :device_id AND bucket >= :start AND bucket < :end"
+            ),
+            params
+        )
+        written += conn.execute(
+            text(
+                f"""
+                INSERT INTO {model.__tablename__} (device_id, bucket, count, {_rollup_columns()})
+                SELECT device_id, date_trunc('{unit}', timestamp), COUNT(*), {_aggregate_columns()}
+                FROM sensor_data
+                WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end
+                GROUP BY 1, 2
+                """
+            ),
+            params
+        ).rowcount
+    return written
+
+
+def recompute_rollups(start: date, end: date, device_id: Optional[int] = None) -> int:
+    """
+    Hitung ulang rollup untuk hari [start, end), satu transaksi per device
+    per hari (semua device yang punya data mentah jika device_id kosong).
+    Raise ValueError jika rentang dimulai sebelum batas retensi data mentah.
+    """
+    cutoff = retention.raw_data_cutoff()
+    if cutoff is not None and start < cutoff:
+        raise ValueError(
+            f"Raw readings before {cutoff} are removed by retention; "
+            "their rollups are kept and cannot be recomputed"
+        )
+
+    written = 0
+    day = start
+    while day < end:
+        if device_id is not None:
+            device_ids = [device_id]
+        else:
+            day_start = datetime.combine(day, datetime.min.time())
+            with engine.connect() as conn:
+                device_ids = conn.execute(
+                    text(
+                        "SELECT DISTINCT device_id FROM sensor_data "
+                        "WHERE timestamp >= :start AND timestamp < :end ORDER BY device_id"
+                    ),
+                    {"start": day_start, "end": day_start + timedelta(days=1)}
+                ).scalars().all()
+        for current in device_ids:
+            with engine.begin() as conn:
+                result = recompute_day(conn, day, current)
+            if result is None:
+                logger.warning(f"Skipped device {current} on {day}: raw readings archived or removed")
+            else:
+                written += result
+        day += timedelta(days=1)
+    return written
+
+
+def choose_resolution(start: datetime, end: datetime) -> str:
+    span = end - start
+    for resolution, max_range in AUTO_MAX_RANGE:
+        if span <= max_range:
+            return resolution
+    return "1d"
+
+
+def query_rollups(db: Session, device_id: int, resolution: str, start: datetime, end: datetime) -> List[dict]:
+    """
+    Ambil bucket rollup [start, end) dalam bentuk siap kirim:
+    {bucket, count, <param>: {min, max, avg}}.
+    """
+    model = RESOLUTIONS[resolution][0]
+    buckets = db.query(model).filter(
+        model.device_id == device_id,
+        model.bucket >= start,
+        model.bucket < end
+    ).order_by(model.bucket.asc()).all()
+    return [to_summary(bucket) for bucket in buckets]
+
+
+def count_readings(db: Session, device_id: int, start: Optional[datetime], end: Optional[datetime]) -> Optional[int]:
+    """
+    Perkiraan jumlah pembacaan dari rollup harian (termasuk yang sudah
+    diarsip). Tepat untuk rentang hari penuh; None jika belum ada rollup.
+    """
+    model = models.SensorRollup1d
+    query = db.query(func.sum(model.count)).filter(model.device_id == device_id)
+    if start is not None:
+        query = query.filter(model.bucket >= datetime.combine(start.date(), datetime.min.time()))
+    if end is not None:
+        query = query.filter(model.bucket <= end)
+    total = query.scalar()
+    return int(total) if total is not None else None
+
+
+def to_summary(bucket) -> Dict:
+    summary = {"bucket": bucket.bucket, "count": bucket.count}
+    for field in SENSOR_FIELDS:
+        total = getattr(bucket, f"{field}_sum")
+        summary[field] = {
+            "min": getattr(bucket, f"{field}_min"),
+            "max": getattr(bucket, f"{field}_max"),
+            "avg": average(total, getattr(bucket, f"{field}_count")),
+        }
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    recompute_parser = commands.add_parser("recompute", help="Hitung ulang rollup dari sensor_data")
+    recompute_parser.add_argument("--start", help="YYYY-MM-DD (default: data tertua)")
+    recompute_parser.add_argument("--end", help="YYYY-MM-DD, eksklusif (default: besok)")
+    recompute_parser.add_argument("--uid", help="Hanya device ini")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    with engine.connect() as conn:
+        device_id = None
+        if args.uid:
+            device_id = conn.execute(
+                text("SELECT id FROM devices WHERE uid = :uid"), {"uid": args.uid}
+            ).scalar()
+            if device_id is None:
+                raise SystemExit(f"Device {args.uid} not found")
+        if args.start:
+            start = date.fromisoformat(args.start)
+        else:
+            oldest = conn.execute(text("SELECT MIN(timestamp) FROM sensor_data")).scalar()
+            if oldest is None:
+                logger.info("sensor_data is empty, nothing to recompute")
+                return
+            start = oldest.date()
+            cutoff = retention.raw_data_cutoff()
+            if cutoff is not None:
+                start = max(start, cutoff)
+    end = date.fromisoformat(args.end) if args.end else datetime.utcnow().date() + timedelta(days=1)
+
+    try:
+        written = recompute_rollups(start, end, device_id)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    logger.info(f"Recomputed rollups for {start} .. {end}: {written} buckets written")
+
+
+if __name__ == "__main__":
+    main()
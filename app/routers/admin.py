@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, status, Response
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, status, Response
 from sqlalchemy.orm import Session
 import os
-from app import models, schemas, database
-from typing import List, Optional
+from app import models, schemas, database, aggregates, sensor_history
+from typing import List, Literal, Optional
 from datetime import datetime, date, timezone
 from app.auth import require_roles
+from app.counting import CountMode
+from app.device_cache import device_registry
+from app.last_seen import last_seen_tracker
 from sqlalchemy import func, text
 
 router = APIRouter(prefix="/admin", tags=["Administrator"])
@@ -52,6 +55,8 @@ def register_device(
     db.add(new_device)
     db.commit()
     db.refresh(new_device)
+    # UID yang sebelumnya tak dikenal mungkin sudah ter-cache sebagai None
+    device_registry.invalidate(new_device.uid)
     
     return new_device
 
@@ -191,6 +196,7 @@ def admin_update_device_status(
         device.last_seen = None
     db.commit()
     db.refresh(device)
+    last_seen_tracker.forget(device.id)
 
     return {
         "id": device.id,
@@ -222,6 +228,8 @@ def admin_deactivate_device(
     device.deactivate_at = None
     db.commit()
     db.refresh(device)
+    device_registry.invalidate(device.uid)
+    last_seen_tracker.forget(device.id)
 
     return {
         "id": device.id,
@@ -251,6 +259,7 @@ def admin_activate_device(
     device.deactivate_at = None
     db.commit()
     db.refresh(device)
+    device_registry.invalidate(device.uid)
 
     return {
         "id": device.id,
@@ -290,6 +299,7 @@ def admin_schedule_deactivation(
     device.deactivate_at = deactivate_at
     db.commit()
     db.refresh(device)
+    device_registry.invalidate(device.uid)
 
     return {
         "id": device.id,
@@ -314,6 +324,13 @@ def admin_get_sensor_data(
     skip: int = 0,
     limit: int = 500,
     sort_dir: Optional[str] = "desc",
+    cursor: Optional[str] = None,
+    count: CountMode = "exact",
+    max_points: Optional[int] = Query(None, ge=20, le=5000),
+    downsample: Literal["lttb", "minmax"] = "lttb",
+    downsample_by: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: Literal["rows", "columnar"] = "rows",
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(require_roles("admin"))
 ):
@@ -321,24 +338,10 @@ def admin_get_sensor_data(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    query = db.query(models.SensorData).filter(
-        models.SensorData.device_id == device.id
+    projected = aggregates.parse_fields(fields)
+    rows = sensor_history.history_page(
+        db, response, device.id, start_date, end_date, skip, limit, sort_dir, cursor, count,
+        max_points, downsample, aggregates.parse_fields(downsample_by) if downsample_by else None,
+        projected
     )
-    if start_date:
-        query = query.filter(
-            models.SensorData.timestamp >= datetime.combine(start_date, datetime.min.time())
-        )
-    if end_date:
-        query = query.filter(
-            models.SensorData.timestamp <= datetime.combine(end_date, datetime.max.time())
-        )
-
-    total = query.count()
-    response.headers["X-Total-Count"] = str(total)
-
-    if sort_dir == "asc":
-        query = query.order_by(models.SensorData.timestamp.asc())
-    else:
-        query = query.order_by(models.SensorData.timestamp.desc())
-
-    return query.offset(skip).limit(limit).all()
+    return sensor_history.render(response, rows, projected, format)
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status  
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status  
+from sqlalchemy import text
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
-from app import models, schemas, database, auth
+from app import models, schemas, database, auth, etags, jobs, purge
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from app.auth import get_current_user
+from app.device_cache import device_registry
+from app.last_seen import last_seen_tracker
+from app.monitoring_cache import monitoring_cache
 
 router = APIRouter(prefix="/devices", tags=["Devices"])
 
@@ -34,16 +38,34 @@ def add_device(
     
     db.commit()
     db.refresh(db_device)
+    device_registry.invalidate(db_device.uid)
     return db_device
 
-@router.get("/", response_model=List[schemas.DeviceResponse])
+@router.get(
+    "/",
+    response_model=List[schemas.DeviceWithLatestResponse],
+    response_model_exclude_unset=True
+)
 def get_devices(
+    include_latest: bool = Query(False, description="Sertakan pembacaan sensor terbaru"),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     if current_user.role == "admin":
         raise HTTPException(status_code=403, detail="Admin cannot own devices")
-    return db.query(models.Device).filter(models.Device.user_id == current_user.id).all()
+    query = db.query(models.Device).filter(models.Device.user_id == current_user.id)
+    if not include_latest:
+        return query.all()
+
+    # Satu join ke device_latest (bukan satu subquery per device)
+    devices = query.options(joinedload(models.Device.latest)).all()
+    return [
+        schemas.DeviceWithLatestResponse(
+            **schemas.DeviceResponse.model_validate(device).model_dump(),
+            latest_data=schemas.SensorDataSummary.model_validate(device.latest, from_attributes=True) if device.latest else None
+        )
+        for device in devices
+    ]
 
 @router.delete("/{device_uid}")
 def remove_device(
@@ -61,40 +83,15 @@ def remove_device(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     
-    # Lepas relasi kolam agar device bisa dipakai ulang
-    kolam = db.query(models.Kolam).filter(
-        models.Kolam.device_id == device.id
-    ).first()
-    if kolam:
-        kolam.device_id = None
-        db.add(kolam)
-
-    # Hapus histori terkait device
-    db.query(models.SensorData).filter(
-        models.SensorData.device_id == device.id
-    ).delete()
-    db.query(models.Notification).filter(
-        models.Notification.device_id == device.id
-    ).delete()
-
-    # Reset device menjadi kondisi awal agar bisa di-claim user lain
-    device.user_id = None
-    device.name = None
-    device.last_seen = None
-    device.status = "offline"
-    device.connection_interval = 5
-    device.temp_min_threshold = None
-    device.temp_max_threshold = None
-    device.ph_min_threshold = None
-    device.ph_max_threshold = None
-    device.do_min_threshold = None
-    device.tds_max_threshold = None
-    device.ammonia_max_threshold = None
-    device.salinitas_min_threshold = None
-    device.salinitas_max_threshold = None
+    # Device langsung bisa di-claim user lain; histori dihapus job background
+    payload = purge.release_device(db, device)
+    job = jobs.enqueue(db, "purge_device", payload, created_by=current_user.id)
     db.commit()
+    device_registry.invalidate(device.uid)
+    last_seen_tracker.forget(device.id)
+    monitoring_cache.invalidate_user(current_user.id)
     
-    return {"message": "Device removed successfully"}
+    return {"message": "Device removed successfully", "job_id": job.id}
 
 # TAMBAHKAN MODEL UNTUK UPDATE
 class DeviceUpdate(BaseModel):
@@ -130,6 +127,7 @@ def update_device(
         device.connection_interval = device_update.connection_interval
     
     db.commit()
+    monitoring_cache.invalidate_user(current_user.id)
     db.refresh(device)
     return device
 
@@ -191,17 +189,32 @@ def move_device_to_kolam(
     db.add(target_kolam)
     
     db.commit()
+    monitoring_cache.invalidate_user(current_user.id)
     db.refresh(target_kolam)
     
     return target_kolam
 
 @router.get("/status/", response_model=schemas.DeviceStatusResponse)
 def get_devices_status(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(database.get_db)
 ):
     if current_user.role == "admin":
         raise HTTPException(status_code=403, detail="Admin cannot own devices")
+    # ETag = hash semua kolom device milik user, dihitung di database
+    etag = etags.make_etag(db.execute(
+        text(
+            "SELECT md5(string_agg(CAST(d AS TEXT), ',' ORDER BY d.id)) "
+            "FROM devices AS d WHERE d.user_id = :user_id"
+        ),
+        {"user_id": current_user.id}
+    ).scalar())
+    not_modified = etags.check(request, response, etag)
+    if not_modified:
+        return not_modified
+
     devices = db.query(models.Device).filter(
         models.Device.user_id == current_user.id
     ).all()
@@ -243,6 +256,7 @@ def set_maintenance_mode(
     
     device.status = 'maintenance'
     db.commit()
+    last_seen_tracker.forget(device.id)
     return None
 
 @router.put("/{device_id}/online", status_code=status.HTTP_204_NO_CONTENT)
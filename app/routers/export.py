@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import datetime
 import csv
 import io
-from app import models, database
+from app import models, database, archive
 from app.schemas import ExportRequest
 
 router = APIRouter(prefix="/export", tags=["Export Data"])
@@ -21,43 +22,58 @@ def export_to_csv(
             detail="Start date must be before end date"
         )
 
-    # Query data
-    sensor_data = db.query(models.SensorData).filter(
-        models.SensorData.device_id == request.device_id,
-        models.SensorData.timestamp >= datetime.combine(request.start_date, datetime.min.time()),
-        models.SensorData.timestamp <= datetime.combine(request.end_date, datetime.max.time())
-    ).order_by(models.SensorData.timestamp).all()
+    # Query data: hanya kolom yang ditulis, sebagai baris Row biasa (tanpa instance ORM)
+    start = datetime.combine(request.start_date, datetime.min.time())
+    end = datetime.combine(request.end_date, datetime.max.time())
+    sensor_data = db.execute(
+        select(
+            models.SensorData.timestamp,
+            *(getattr(models.SensorData, field) for field in models.SENSOR_FIELDS)
+        ).where(
+            models.SensorData.device_id == request.device_id,
+            models.SensorData.timestamp >= start,
+            models.SensorData.timestamp <= end
+        ).order_by(models.SensorData.timestamp)
+    ).all()
 
-    if not sensor_data:
+    # Bulan yang sudah diarsipkan dibaca langsung dari file arsip (mmap)
+    archived = archive.archived_months(db, request.device_id, start, end)
+    if not sensor_data and not archive.count_archived(archived, start, end):
         raise HTTPException(status_code=404, detail="No data found")
 
-    # Generate CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        "Timestamp", "Temperature (°C)", "pH", 
-        "Dissolved Oxygen (mg/L)", "TDS (ppm)",
-        "Ammonia (mg/L)", "Salinity (ppt)"
-    ])
-    
-    # Rows
-    for data in sensor_data:
+    def generate_csv():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        
+        # Header
         writer.writerow([
-            data.timestamp.isoformat(),
-            data.suhu,
-            data.ph,
-            data.do,
-            data.tds,
-            data.ammonia,
-            data.salinitas
+            "Timestamp", "Temperature (°C)", "pH", 
+            "Dissolved Oxygen (mg/L)", "TDS (ppm)",
+            "Ammonia (mg/L)", "Salinity (ppt)"
         ])
+        
+        # Rows
+        for count, data in enumerate(
+            archive.merge_readings(archive.iter_archived(archived, start, end), sensor_data), 1
+        ):
+            writer.writerow([
+                data.timestamp.isoformat(),
+                data.suhu,
+                data.ph,
+                data.do,
+                data.tds,
+                data.ammonia,
+                data.salinitas
+            ])
+            if count % 1000 == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
     
     # Return as downloadable file
-    output.seek(0)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        generate_csv(),
         media_type="text/csv",
         headers={
             "Content-Disposition": (
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Literal, Optional
+from app import models, schemas, database
+from app.auth import get_current_user
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+@router.get("/", response_model=List[schemas.JobResponse])
+def list_jobs(
+    status: Optional[Literal["pending", "running", "done", "failed"]] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Job background terbaru. Admin melihat semua job, user lain hanya job
+    yang ia buat.
+    """
+    query = db.query(models.Job)
+    if current_user.role != "admin":
+        query = query.filter(models.Job.created_by == current_user.id)
+    if status:
+        query = query.filter(models.Job.status == status)
+    return query.order_by(models.Job.id.desc()).limit(limit).all()
+
+@router.get("/{job_id}", response_model=schemas.JobResponse)
+def get_job(
+    job_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if not job or (current_user.role != "admin" and job.created_by != current_user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
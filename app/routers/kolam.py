@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app import models, schemas, database, auth
 from typing import List, Optional
 from app.auth import get_current_user
+from app.monitoring_cache import monitoring_cache
 from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/kolam", tags=["Kolam"])
@@ -37,21 +38,43 @@ def create_kolam(
     new_kolam = models.Kolam(**kolam.dict())
     db.add(new_kolam)
     db.commit()
+    monitoring_cache.invalidate_user(current_user.id)
     db.refresh(new_kolam)
     return new_kolam
 
-@router.get("/", response_model=List[schemas.KolamResponse])
+@router.get(
+    "/",
+    response_model=List[schemas.KolamWithLatestResponse],
+    response_model_exclude_unset=True
+)
 def get_kolam(
     tambak_id: int,
+    include_latest: bool = Query(False, description="Sertakan kualitas air terbaru dari device kolam"),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user)
 ):
     if current_user.role == "admin":
         raise HTTPException(status_code=403, detail="Admin cannot view kolam")
-    return db.query(models.Kolam).join(models.Tambak).filter(
+    query = db.query(models.Kolam).join(models.Tambak).filter(
         models.Tambak.user_id == current_user.id,
         models.Kolam.tambak_id == tambak_id
-    ).all()
+    )
+    if not include_latest:
+        return query.all()
+
+    # Satu outer join ke device_latest untuk semua kolam
+    rows = query.outerjoin(
+        models.DeviceLatest, models.DeviceLatest.device_id == models.Kolam.device_id
+    ).add_entity(models.DeviceLatest).all()
+    return [
+        schemas.KolamWithLatestResponse(
+            id=kolam.id,
+            nama=kolam.nama,
+            komoditas=kolam.komoditas,
+            latest_data=schemas.SensorDataSummary.model_validate(latest, from_attributes=True) if latest else None
+        )
+        for kolam, latest in rows
+    ]
 
 @router.delete("/{kolam_id}")
 def delete_kolam(
@@ -70,6 +93,7 @@ def delete_kolam(
         raise HTTPException(status_code=404, detail="Kolam not found")
     db.delete(kolam)
     db.commit()
+    monitoring_cache.invalidate_user(current_user.id)
     return {"message": "Kolam deleted successfully"}
     
 class KolamUpdate(BaseModel):
@@ -150,5 +174,6 @@ def update_kolam(
         setattr(db_kolam, field, value)
 
     db.commit()
+    monitoring_cache.invalidate_user(current_user.id)
     db.refresh(db_kolam)
     return db_kolam
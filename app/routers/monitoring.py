@@ -1,34 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
 from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, timedelta
-from typing import Optional
-from app import models, schemas, database, auth
+from typing import Dict, List, Optional, Tuple
+from app import models, schemas, database, auth, etags
+from app.live_hub import LIVE_CLIENTS, LiveSubscriber, live_hub
+from app.monitoring_cache import monitoring_cache
+import asyncio
+import orjson
+import os
 
 router = APIRouter(prefix="/monitoring", tags=["Monitoring"])
 
-@router.get("/", response_model=schemas.MonitoringResponse)
-def get_monitoring(
-    last_n: Optional[int] = Query(
-        default=10,
-        description="Jumlah data sensor terakhir yang ingin diambil (default 10)",
-        gt=0  # Memastikan nilai lebih besar dari 0
-    ),
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
-):
+_RECENT_SQL = text(
+    f"""
+    SELECT d.device_id, s.timestamp, {", ".join(f's."{field}"' for field in models.SENSOR_FIELDS)}
+    FROM unnest(CAST(:device_ids AS INTEGER[])) AS d(device_id)
+    CROSS JOIN LATERAL (
+        SELECT * FROM sensor_data
+        WHERE sensor_data.device_id = d.device_id
+        ORDER BY sensor_data.timestamp DESC
+        LIMIT :last_n
+    ) AS s
+    ORDER BY d.device_id, s.timestamp ASC
+    """
+)
+
+
+def recent_readings(db: Session, device_ids: List[int], last_n: int) -> Dict[int, list]:
+    """
+    last_n pembacaan terbaru per device ({device_id: [row, ...]}, terlama ke
+    terbaru) dalam satu query. LATERAL + LIMIT memakai index
+    (device_id, timestamp) sehingga hanya last_n baris per device yang
+    dibaca, berapa pun panjang historinya.
+    """
+    result: Dict[int, list] = {}
+    if not device_ids:
+        return result
+    for row in db.execute(_RECENT_SQL, {"device_ids": device_ids, "last_n": last_n}):
+        result.setdefault(row.device_id, []).append(row)
+    return result
+
+
+def _summary(row) -> dict:
+    # Bentuk schemas.SensorDataSummary tanpa membuat model pydantic per baris
+    summary = {field: getattr(row, field) for field in models.SENSOR_FIELDS}
+    summary["timestamp"] = row.timestamp
+    return summary
+
+
+def _encode(result: dict) -> Tuple[bytes, str]:
+    body = orjson.dumps(result)
+    return body, etags.make_etag(body)
+
+
+def monitoring_snapshot(
+    db: Session,
+    current_user: models.User,
+    last_n: int
+) -> Tuple[bytes, str]:
+    """
+    Body JSON respons monitoring (bentuk schemas.MonitoringResponse, sudah
+    diserialisasi dengan orjson) beserta ETag-nya (hash body, sama di semua
+    replika). Polling berulang di antara pembacaan cukup dari memori tanpa
+    serialisasi ulang.
+    """
+    cached = monitoring_cache.get(current_user.id, last_n)
+    if cached is not None:
+        return cached
+    started = monitoring_cache.start()
+
     try:
         kolams = db.query(models.Kolam).join(models.Tambak).filter(
             models.Tambak.user_id == current_user.id
         ).options(
-            joinedload(models.Kolam.device)
+            joinedload(models.Kolam.device).joinedload(models.Device.latest)
         ).all()
 
         if not kolams:
-            return schemas.MonitoringResponse(kolam_list=[])
+            entry = _encode({"kolam_list": [], "current_kolam_id": None, "current_device_id": None})
+            monitoring_cache.store(current_user.id, last_n, (), entry, started)
+            return entry
 
         response = []
         devices = []
 
+        # last_n pembacaan semua device dalam satu query
+        recent = recent_readings(
+            db, [kolam.device.id for kolam in kolams if kolam.device], last_n
+        )
+
         for kolam in kolams:
             device_data = []
             
@@ -36,67 +98,198 @@ def get_monitoring(
                 device = kolam.device
                 devices.append(device)
                 
-                # Handle latest data
-                latest = db.query(models.SensorData).filter(
-                    models.SensorData.device_id == device.id
-                ).order_by(models.SensorData.timestamp.desc()).first()
-                
-                # Handle historical data (modifikasi disini)
-                historical_query = db.query(models.SensorData).filter(
-                    models.SensorData.device_id == device.id
-                ).order_by(models.SensorData.timestamp.desc())
-                
-                # Ambil data sesuai parameter last_n
-                historical = historical_query.limit(last_n).all()
-                historical.reverse()  # Urutkan dari terlama ke terbaru
-                
-                # Format latest data (handle None)
-                latest_summary = None
-                if latest:
-                    latest_summary = schemas.SensorDataSummary(
-                        suhu=latest.suhu,
-                        ph=latest.ph,
-                        do=latest.do,
-                        tds=latest.tds,
-                        ammonia=latest.ammonia,
-                        salinitas=latest.salinitas,
-                        timestamp=latest.timestamp
-                    )
+                # Sudah urut dari terlama ke terbaru
+                historical = recent.get(device.id, [])
                 
-                # Format historical data
-                historical_summary = [
-                    schemas.SensorDataSummary(
-                        suhu=data.suhu,
-                        ph=data.ph,
-                        do=data.do,
-                        tds=data.tds,
-                        ammonia=data.ammonia,
-                        salinitas=data.salinitas,
-                        timestamp=data.timestamp
-                    ) for data in historical
-                ]
+                # Latest = pembacaan terakhir di histori; device_latest
+                # (ikut di-join di atas) jika histori mentah sudah diarsip/dihapus
+                latest = historical[-1] if historical else device.latest
                 
-                device_data.append(schemas.DeviceMonitoring(
-                    id=device.id,
-                    name=device.name,
-                    latest_data=latest_summary,
-                    historical_data=historical_summary
-                ))
-
-            response.append(schemas.KolamMonitoring(
-                id=kolam.id,
-                nama=kolam.nama,
-                devices=device_data
-            ))
-
-        return schemas.MonitoringResponse(
-            kolam_list=response,
-            current_kolam_id=kolams[0].id if kolams else None,
-            current_device_id=devices[0].id if devices else None
-        )
+                device_data.append({
+                    "id": device.id,
+                    "name": device.name,
+                    "latest_data": _summary(latest) if latest else None,
+                    "historical_data": [_summary(data) for data in historical]
+                })
+
+            response.append({
+                "id": kolam.id,
+                "nama": kolam.nama,
+                "devices": device_data
+            })
+
+        entry = _encode({
+            "kolam_list": response,
+            "current_kolam_id": kolams[0].id if kolams else None,
+            "current_device_id": devices[0].id if devices else None
+        })
+        monitoring_cache.store(current_user.id, last_n, [device.id for device in devices], entry, started)
+        return entry
 
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error retrieving monitoring data: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/", response_model=schemas.MonitoringResponse)
+def get_monitoring(
+    request: Request,
+    response: Response,
+    last_n: Optional[int] = Query(
+        default=10,
+        description="Jumlah data sensor terakhir yang ingin diambil (default 10)",
+        gt=0  # Memastikan nilai lebih besar dari 0
+    ),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    body, etag = monitoring_snapshot(db, current_user, last_n)
+    return etags.check(request, response, etag) or Response(
+        body, media_type="application/json", headers=dict(response.headers)
+    )
+
+
+LIVE_REFRESH_SECONDS = float(os.getenv("LIVE_REFRESH_SECONDS", "30"))
+
+
+def _bearer_token(websocket: WebSocket) -> Optional[str]:
+    authorization = websocket.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token.strip()
+    return None
+
+
+def _live_devices(token: str) -> Optional[Tuple[int, Dict[int, Optional[int]]]]:
+    """
+    Validasi ulang token lalu ambil device milik user: {device_id: kolam_id}.
+    None jika token tidak valid/kedaluwarsa.
+    """
+    db = database.SessionLocal()
+    try:
+        user = auth.get_user_by_token(db, token)
+        if not user:
+            return None
+        devices = {
+            device_id: None
+            for (device_id,) in db.query(models.Device.id).filter(
+                models.Device.user_id == user.id
+            )
+        }
+        bound = db.query(models.Kolam.device_id, models.Kolam.id).join(models.Tambak).filter(
+            models.Tambak.user_id == user.id,
+            models.Kolam.device_id.isnot(None)
+        )
+        for device_id, kolam_id in bound:
+            devices[device_id] = kolam_id
+        return user.id, devices
+    finally:
+        db.close()
+
+
+def _live_snapshot(token: str, last_n: int) -> Optional[dict]:
+    db = database.SessionLocal()
+    try:
+        user = auth.get_user_by_token(db, token)
+        if not user:
+            return None
+        return orjson.loads(monitoring_snapshot(db, user, last_n)[0])
+    finally:
+        db.close()
+
+
+async def _drain_client(websocket: WebSocket) -> None:
+    # Pesan dari klien diabaikan; loop ini hanya untuk mendeteksi disconnect
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+async def _push_readings(websocket: WebSocket, subscriber: LiveSubscriber, token: str,
+                         devices: Dict[int, Optional[int]]) -> None:
+    loop = asyncio.get_running_loop()
+    next_refresh = loop.time() + LIVE_REFRESH_SECONDS
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscriber.queue.get(), max(next_refresh - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                # Token bisa kedaluwarsa dan device bisa di-claim/dilepas
+                # selama koneksi terbuka; cek ulang berkala
+                try:
+                    live = await run_in_threadpool(_live_devices, token)
+                except Exception:
+                    await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+                    return
+                if live is None:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
+                devices = live[1]
+                live_hub.subscribe(subscriber, devices)
+                next_refresh = loop.time() + LIVE_REFRESH_SECONDS
+                await websocket.send_json({"type": "heartbeat"})
+                continue
+
+            await websocket.send_json({**message, "kolam_id": devices.get(message["device_id"])})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+@router.websocket("/ws")
+async def monitoring_ws(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None, description="Bearer token (alternatif header Authorization)"),
+    last_n: int = Query(10, gt=0)
+):
+    """
+    Stream pembacaan baru untuk device milik user. Pesan pertama berisi
+    snapshot yang sama dengan GET /monitoring, selanjutnya satu pesan
+    {"type": "reading", "device_id", "kolam_id", "data"} per pembacaan baru
+    (dari proses ini maupun replika/gateway lain lewat app.live_notify) dan
+    {"type": "heartbeat"} berkala. Koneksi ditutup dengan 1008 jika token
+    tidak valid dan 1011 jika snapshot/refresh gagal.
+    """
+    token = token or _bearer_token(websocket)
+    live = await run_in_threadpool(_live_devices, token) if token else None
+    if live is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    user_id, devices = live
+
+    await websocket.accept()
+    subscriber = LiveSubscriber(user_id, asyncio.get_running_loop())
+    # Subscribe sebelum snapshot supaya tidak ada pembacaan yang terlewat
+    live_hub.subscribe(subscriber, devices)
+    LIVE_CLIENTS.inc()
+    try:
+        try:
+            snapshot = await run_in_threadpool(_live_snapshot, token, last_n)
+        except Exception as e:
+            # Mis. HTTPException 500 dari monitoring_snapshot; tutup dengan
+            # kode yang jelas, bukan koneksi yang putus begitu saja
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR, reason=str(detail)[:120])
+            return
+        if snapshot is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await websocket.send_json({"type": "snapshot", **snapshot})
+
+        tasks = {
+            asyncio.ensure_future(_drain_client(websocket)),
+            asyncio.ensure_future(_push_readings(websocket, subscriber, token, devices))
+        }
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        live_hub.unsubscribe(subscriber)
+        LIVE_CLIENTS.dec()
@@ -1,14 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import text
 from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, timedelta
-from app import models, schemas, database
+from app import models, schemas, database, etags
 from app.auth import get_current_user
 from typing import List
 
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
+_VALIDATOR_SQL = text(
+    """
+    SELECT COUNT(*), MAX(id), COUNT(*) FILTER (WHERE NOT is_read),
+        (SELECT md5(string_agg(id || ':' || COALESCE(name, ''), ',' ORDER BY id))
+         FROM devices WHERE user_id = :user_id)
+    FROM notifications
+    WHERE user_id = :user_id AND timestamp >= :start
+    """
+)
+
+
+def _notifications_validator(db: Session, user_id: int, start_date: datetime) -> tuple:
+    """
+    Validator ETag tanpa memuat baris: notifikasi baru menaikkan id
+    terbesar, tandai-dibaca menurunkan jumlah unread, notifikasi yang keluar
+    dari jendela `days` mengubah jumlah total, dan nama device ikut di-hash.
+    """
+    return tuple(db.execute(_VALIDATOR_SQL, {"user_id": user_id, "start": start_date}).one())
+
 @router.get("/", response_model=List[schemas.NotificationResponse])
 def get_user_notifications(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(database.get_db),
     days: int = Query(7, ge=1, le=365, description="Filter by last X days"),
@@ -25,6 +47,13 @@ def get_user_notifications(
     """
     try:
         start_date = datetime.utcnow() - timedelta(days=days)
+
+        etag = etags.make_etag(
+            str(request.url.query), _notifications_validator(db, current_user.id, start_date)
+        )
+        not_modified = etags.check(request, response, etag)
+        if not_modified:
+            return not_modified
         
         query = db.query(models.Notification).options(
             joinedload(models.Notification.device)  # Eager loading untuk device
@@ -1,75 +1,265 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from datetime import datetime, date
-from app import models, schemas, database
-from typing import List, Optional
-
-router = APIRouter(prefix="/sensor", tags=["Sensor Data"])
-
-from datetime import datetime
-from fastapi import HTTPException
-
-@router.post("/", response_model=schemas.SensorDataResponse)
+from app import models, schemas, database, aggregates, compare, etags, ingest, reading_codec, rollups, sensor_history, stats
+from app.counting import CountMode
+from app.ingest_buffer import ingest_buffer, is_buffered, IngestQueueFull
+from app.live_hub import live_hub
+from app.monitoring_cache import monitoring_cache
+from typing import List, Literal, Optional
+
+router = APIRouter(prefix="/sensor", tags=["Sensor Data"])
+
+MAX_BATCH_SIZE = schemas.SENSOR_BATCH_MAX_SIZE
+
+from datetime import datetime
+from fastapi import HTTPException
+
+def _enqueue_or_429(rows: List[dict]) -> List[str]:
+    try:
+        return ingest_buffer.enqueue_many(rows)
+    except IngestQueueFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Ingest queue is full, retry later",
+            headers={"Retry-After": "1"}
+        )
+
+def _inline_schema(model) -> dict:
+    # OpenAPI requestBody tidak bisa memakai "$defs" lokal, jadi di-inline
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+    for prop in schema.get("properties", {}).values():
+        ref = prop.get("items", {}).get("$ref", "")
+        if ref.startswith("#/$defs/"):
+            prop["items"] = defs[ref.rsplit("/", 1)[-1]]
+    return schema
+
+def _request_body_doc(model, description: str) -> dict:
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": _inline_schema(model)},
+                reading_codec.CONTENT_TYPE: {
+                    "schema": {"type": "string", "format": "binary"},
+                    "example": description
+                }
+            }
+        }
+    }
+
+async def _read_readings(request: Request, model) -> List[dict]:
+    """
+    Decode body ingest berdasarkan Content-Type.
+    Biner: record 64 byte (lihat app.reading_codec), tanpa validasi pydantic.
+    JSON: divalidasi dengan `model` seperti sebelumnya (422 jika tidak valid).
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    body = await request.body()
+
+    if content_type == reading_codec.CONTENT_TYPE:
+        try:
+            return reading_codec.decode_records(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        payload = model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+    if isinstance(payload, schemas.SensorDataBatchCreate):
+        return [item.model_dump() for item in payload.readings]
+    return [payload.model_dump()]
+
+async def single_reading(request: Request) -> dict:
+    readings = await _read_readings(request, schemas.SensorDataCreate)
+    if len(readings) != 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Use /sensor/batch for more than one reading"
+        )
+    return readings[0]
+
+async def batch_readings(request: Request) -> List[dict]:
+    readings = await _read_readings(request, schemas.SensorDataBatchCreate)
+    if len(readings) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch is limited to {MAX_BATCH_SIZE} readings"
+        )
+    return readings
+
+@router.post(
+    "/",
+    response_model=schemas.SensorDataIngestResponse,
+    responses={202: {"model": schemas.SensorDataQueued}},
+    openapi_extra=_request_body_doc(
+        schemas.SensorDataCreate,
+        f"1 record {reading_codec.RECORD_SIZE} byte"
+    )
+)
 def create_sensor_data(
-    data: schemas.SensorDataCreate,
+    data: dict = Depends(single_reading),
     db: Session = Depends(database.get_db)
 ):
-    device = db.query(models.Device).filter(
-        models.Device.uid == data.uid
-    ).first()
+    now = datetime.utcnow()
+    device = ingest.resolve_devices(db, [data["uid"]], now).get(data["uid"])
     
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    if device.deactivate_at and device.deactivate_at <= datetime.utcnow():
-        device.is_active = False
-        device.status = "offline"
-        device.last_seen = None
-        db.add(device)
-        db.commit()
     if device.is_active is False:
         raise HTTPException(status_code=403, detail="Device is inactive")
-    
-    try:
-        # Parse timestamp dari device TANPA konversi timezone
-        device_timestamp = datetime.fromisoformat(data.timestamp.replace('Z', '+00:00'))
-        
-        # Jika timestamp memiliki timezone, strip informasi timezone-nya
-        if device_timestamp.tzinfo is not None:
-            device_timestamp = device_timestamp.replace(tzinfo=None)
-    except ValueError:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid timestamp format. Gunakan format ISO 8601 (contoh: 2025-07-18T06:00:00)"
-        )
-    
-    # Update last_seen device (tetap gunakan waktu server untuk internal tracking)
-    device.last_seen = datetime.utcnow()
-    device.status = 'online'
-    db.add(device)
-    
-    # Simpan timestamp persis seperti dari device (tanpa timezone)
-    sensor_data = models.SensorData(
-        device_id=device.id,
-        timestamp=device_timestamp,  # Gunakan langsung timestamp device
-        suhu=data.suhu,
-        ph=data.ph,
-        do=data.do,
-        tds=data.tds,
-        ammonia=data.ammonia,
-        salinitas=data.salinitas
-    )
-    
-    db.add(sensor_data)
-    db.commit()
-    db.refresh(sensor_data)
-    
-    return sensor_data
-
-from fastapi import Depends, HTTPException, status
-from app.auth import get_current_user
-
+    
+    try:
+        # Parse timestamp dari device TANPA konversi timezone
+        row = ingest.to_row(device.id, data)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid timestamp format. Gunakan format ISO 8601 (contoh: 2025-07-18T06:00:00)"
+        )
+
+    if is_buffered():
+        # Mode buffered: flusher yang menyimpan data dan memperbarui last_seen
+        ingest_id = _enqueue_or_429([row])[0]
+        return JSONResponse(
+            status_code=202,
+            content={"status": "queued", "ingest_id": ingest_id}
+        )
+    
+    # Update last_seen device (tetap gunakan waktu server untuk internal tracking)
+    ingest.touch_devices(db, [device.id], now)
+    inserted = ingest.insert_readings(db, [row])
+    db.commit()
+    live_hub.publish_readings([row], inserted)
+    monitoring_cache.invalidate_devices(device_id for device_id, _ in inserted)
+
+    row_id = inserted.get(ingest.reading_key(row))
+    if row_id is not None:
+        return {"id": row_id, "created": True, **row}
+
+    # Retry dari device: kembalikan data yang sudah tersimpan
+    existing = db.query(models.SensorData).filter(
+        models.SensorData.device_id == device.id,
+        models.SensorData.timestamp == row["timestamp"]
+    ).first()
+    return {
+        "id": existing.id,
+        "device_id": existing.device_id,
+        "timestamp": existing.timestamp,
+        "created": False,
+        **{field: getattr(existing, field) for field in ingest.SENSOR_FIELDS}
+    }
+
+@router.post(
+    "/batch",
+    response_model=schemas.SensorBatchResponse,
+    responses={202: {"model": schemas.SensorBatchResponse}},
+    openapi_extra=_request_body_doc(
+        schemas.SensorDataBatchCreate,
+        f"N x record {reading_codec.RECORD_SIZE} byte (maks. {MAX_BATCH_SIZE})"
+    )
+)
+def create_sensor_data_batch(
+    readings: List[dict] = Depends(batch_readings),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Ingest banyak pembacaan sekaligus (replay buffer device setelah koneksi putus).
+    Device di-resolve sekali, semua baris valid disimpan dengan satu multi-row
+    INSERT dalam satu transaksi. Hasil dikembalikan per baris: accepted,
+    duplicate (device + timestamp sudah tersimpan) atau rejected.
+    Pada mode buffered baris valid di-enqueue (status "queued", HTTP 202).
+    """
+    now = datetime.utcnow()
+    devices = ingest.resolve_devices(db, (item["uid"] for item in readings), now)
+
+    results = []
+    rows = []
+    accepted_indexes = []
+    seen_devices = set()
+
+    for index, item in enumerate(readings):
+        uid = item["uid"]
+        device = devices.get(uid)
+        if not device:
+            results.append(schemas.SensorBatchItemResult(
+                index=index, uid=uid, status="rejected", detail="Device not found"
+            ))
+            continue
+        if device.is_active is False:
+            results.append(schemas.SensorBatchItemResult(
+                index=index, uid=uid, status="rejected", detail="Device is inactive"
+            ))
+            continue
+        try:
+            rows.append(ingest.to_row(device.id, item))
+        except ValueError:
+            results.append(schemas.SensorBatchItemResult(
+                index=index, uid=uid, status="rejected", detail="Invalid timestamp format"
+            ))
+            continue
+
+        accepted_indexes.append(len(results))
+        results.append(schemas.SensorBatchItemResult(
+            index=index, uid=uid, status="accepted"
+        ))
+        seen_devices.add(device.id)
+
+    if is_buffered():
+        ingest_ids = _enqueue_or_429(rows)
+        for result_index, ingest_id in zip(accepted_indexes, ingest_ids):
+            results[result_index].status = "queued"
+            results[result_index].ingest_id = ingest_id
+        accepted = len(rows)
+        return JSONResponse(
+            status_code=202,
+            content=schemas.SensorBatchResponse(
+                accepted=accepted,
+                rejected=len(results) - accepted,
+                results=results
+            ).model_dump()
+        )
+
+    # Satu UPDATE last_seen untuk semua device, bukan per baris
+    ingest.touch_devices(db, seen_devices, now)
+
+    inserted = ingest.insert_readings(db, rows)
+    db.commit()
+    live_hub.publish_readings(rows, inserted)
+    monitoring_cache.invalidate_devices(device_id for device_id, _ in inserted)
+
+    accepted = 0
+    duplicates = 0
+    for result_index, row in zip(accepted_indexes, rows):
+        # pop: duplikat di dalam batch yang sama hanya dihitung sekali
+        row_id = inserted.pop(ingest.reading_key(row), None)
+        if row_id is None:
+            results[result_index].status = "duplicate"
+            duplicates += 1
+        else:
+            results[result_index].id = row_id
+            accepted += 1
+
+    return schemas.SensorBatchResponse(
+        accepted=accepted,
+        duplicates=duplicates,
+        rejected=len(results) - accepted - duplicates,
+        results=results
+    )
+
+from fastapi import Depends, HTTPException, status
+from app.auth import get_current_user
+
 @router.get("/", response_model=List[schemas.SensorDataResponse])
 def get_sensor_data(
+    request: Request,
     response: Response,
     uid: str = Query(..., description="UID perangkat"),
     start_date: Optional[date] = Query(None, description="Start date (YYYY-MM-DD)"),
@@ -77,48 +267,182 @@ def get_sensor_data(
     skip: int = Query(0, ge=0),
     limit: int = Query(500, ge=1, le=5000),
     sort_dir: Optional[str] = Query("desc"),
+    cursor: Optional[str] = Query(None, description="Nilai header X-Next-Cursor / X-Prev-Cursor dari halaman sebelumnya"),
+    count: CountMode = Query("exact", description="X-Total-Count: exact | estimated | none"),
+    max_points: Optional[int] = Query(None, ge=20, le=5000, description="Decimasi halaman untuk grafik"),
+    downsample: Literal["lttb", "minmax"] = Query("lttb", description="Metode decimasi untuk max_points"),
+    downsample_by: Optional[str] = Query(None, description="Parameter acuan decimasi, dipisah koma (default semua)"),
+    fields: Optional[str] = Query(None, description="Parameter yang dikirim, dipisah koma (default semua)"),
+    format: Literal["rows", "columnar"] = Query("rows", description="rows: list objek; columnar: {timestamp: [...], <field>: [...]}"),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(get_current_user)  # Verifikasi token
 ):
-    """
-    Mendapatkan data sensor DENGAN otorisasi.
-    Hanya pemilik device yang bisa akses datanya.
-    """
-    
-    # 1. Cari device dan verifikasi kepemilikan
-    device = db.query(models.Device).filter(
-        models.Device.uid == uid,
-        models.Device.user_id == current_user.id  # Pastikan device milik user
-    ).first()
-
-    if not device:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Device tidak ditemukan atau tidak memiliki akses"
-        )
-
-    # 2. Query data
-    query = db.query(models.SensorData).filter(
-        models.SensorData.device_id == device.id
+    """
+    Mendapatkan data sensor DENGAN otorisasi.
+    Hanya pemilik device yang bisa akses datanya.
+    Untuk scroll histori panjang pakai cursor (X-Next-Cursor), bukan skip.
+    Untuk grafik pakai fields + format=columnar (payload jauh lebih kecil).
+    """
+    
+    # 1. Cari device dan verifikasi kepemilikan
+    device = db.query(models.Device).filter(
+        models.Device.uid == uid,
+        models.Device.user_id == current_user.id  # Pastikan device milik user
+    ).first()
+
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device tidak ditemukan atau tidak memiliki akses"
+        )
+
+    # 2. Conditional GET: validator murah sebelum memuat baris apa pun
+    etag = etags.make_etag(
+        device.id, str(request.url.query),
+        sensor_history.history_validator(db, device, start_date, end_date)
     )
+    not_modified = etags.check(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    # 3. Query data (sensor_data + arsip dingin jika rentangnya menyentuh arsip)
+    projected = aggregates.parse_fields(fields)
+    rows = sensor_history.history_page(
+        db, response, device.id, start_date, end_date, skip, limit, sort_dir, cursor, count,
+        max_points, downsample, aggregates.parse_fields(downsample_by) if downsample_by else None,
+        projected
+    )
+    return sensor_history.render(response, rows, projected, format)
+
 
-    if start_date:
-        query = query.filter(
-            models.SensorData.timestamp >= datetime.combine(start_date, datetime.min.time())
+@router.get("/rollups", response_model=List[schemas.SensorRollupResponse])
+def get_sensor_rollups(
+    response: Response,
+    uid: str = Query(..., description="UID perangkat"),
+    start: datetime = Query(..., description="Awal rentang (timestamp device)"),
+    end: datetime = Query(..., description="Akhir rentang, eksklusif"),
+    resolution: Literal["auto", "1m", "1h", "1d"] = Query(
+        "auto", description="Lebar bucket; auto memilih berdasarkan panjang rentang"
+    ),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Min/max/rata-rata per bucket dari tabel rollup, untuk grafik rentang
+    panjang tanpa menarik data mentah. Header X-Rollup-Resolution berisi
+    resolusi yang dipakai.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    device = db.query(models.Device).filter(
+        models.Device.uid == uid,
+        models.Device.user_id == current_user.id
+    ).first()
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device tidak ditemukan atau tidak memiliki akses"
         )
-    if end_date:
-        query = query.filter(
-            models.SensorData.timestamp <= datetime.combine(end_date, datetime.max.time())
+
+    if resolution == "auto":
+        resolution = rollups.choose_resolution(start, end)
+    response.headers["X-Rollup-Resolution"] = resolution
+    return rollups.query_rollups(db, device.id, resolution, start, end)
+
+
+@router.get(
+    "/aggregate",
+    response_model=List[schemas.SensorAggregateResponse],
+    response_model_exclude_unset=True
+)
+def get_sensor_aggregate(
+    uid: str = Query(..., description="UID perangkat"),
+    start: datetime = Query(..., description="Awal rentang (timestamp device)"),
+    end: datetime = Query(..., description="Akhir rentang, eksklusif"),
+    bucket: Literal["5m", "1h", "1d"] = Query("1h", description="Lebar bucket"),
+    aggs: str = Query("avg,min,max", description="Agregat dipisah koma: avg,min,max,count,stddev,p<N> (mis. p50,p95)"),
+    fields: Optional[str] = Query(None, description="Parameter dipisah koma (default semua)"),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Agregat per bucket waktu untuk grafik per jam/hari, dihitung di server
+    (lihat app/aggregates.py). Bucket tanpa data tidak dikirim.
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    field_list = aggregates.parse_fields(fields)
+    aggregate_list = aggregates.parse_aggregates(aggs)
+
+    device = db.query(models.Device).filter(
+        models.Device.uid == uid,
+        models.Device.user_id == current_user.id
+    ).first()
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device tidak ditemukan atau tidak memiliki akses"
         )
 
-    total = query.count()
-    response.headers["X-Total-Count"] = str(total)
+    return aggregates.aggregate_history(db, device.id, start, end, bucket, field_list, aggregate_list)
+
 
-    if sort_dir == "asc":
-        query = query.order_by(models.SensorData.timestamp.asc())
-    else:
-        query = query.order_by(models.SensorData.timestamp.desc())
+@router.get("/compare", response_model=schemas.SensorCompareResponse)
+def get_sensor_compare(
+    start: datetime = Query(..., description="Awal rentang (timestamp device)"),
+    end: datetime = Query(..., description="Akhir rentang, eksklusif"),
+    uids: Optional[str] = Query(None, description="UID perangkat dipisah koma"),
+    tambak_id: Optional[int] = Query(None, description="Semua device di kolam tambak ini (pengganti uids)"),
+    fields: Optional[str] = Query(None, description="Parameter dipisah koma (default semua)"),
+    bucket: Optional[Literal["5m", "1h", "1d"]] = Query(None, description="Sejajarkan series per bucket (dari rollup)"),
+    agg: Literal["avg", "min", "max"] = Query("avg", description="Nilai per bucket"),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Bandingkan histori beberapa device (mis. semua kolam satu tambak) dalam
+    satu request (lihat app/compare.py).
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    uid_list = list(dict.fromkeys(uid.strip() for uid in (uids or "").split(",") if uid.strip()))
+    if bool(uid_list) == (tambak_id is not None):
+        raise HTTPException(status_code=400, detail="Provide either uids or tambak_id")
+    field_list = aggregates.parse_fields(fields)
 
-    sensor_data = query.offset(skip).limit(limit).all()
+    devices = compare.resolve_devices(db, current_user.id, uid_list, tambak_id)
+    return ORJSONResponse(compare.compare_devices(db, devices, start, end, field_list, bucket, agg))
+
+
+@router.get("/stats", response_model=schemas.SensorStatsResponse)
+def get_sensor_stats(
+    uid: str = Query(..., description="UID perangkat"),
+    start: datetime = Query(..., description="Awal rentang (timestamp device)"),
+    end: datetime = Query(..., description="Akhir rentang, eksklusif"),
+    fields: Optional[str] = Query(None, description="Parameter dipisah koma (default semua)"),
+    window: Literal["1h", "6h", "1d", "7d"] = Query("1d", description="Lebar jendela statistik rolling"),
+    source: Literal["auto", "raw", "rollup"] = Query("auto", description="auto: rollup per jam untuk rentang panjang"),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Statistik per parameter (mean, stddev, min/max, p5/p50/p95,
+    time-in-range terhadap threshold device, rolling) dihitung di server
+    dengan NumPy (lihat app/stats.py).
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    field_list = aggregates.parse_fields(fields)
+
+    device = db.query(models.Device).filter(
+        models.Device.uid == uid,
+        models.Device.user_id == current_user.id
+    ).first()
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device tidak ditemukan atau tidak memiliki akses"
+        )
 
-    return sensor_data
+    return ORJSONResponse(stats.sensor_stats(db, device, start, end, field_list, window, source))
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app import models, schemas, database, auth
 from pydantic import BaseModel, Field
 from app.auth import get_current_user
+from app.monitoring_cache import monitoring_cache
 from typing import List, Optional
 
 router = APIRouter(prefix="/tambak", tags=["Tambak"])
@@ -60,6 +61,8 @@ def delete_tambak(
     
     db.delete(tambak)
     db.commit()
+    # Kolam di tambak ini ikut hilang dari monitoring
+    monitoring_cache.invalidate_user(current_user.id)
     return {"message": "Tambak berhasil dihapus"}
 
 class TambakUpdate(BaseModel):
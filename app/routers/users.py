@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 import uuid
-from app import models, schemas, database
+from app import models, schemas, database, counting, jobs, purge
 from app.auth import (
     get_password_hash,
     verify_password,
@@ -11,6 +11,9 @@ from app.auth import (
     create_auth_token,
     require_roles
 )
+from app.counting import CountMode
+from app.device_cache import device_registry
+from app.last_seen import last_seen_tracker
 from fastapi.security import HTTPAuthorizationCredentials
 from typing import Optional
 
@@ -95,6 +98,7 @@ def list_users(
     role: Optional[str] = None,
     sort_by: Optional[str] = None,
     sort_dir: Optional[str] = "desc",
+    count: CountMode = "exact",
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(require_roles("admin"))
 ):
@@ -110,8 +114,11 @@ def list_users(
     if role:
         query = query.filter(models.User.role == role)
 
-    total = query.count()
-    response.headers["X-Total-Count"] = str(total)
+    counting.set_total_count(
+        response, count, None,
+        exact=query.count,
+        estimate=lambda: counting.planner_estimate(db, query)
+    )
 
     sort_field_map = {
         "created_at": models.User.created_at,
@@ -198,7 +205,7 @@ def admin_update_user(
     db.refresh(user)
     return user
 
-@router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{user_id}", response_model=schemas.JobResponse, status_code=status.HTTP_202_ACCEPTED)
 def admin_delete_user(
     user_id: int,
     db: Session = Depends(database.get_db),
@@ -212,9 +219,16 @@ def admin_delete_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot delete the current user"
         )
-    db.delete(user)
+    # Akses dicabut dan device dilepas sekarang; histori dan baris user
+    # dihapus job background (status via GET /jobs/{id})
+    payload = purge.release_user(db, user)
+    job = jobs.enqueue(db, "purge_user", payload, created_by=current_user.id)
     db.commit()
-    return None
+    for uid in payload["device_uids"]:
+        device_registry.invalidate(uid)
+    for device in payload["devices"]:
+        last_seen_tracker.forget(device["device_id"])
+    return job
 
 @router.post("/fcm-token", status_code=status.HTTP_200_OK)
 def update_fcm_token(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict, Field, validator
-from typing import Optional, List, Union, Literal
+from typing import Dict, Optional, List, Union, Literal
 from datetime import datetime, date
 
 class UserCreate(BaseModel):
@@ -113,20 +113,123 @@ class SensorDataCreate(BaseModel):
     salinitas: float
     timestamp: str = Field(..., description="Timestamp dalam format ISO 8601 dari device (contoh: 2025-07-18T06:00:00+08:00)")
 
+SENSOR_BATCH_MAX_SIZE = 1000
+
+class SensorDataBatchCreate(BaseModel):
+    readings: List[SensorDataCreate] = Field(
+        ..., min_length=1, max_length=SENSOR_BATCH_MAX_SIZE,
+        description="Daftar pembacaan sensor (boleh dari beberapa UID)"
+    )
+
+class SensorBatchItemResult(BaseModel):
+    index: int
+    uid: str
+    status: Literal["accepted", "queued", "duplicate", "rejected"]
+    id: Optional[int] = None
+    ingest_id: Optional[str] = None
+    detail: Optional[str] = None
+
+class SensorBatchResponse(BaseModel):
+    accepted: int
+    duplicates: int = 0
+    rejected: int
+    results: List[SensorBatchItemResult]
+
+class SensorDataQueued(BaseModel):
+    status: Literal["queued"]
+    ingest_id: str
+
 class SensorDataResponse(BaseModel):
     id: int
     device_id: int
     timestamp: datetime  # Tetap sebagai datetime di response
-    suhu: float
-    ph: float
-    do: float
-    tds: float
-    ammonia: float
-    salinitas: float
+    # Opsional: GET /sensor/?fields=... hanya mengisi parameter yang diminta
+    suhu: Optional[float] = None
+    ph: Optional[float] = None
+    do: Optional[float] = None
+    tds: Optional[float] = None
+    ammonia: Optional[float] = None
+    salinitas: Optional[float] = None
     
     class Config:
         from_attributes = True
 
+class SensorDataIngestResponse(SensorDataResponse):
+    created: bool = Field(True, description="False jika pembacaan (device + timestamp) sudah pernah tersimpan")
+
+class ParameterRollup(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: Optional[float] = None
+
+class SensorRollupResponse(BaseModel):
+    bucket: datetime = Field(..., description="Awal bucket (timestamp device)")
+    count: int
+    suhu: ParameterRollup
+    ph: ParameterRollup
+    do: ParameterRollup
+    tds: ParameterRollup
+    ammonia: ParameterRollup
+    salinitas: ParameterRollup
+
+class SensorAggregateResponse(BaseModel):
+    bucket: datetime = Field(..., description="Awal bucket (timestamp device)")
+    count: int = Field(..., description="Jumlah pembacaan di bucket")
+    # Hanya parameter yang diminta (fields); kunci = agregat (avg, min, max, count, stddev, p95, ...)
+    suhu: Optional[Dict[str, Optional[Union[int, float]]]] = None
+    ph: Optional[Dict[str, Optional[Union[int, float]]]] = None
+    do: Optional[Dict[str, Optional[Union[int, float]]]] = None
+    tds: Optional[Dict[str, Optional[Union[int, float]]]] = None
+    ammonia: Optional[Dict[str, Optional[Union[int, float]]]] = None
+    salinitas: Optional[Dict[str, Optional[Union[int, float]]]] = None
+
+class SensorCompareDevice(BaseModel):
+    device_id: int
+    uid: str
+    name: Optional[str] = None
+    # Hanya tanpa bucket: timestamp pembacaan device ini
+    timestamp: Optional[List[datetime]] = None
+    # Parameter -> nilai, sejajar dengan timestamp (device atau tingkat atas)
+    values: Dict[str, List[Optional[float]]]
+
+class SensorCompareResponse(BaseModel):
+    bucket: Optional[str] = None
+    # Hanya dengan bucket: sumbu timestamp bersama semua device
+    timestamp: Optional[List[datetime]] = None
+    devices: List[SensorCompareDevice]
+
+class SensorRollingStats(BaseModel):
+    # Sejajar dengan rolling_timestamp; null jika jendela tanpa data
+    mean: List[Optional[float]]
+    stddev: List[Optional[float]]
+    min: List[Optional[float]]
+    max: List[Optional[float]]
+
+class SensorParameterStats(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    stddev: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+    p5: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    threshold_min: Optional[float] = None
+    threshold_max: Optional[float] = None
+    time_in_range: Optional[float] = Field(None, description="Porsi pembacaan di dalam threshold (0-1); null tanpa threshold")
+    rolling: SensorRollingStats
+
+class SensorStatsResponse(BaseModel):
+    device_id: int
+    uid: str
+    start: datetime
+    end: datetime
+    source: Literal["raw", "rollup_1h"]
+    window: str
+    rolling_step_seconds: int
+    rolling_timestamp: List[datetime] = Field(..., description="Akhir (eksklusif) tiap jendela rolling")
+    parameters: Dict[str, SensorParameterStats]
+
 class SensorDataSummary(BaseModel):
     suhu: Optional[float] = None
     ph: Optional[float] = None
@@ -136,6 +239,14 @@ class SensorDataSummary(BaseModel):
     salinitas: Optional[float] = None
     timestamp: Optional[datetime] = None
 
+class DeviceWithLatestResponse(DeviceResponse):
+    # Hanya terisi jika include_latest=true
+    latest_data: Optional[SensorDataSummary] = None
+
+class KolamWithLatestResponse(KolamResponse):
+    # Hanya terisi jika include_latest=true
+    latest_data: Optional[SensorDataSummary] = None
+
 class DeviceMonitoring(BaseModel):
     id: int
     name: str
@@ -265,3 +376,16 @@ class KolamUpdate(BaseModel):
 
 class MoveDeviceRequest(BaseModel):
     target_kolam_id: int = Field(..., gt=0, description="ID kolam tujuan")
+
+class JobResponse(BaseModel):
+    id: int
+    type: str
+    status: Literal["pending", "running", "done", "failed"]
+    progress: Optional[Dict[str, int]] = None
+    attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
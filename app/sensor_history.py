@@ -0,0 +1,267 @@
+"""
+Histori pembacaan satu device untuk GET /sensor/ dan GET /admin/sensor:
+gabungan sensor_data dan arsip dingin (app/archive.py), dengan paginasi
+offset (skip/limit, kompatibel lama) atau cursor keyset pada
+(timestamp, id).
+
+Cursor bersifat opaque (base64url JSON) dan menyimpan kunci baris batas,
+arah (next/prev) dan urutan sort. Halaman berikutnya dimulai langsung dari
+kunci itu lewat index (device_id, timestamp), sehingga biayanya tetap sama
+berapa pun kedalamannya.
+
+Endpoint mengambil kolom id/device_id/timestamp dan parameter yang diminta
+(`fields`) sebagai baris Row biasa, tanpa instance ORM, lalu `render`
+menserialisasinya langsung dengan orjson (per baris atau kolumnar) tanpa
+validasi response_model per baris.
+"""
+import base64
+import json
+from datetime import date, datetime
+from itertools import dropwhile, islice
+from operator import attrgetter
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app import archive, counting, downsample, models, rollups
+
+
+class Cursor(NamedTuple):
+    timestamp: datetime
+    id: int
+    direction: str  # 'next' | 'prev'
+    descending: bool
+
+
+def encode_cursor(row, direction: str, descending: bool) -> str:
+    raw = json.dumps({
+        "t": row.timestamp.isoformat(),
+        "i": row.id,
+        "d": direction,
+        "s": "desc" if descending else "asc"
+    }, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(value: str, descending: bool) -> Cursor:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+        cursor = Cursor(datetime.fromisoformat(raw["t"]), int(raw["i"]), raw["d"], raw["s"] == "desc")
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor.direction not in ("next", "prev"):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor.descending != descending:
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort_dir")
+    return cursor
+
+
+def _columns(fields: Optional[List[str]]) -> tuple:
+    if fields is None:
+        return (models.SensorData,)
+    return (
+        models.SensorData.id, models.SensorData.device_id, models.SensorData.timestamp,
+        *(getattr(models.SensorData, field) for field in fields)
+    )
+
+
+def _base_query(db: Session, device_id: int, start: Optional[datetime], end: Optional[datetime],
+                fields: Optional[List[str]] = None):
+    query = db.query(*_columns(fields)).filter(models.SensorData.device_id == device_id)
+    if start is not None:
+        query = query.filter(models.SensorData.timestamp >= start)
+    if end is not None:
+        query = query.filter(models.SensorData.timestamp <= end)
+    return query
+
+
+def count_history(db: Session, device_id: int, start: Optional[datetime], end: Optional[datetime]) -> int:
+    total = _base_query(db, device_id, start, end).count()
+    entries = archive.archived_months(db, device_id, start, end)
+    if entries:
+        total += archive.count_archived(entries, start, end)
+    return total
+
+
+def query_history(db: Session, device_id: int, start: Optional[datetime], end: Optional[datetime],
+                  skip: int, limit: int, descending: bool = True,
+                  fields: Optional[List[str]] = None) -> list:
+    """
+    Paginasi offset: baris ke-skip .. skip+limit dalam urutan timestamp.
+    """
+    query = _base_query(db, device_id, start, end, fields)
+    order = models.SensorData.timestamp.desc() if descending else models.SensorData.timestamp.asc()
+
+    entries = archive.archived_months(db, device_id, start, end)
+    if not entries:
+        return query.order_by(order).offset(skip).limit(limit).all()
+
+    live = query.order_by(order).limit(skip + limit).all()
+    merged = archive.merge_readings(archive.iter_archived(entries, start, end, descending), live, descending)
+    return list(islice(merged, skip, skip + limit))
+
+
+def _fetch_after(db: Session, device_id: int, start: Optional[datetime], end: Optional[datetime],
+                 key: Optional[Tuple[datetime, int]], descending: bool, count: int,
+                 fields: Optional[List[str]] = None) -> list:
+    """
+    Ambil maksimal `count` baris dalam urutan `descending`, mulai tepat
+    setelah `key` (eksklusif).
+    """
+    timestamp = models.SensorData.timestamp
+    query = _base_query(db, device_id, start, end, fields)
+    if key is not None:
+        # Batas timestamp dipakai sebagai kondisi index; id hanya pemecah seri
+        if descending:
+            query = query.filter(timestamp <= key[0], or_(timestamp < key[0], models.SensorData.id < key[1]))
+            end = key[0] if end is None else min(end, key[0])
+        else:
+            query = query.filter(timestamp >= key[0], or_(timestamp > key[0], models.SensorData.id > key[1]))
+            start = key[0] if start is None else max(start, key[0])
+    if descending:
+        query = query.order_by(timestamp.desc(), models.SensorData.id.desc())
+    else:
+        query = query.order_by(timestamp.asc(), models.SensorData.id.asc())
+    live = query.limit(count).all()
+
+    entries = archive.archived_months(db, device_id, start, end)
+    if not entries:
+        return live
+
+    archived: Iterator = archive.iter_archived(entries, start, end, descending)
+    if key is not None:
+        if descending:
+            archived = dropwhile(lambda r: (r.timestamp, r.id) >= key, archived)
+        else:
+            archived = dropwhile(lambda r: (r.timestamp, r.id) <= key, archived)
+    return list(islice(archive.merge_readings(archived, live, descending), count))
+
+
+def fetch_page(db: Session, device_id: int, start: Optional[datetime], end: Optional[datetime],
+               limit: int, descending: bool = True,
+               cursor: Optional[Cursor] = None,
+               fields: Optional[List[str]] = None) -> Tuple[List, Optional[str], Optional[str]]:
+    """
+    Paginasi keyset. Mengembalikan (rows, next_cursor, prev_cursor); rows
+    selalu dalam urutan sort yang diminta.
+    """
+    if cursor is not None and cursor.direction == "prev":
+        rows = _fetch_after(db, device_id, start, end, (cursor.timestamp, cursor.id), not descending, limit + 1,
+                           fields)
+        has_before = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        prev_cursor = encode_cursor(rows[0], "prev", descending) if has_before else None
+        next_cursor = encode_cursor(rows[-1], "next", descending) if rows else None
+        return rows, next_cursor, prev_cursor
+
+    key = (cursor.timestamp, cursor.id) if cursor is not None else None
+    rows = _fetch_after(db, device_id, start, end, key, descending, limit + 1, fields)
+    has_after = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1], "next", descending) if has_after else None
+    prev_cursor = encode_cursor(rows[0], "prev", descending) if cursor is not None and rows else None
+    return rows, next_cursor, prev_cursor
+
+
+def _date_range(start_date: Optional[date], end_date: Optional[date]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    start = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    end = datetime.combine(end_date, datetime.max.time()) if end_date else None
+    return start, end
+
+
+def history_validator(db: Session, device: models.Device, start_date: Optional[date],
+                      end_date: Optional[date]) -> tuple:
+    """
+    Validator murah untuk ETag histori, tanpa memuat atau menghitung baris:
+    id sensor_data terbesar device dari device_latest (satu lookup primary
+    key; naik untuk setiap pembacaan baru, termasuk data terlambat),
+    devices.data_generation (naik saat retensi, purge atau arsip menghapus
+    pembacaan) dan path arsip bulan di rentang (berganti setiap kali arsip
+    ditulis ulang).
+    """
+    start, end = _date_range(start_date, end_date)
+    last_id = db.query(models.DeviceLatest.last_sensor_data_id).filter(
+        models.DeviceLatest.device_id == device.id
+    ).scalar()
+    paths = [entry.path for entry in archive.archived_months(db, device.id, start, end)]
+    return last_id, device.data_generation, paths
+
+
+def history_page(db: Session, response: Response, device_id: int, start_date: Optional[date],
+                 end_date: Optional[date], skip: int, limit: int, sort_dir: Optional[str],
+                 cursor: Optional[str], count_mode: counting.CountMode = "exact",
+                 max_points: Optional[int] = None, downsample_method: str = "lttb",
+                 downsample_by: Optional[List[str]] = None,
+                 fields: Optional[List[str]] = None) -> list:
+    """
+    Isi halaman histori dan header X-Total-Count / X-Next-Cursor /
+    X-Prev-Cursor. Dengan cursor, skip diabaikan; tanpa cursor dan skip=0
+    hasilnya sama dengan paginasi offset tetapi sudah menyertakan cursor
+    untuk halaman berikutnya. Total dihitung sesuai `count_mode`
+    (app/counting.py); perkiraan diambil dari rollup harian. Dengan
+    max_points, halaman didecimasi untuk grafik (app/downsample.py);
+    X-Total-Count dan cursor tetap mengacu pada halaman utuh. Dengan
+    `fields`, baris hanya memuat parameter tersebut.
+    """
+    start, end = _date_range(start_date, end_date)
+    descending = sort_dir != "asc"
+    if fields is not None and downsample_by:
+        missing = [field for field in downsample_by if field not in fields]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"downsample_by not in fields: {', '.join(missing)}")
+    counting.set_total_count(
+        response, count_mode, ("sensor", device_id, start, end),
+        exact=lambda: count_history(db, device_id, start, end),
+        estimate=lambda: rollups.count_readings(db, device_id, start, end)
+    )
+
+    if not cursor and skip:
+        rows = query_history(db, device_id, start, end, skip, limit, descending, fields)
+    else:
+        rows, next_cursor, prev_cursor = fetch_page(
+            db, device_id, start, end, limit, descending,
+            decode_cursor(cursor, descending) if cursor else None,
+            fields
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        if prev_cursor:
+            response.headers["X-Prev-Cursor"] = prev_cursor
+
+    if max_points is not None and len(rows) > max_points:
+        response.headers["X-Downsampled-From"] = str(len(rows))
+        rows = downsample.downsample(rows, max_points, downsample_method,
+                                     downsample_by or fields or models.SENSOR_FIELDS)
+    return rows
+
+
+def to_columns(rows: list, fields: List[str]) -> Dict[str, list]:
+    """
+    Bentuk kolumnar: {"timestamp": [...], "<field>": [...]} dengan urutan
+    yang sama dengan rows.
+    """
+    columns = {"timestamp": [row.timestamp for row in rows]}
+    for field in fields:
+        columns[field] = [getattr(row, field) for row in rows]
+    return columns
+
+
+def to_dicts(rows: list, fields: List[str]) -> List[dict]:
+    # Bentuk schemas.SensorDataResponse, hanya dengan parameter di `fields`
+    keys = ("id", "device_id", "timestamp", *fields)
+    values = attrgetter(*keys)
+    return [dict(zip(keys, values(row))) for row in rows]
+
+
+def render(response: Response, rows: list, fields: List[str], format: str) -> ORJSONResponse:
+    """
+    Respons endpoint histori untuk `format` (rows | columnar). Dikirim
+    langsung tanpa response_model, jadi header yang sudah dipasang (total,
+    cursor, ETag) disalin.
+    """
+    content = to_columns(rows, fields) if format == "columnar" else to_dicts(rows, fields)
+    return ORJSONResponse(content, headers=dict(response.headers))
@@ -0,0 +1,284 @@
+"""
+Statistik kualitas air satu device dalam rentang [start, end) untuk
+GET /sensor/stats: mean, stddev, min/max, persentil p5/p50/p95, time-in-range
+terhadap threshold device dan statistik bergulir (rolling), per parameter.
+
+Semua perhitungan memakai NumPy atas kolom yang diambil dalam satu query:
+- source=raw: pembacaan mentah (sensor_data + bulan yang sudah diarsip);
+- source=rollup: sensor_rollup_1h (otomatis untuk rentang lebih dari
+  STATS_RAW_MAX_DAYS), juga mencakup data yang sudah dihapus retensi.
+  Rollup hanya menyimpan count/min/max/sum per jam, jadi hanya count, mean,
+  min dan max (juga untuk rolling) yang dihitung; stddev, persentil dan
+  time-in-range bernilai null (pakai source=raw). Rentang dibulatkan ke
+  batas jam.
+
+Time-in-range adalah porsi pembacaan (non-null) yang berada di dalam
+threshold min/max device; device mengirim dengan interval tetap sehingga
+sebanding dengan porsi waktu.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import aggregates, archive, models, rollups
+
+STATS_RAW_MAX_DAYS = int(os.getenv("STATS_RAW_MAX_DAYS", "90"))
+
+PERCENTILES = (5, 50, 95)
+
+# parameter -> (atribut threshold min, atribut threshold max) di models.Device
+THRESHOLDS = {
+    "suhu": ("temp_min_threshold", "temp_max_threshold"),
+    "ph": ("ph_min_threshold", "ph_max_threshold"),
+    "do": ("do_min_threshold", None),
+    "tds": (None, "tds_max_threshold"),
+    "ammonia": (None, "ammonia_max_threshold"),
+    "salinitas": ("salinitas_min_threshold", "salinitas_max_threshold"),
+}
+
+# jendela rolling -> (lebar, jarak antar titik)
+WINDOWS = {
+    "1h": (timedelta(hours=1), timedelta(minutes=5)),
+    "6h": (timedelta(hours=6), timedelta(minutes=30)),
+    "1d": (timedelta(days=1), timedelta(hours=1)),
+    "7d": (timedelta(days=7), timedelta(days=1)),
+}
+
+_HOUR = timedelta(hours=1)
+
+
+class Series:
+    """
+    Nilai satu parameter: `values` berbobot `weights` (1 per pembacaan, atau
+    rata-rata dan jumlah nilai non-null per jam untuk rollup) dan batas
+    `low`/`high` (sama dengan values untuk data mentah, min/max per jam
+    untuk rollup). Sebaran (stddev, persentil, time-in-range) hanya
+    dihitung dari pembacaan mentah.
+    """
+
+    def __init__(self, values: np.ndarray, weights: np.ndarray,
+                 low: Optional[np.ndarray] = None, high: Optional[np.ndarray] = None):
+        self.values = values
+        self.valid = ~np.isnan(values)
+        self.weights = np.where(self.valid, weights, 0).astype(np.float64)
+        self.raw = low is None
+        self.low = values if low is None else low
+        self.high = values if high is None else high
+
+
+def _fetch_raw(db: Session, device_id: int, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+    rows = db.execute(
+        text(
+            f"""
+            SELECT {", ".join(rollups.quote(name) for name in archive.COLUMNS)}
+            FROM sensor_data
+            WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end
+            ORDER BY timestamp
+            """
+        ),
+        {"device_id": device_id, "start": start, "end": end}
+    ).all()
+    values = list(zip(*rows)) or [()] * len(archive.COLUMNS)
+    columns = {
+        "id": np.array(values[0], dtype=np.int64),
+        "timestamp": np.array(values[1], dtype="datetime64[us]"),
+    }
+    for name, column in zip(archive.SENSOR_FIELDS, values[2:]):
+        # None -> NaN
+        columns[name] = np.array(column, dtype=np.float64)
+
+    # Bulan yang sudah diarsip dibaca dari file kolomnya; baris terlambat di
+    # sensor_data untuk bulan itu sudah ikut di query di atas
+    parts = []
+    for entry in archive.archived_months(db, device_id, start, end):
+        stored = archive.open_columns(entry.path)
+        timestamps = stored["timestamp"]
+        lo = int(np.searchsorted(timestamps, np.datetime64(start, "us"), side="left"))
+        hi = int(np.searchsorted(timestamps, np.datetime64(end, "us"), side="left"))
+        if lo < hi:
+            parts.append({name: stored[name][lo:hi] for name in archive.COLUMNS})
+    if parts:
+        stored = {name: np.concatenate([part[name] for part in parts]) for name in archive.COLUMNS}
+        columns = archive.merge_columns(stored, columns)
+    return columns
+
+
+def _raw_series(columns: Dict[str, np.ndarray], fields: List[str]) -> Tuple[np.ndarray, Dict[str, Series]]:
+    ones = np.ones(len(columns["timestamp"]))
+    return columns["timestamp"], {
+        field: Series(np.asarray(columns[field], dtype=np.float64), ones) for field in fields
+    }
+
+
+def _rollup_series(db: Session, device_id: int, start: datetime, end: datetime,
+                   fields: List[str]) -> Tuple[np.ndarray, Dict[str, Series]]:
+    names = []
+    for field in fields:
+        names += [f"{field}_min", f"{field}_max", f"{field}_sum", f"{field}_count"]
+    rows = db.execute(
+        text(
+            f"""
+            SELECT bucket, {", ".join(names)}
+            FROM sensor_rollup_1h
+            WHERE device_id = :device_id AND bucket >= :start AND bucket < :end
+            ORDER BY bucket
+            """
+        ),
+        {"device_id": device_id, "start": start, "end": end}
+    ).all()
+    values = list(zip(*rows)) or [()] * (len(names) + 1)
+    columns = {name: np.array(column, dtype=np.float64) for name, column in zip(names, values[1:])}
+    series = {}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for field in fields:
+            counts = columns[f"{field}_count"]
+            series[field] = Series(
+                columns[f"{field}_sum"] / counts, counts,
+                columns[f"{field}_min"], columns[f"{field}_max"]
+            )
+    return np.array(values[0], dtype="datetime64[us]"), series
+
+
+def _to_list(values: np.ndarray) -> List[Optional[float]]:
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def _summary(series: Series, threshold_min: Optional[float], threshold_max: Optional[float]) -> dict:
+    total = series.weights.sum()
+    result = {
+        "count": int(total),
+        "mean": None, "stddev": None, "min": None, "max": None,
+        **{f"p{p}": None for p in PERCENTILES},
+        "threshold_min": threshold_min,
+        "threshold_max": threshold_max,
+        "time_in_range": None,
+    }
+    if not total:
+        return result
+
+    values = series.values[series.valid]
+    weights = series.weights[series.valid]
+    result["mean"] = float(np.dot(weights, values) / total)
+    result["min"] = float(np.nanmin(series.low))
+    result["max"] = float(np.nanmax(series.high))
+    if not series.raw:
+        return result
+
+    if total > 1:
+        result["stddev"] = float(np.std(values, ddof=1))
+    # Interpolasi linier, sama dengan percentile_cont
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        result[f"p{p}"] = float(value)
+
+    if threshold_min is not None or threshold_max is not None:
+        inside = np.ones(len(values), dtype=bool)
+        if threshold_min is not None:
+            inside &= values >= threshold_min
+        if threshold_max is not None:
+            inside &= values <= threshold_max
+        result["time_in_range"] = float(np.count_nonzero(inside) / total)
+    return result
+
+
+def _rolling(series: Series, index: np.ndarray, steps: int, size: int) -> dict:
+    """
+    Statistik jendela bergulir sepanjang `steps` titik; titik ke-i mencakup
+    `size` langkah terakhir yang berakhir di titik tersebut.
+    """
+    weights = series.weights
+    # Nilai digeser dengan rata-rata seluruh seri agar jumlah kuadrat tidak
+    # saling menghapus (cancellation) saat variansnya kecil dibanding nilainya
+    values = np.where(series.valid, series.values, 0.0)
+    shift = float(np.dot(weights, values) / weights.sum()) if weights.sum() else 0.0
+    values = np.where(series.valid, values - shift, 0.0)
+    count = np.bincount(index, weights=weights, minlength=steps)
+    total = np.bincount(index, weights=weights * values, minlength=steps)
+    squares = np.bincount(index, weights=weights * values ** 2, minlength=steps)
+
+    low = np.full(steps, np.inf)
+    high = np.full(steps, -np.inf)
+    if len(index):
+        keys, starts = np.unique(index, return_index=True)
+        low[keys] = np.minimum.reduceat(np.where(np.isnan(series.low), np.inf, series.low), starts)
+        high[keys] = np.maximum.reduceat(np.where(np.isnan(series.high), -np.inf, series.high), starts)
+
+    ends = np.arange(1, steps + 1)
+    begins = np.maximum(ends - size, 0)
+
+    def window_sum(per_step: np.ndarray) -> np.ndarray:
+        cumulative = np.concatenate([[0.0], np.cumsum(per_step)])
+        return cumulative[ends] - cumulative[begins]
+
+    count, total, squares = window_sum(count), window_sum(total), window_sum(squares)
+    padding = size - 1
+    low = np.lib.stride_tricks.sliding_window_view(np.concatenate([np.full(padding, np.inf), low]), size).min(axis=1)
+    high = np.lib.stride_tricks.sliding_window_view(np.concatenate([np.full(padding, -np.inf), high]), size).max(axis=1)
+
+    empty = count == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centered = total / count
+        mean = centered + shift
+        variance = np.maximum(squares - total * centered, 0.0) / (count - 1)
+        stddev = np.where((count > 1) & series.raw, np.sqrt(variance), np.nan)
+    return {
+        "mean": _to_list(np.where(empty, np.nan, mean)),
+        "stddev": _to_list(np.where(empty, np.nan, stddev)),
+        "min": _to_list(np.where(np.isinf(low), np.nan, low)),
+        "max": _to_list(np.where(np.isinf(high), np.nan, high)),
+    }
+
+
+def sensor_stats(db: Session, device: models.Device, start: datetime, end: datetime,
+                 fields: List[str], window: str = "1d", source: str = "auto") -> dict:
+    if source == "auto":
+        source = "rollup" if end - start > timedelta(days=STATS_RAW_MAX_DAYS) else "raw"
+
+    width, step = WINDOWS[window]
+    if source == "rollup":
+        start, end = aggregates.align_range(start, end, _HOUR)
+        step = max(step, _HOUR)
+        timestamps, series = _rollup_series(db, device.id, start, end, fields)
+    else:
+        timestamps, series = _raw_series(_fetch_raw(db, device.id, start, end), fields)
+
+    # Titik rolling sejajar dengan ORIGIN; jaraknya diperbesar jika rentang
+    # terlalu panjang
+    axis_start, axis_end = aggregates.align_range(start, end, step)
+    steps = math.ceil((axis_end - axis_start) / step)
+    if steps > aggregates.AGGREGATE_MAX_BUCKETS:
+        step *= math.ceil(steps / aggregates.AGGREGATE_MAX_BUCKETS)
+        axis_start, axis_end = aggregates.align_range(start, end, step)
+        steps = math.ceil((axis_end - axis_start) / step)
+    size = max(width // step, 1)
+    index = ((timestamps - np.datetime64(axis_start, "us")) // np.timedelta64(step, "us")).astype(np.int64)
+
+    parameters = {}
+    for field in fields:
+        min_attr, max_attr = THRESHOLDS[field]
+        parameters[field] = {
+            **_summary(
+                series[field],
+                getattr(device, min_attr) if min_attr else None,
+                getattr(device, max_attr) if max_attr else None
+            ),
+            "rolling": _rolling(series[field], index, steps, size),
+        }
+
+    rolling_end = np.datetime64(axis_start, "us") + np.arange(1, steps + 1) * np.timedelta64(step, "us")
+    return {
+        "device_id": device.id,
+        "uid": device.uid,
+        "start": start,
+        "end": end,
+        "source": "rollup_1h" if source == "rollup" else "raw",
+        "window": window,
+        "rolling_step_seconds": int(step.total_seconds()),
+        "rolling_timestamp": rolling_end.tolist(),
+        "parameters": parameters,
+    }
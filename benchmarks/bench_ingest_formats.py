@@ -0,0 +1,177 @@
+"""
+Bandingkan ukuran request, CPU decode dan waktu ingest end-to-end per
+pembacaan antara payload JSON (validasi pydantic + datetime.fromisoformat)
+dan format biner 64 byte.
+
+End-to-end: POST /sensor/batch lewat TestClient (routing, decode, resolve
+device, INSERT, commit, respons) ke database DATABASE_URL dengan mode
+INGEST_DURABILITY yang aktif. Membuat device `bench-ingest-0` lalu
+menghapusnya lagi di akhir. `--decode-only` hanya mengukur decode (tanpa
+database).
+
+    python -m benchmarks.bench_ingest_formats --readings 1000 --rounds 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import ingest, reading_codec, schemas
+
+_UID = "bench-ingest-0"
+
+
+def _make_readings(count: int, uid: str = "3f2504e0-4f89-11d3-9a0c-0305e82c3301",
+                   start: datetime = datetime(2025, 7, 18, 6, 0, 0)):
+    readings = []
+    for i in range(count):
+        ts = start + timedelta(minutes=5 * i)
+        readings.append((
+            uid,
+            ts,
+            [
+                round(random.uniform(26, 32), 2),
+                round(random.uniform(6.5, 8.5), 2),
+                round(random.uniform(3, 8), 2),
+                round(random.uniform(200, 600), 1),
+                round(random.uniform(0, 0.5), 3),
+                round(random.uniform(5, 30), 2),
+            ]
+        ))
+    return readings
+
+
+def _json_body(readings) -> bytes:
+    return json.dumps({
+        "readings": [
+            {
+                "uid": uid,
+                **dict(zip(ingest.SENSOR_FIELDS, values)),
+                "timestamp": ts.isoformat() + "+08:00",
+            }
+            for uid, ts, values in readings
+        ]
+    }).encode()
+
+
+def _binary_body(readings) -> bytes:
+    epoch = datetime(1970, 1, 1)
+    return reading_codec.encode_records(
+        (uid, int((ts - epoch).total_seconds()), values) for uid, ts, values in readings
+    )
+
+
+def _decode_json(body: bytes):
+    payload = schemas.SensorDataBatchCreate.model_validate_json(body)
+    rows = []
+    for item in payload.readings:
+        row = item.model_dump()
+        row["timestamp"] = ingest.reading_timestamp(row["timestamp"])
+        rows.append(row)
+    return rows
+
+
+def _decode_binary(body: bytes):
+    rows = reading_codec.decode_records(body)
+    for row in rows:
+        row["timestamp"] = ingest.reading_timestamp(row["timestamp"])
+    return rows
+
+
+def _cpu_per_reading(func, body: bytes, count: int, rounds: int) -> float:
+    func(body)  # warm-up
+    started = time.process_time()
+    for _ in range(rounds):
+        func(body)
+    return (time.process_time() - started) / (rounds * count)
+
+
+def _cleanup(engine) -> None:
+    with engine.begin() as conn:
+        ids = "SELECT id FROM devices WHERE uid = :uid"
+        params = {"uid": _UID}
+        conn.execute(text(f"DELETE FROM sensor_data WHERE device_id IN ({ids})"), params)
+        for table in ("sensor_rollup_1m", "sensor_rollup_1h", "sensor_rollup_1d", "device_latest"):
+            conn.execute(text(f"DELETE FROM {table} WHERE device_id IN ({ids})"), params)
+        conn.execute(text("DELETE FROM devices WHERE uid = :uid"), params)
+
+
+def _end_to_end(readings_per_request: int, rounds: int) -> dict:
+    """
+    Median waktu per pembacaan (detik) untuk POST /sensor/batch per format.
+    Setiap request memakai timestamp baru agar semua baris benar-benar
+    di-insert (bukan duplikat).
+    """
+    from fastapi.testclient import TestClient
+
+    from app.database import engine
+    from app.main import app
+
+    _cleanup(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO devices (uid, name, status, is_active) "
+                "VALUES (:uid, 'bench', 'online', TRUE)"
+            ),
+            {"uid": _UID}
+        )
+
+    # Tanpa `with`: startup (migrasi, background thread) tidak dijalankan
+    client = TestClient(app)
+    start = datetime(2026, 1, 1)
+    step = timedelta(minutes=5 * readings_per_request)
+    formats = {
+        "json": (_json_body, "application/json"),
+        "binary": (_binary_body, reading_codec.CONTENT_TYPE),
+    }
+    samples = {name: [] for name in formats}
+    try:
+        # Putaran pertama tanpa diukur untuk memanaskan koneksi dan cache
+        for round_ in range(rounds + 1):
+            for name, (encode, content_type) in formats.items():
+                readings = _make_readings(readings_per_request, _UID, start)
+                start += step
+                body = encode(readings)
+                started = time.perf_counter()
+                response = client.post("/sensor/batch", content=body, headers={"Content-Type": content_type})
+                elapsed = time.perf_counter() - started
+                if response.status_code not in (200, 202):
+                    raise RuntimeError(f"{name}: HTTP {response.status_code} {response.text[:200]}")
+                if round_:
+                    samples[name].append(elapsed / readings_per_request)
+    finally:
+        _cleanup(engine)
+    return {name: statistics.median(values) for name, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readings", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--decode-only", action="store_true", help="Tanpa database, hanya decode")
+    args = parser.parse_args()
+
+    readings = _make_readings(args.readings)
+    json_body = _json_body(readings)
+    binary_body = _binary_body(readings)
+
+    json_cpu = _cpu_per_reading(_decode_json, json_body, args.readings, args.rounds)
+    binary_cpu = _cpu_per_reading(_decode_binary, binary_body, args.readings, args.rounds)
+    ingest_time = {} if args.decode_only else _end_to_end(args.readings, args.rounds)
+
+    print(f"{'format':<8} {'bytes/reading':>14} {'cpu us/reading':>15} {'ingest us/reading':>18}")
+    for name, body, cpu in (("json", json_body, json_cpu), ("binary", binary_body, binary_cpu)):
+        total = f"{ingest_time[name] * 1e6:>18.2f}" if ingest_time else f"{'-':>18}"
+        print(f"{name:<8} {len(body) / args.readings:>14.1f} {cpu * 1e6:>15.2f} {total}")
+    print(f"size ratio {len(json_body) / len(binary_body):.1f}x, cpu ratio {json_cpu / binary_cpu:.1f}x")
+    if ingest_time:
+        print(f"end-to-end ratio {ingest_time['json'] / ingest_time['binary']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Bandingkan pengambilan histori GET /monitoring: satu query per kolam (pola
+lama) vs satu query LATERAL untuk semua device (recent_readings).
+
+Membuat user, tambak, kolam dan device `bench-mon-<n>` berisi pembacaan
+sintetis di database DATABASE_URL, lalu menghapusnya lagi di akhir.
+
+    python -m benchmarks.bench_monitoring --kolams 1,10,50,200 --readings 2000 --last-n 10
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app import models
+from app.database import SessionLocal, engine
+from app.routers.monitoring import recent_readings
+
+_PREFIX = "bench-mon-"
+_EMAIL = "bench-monitoring@example.com"
+
+
+def seed(devices: int, readings: int) -> int:
+    with engine.begin() as conn:
+        user_id = conn.execute(
+            text(
+                "INSERT INTO users (name, email, password_hash, role, created_at) "
+                "VALUES ('bench', :email, 'x', 'operator', NOW()) RETURNING id"
+            ),
+            {"email": _EMAIL}
+        ).scalar()
+        tambak_id = conn.execute(
+            text(
+                "INSERT INTO tambak (user_id, name, country, province, city, district, village, address, cultivation_type) "
+                "VALUES (:user_id, 'bench', '-', '-', '-', '-', '-', '-', '-') RETURNING id"
+            ),
+            {"user_id": user_id}
+        ).scalar()
+        conn.execute(
+            text(
+                "INSERT INTO devices (uid, name, user_id, status, is_active) "
+                "SELECT :prefix || n, 'bench ' || n, :user_id, 'online', TRUE "
+                "FROM generate_series(0, :last) AS n"
+            ),
+            {"prefix": _PREFIX, "user_id": user_id, "last": devices - 1}
+        )
+        conn.execute(
+            text(
+                "INSERT INTO kolam (tambak_id, device_id, nama, tipe, panjang, lebar, kedalaman, komoditas) "
+                "SELECT :tambak_id, id, uid, '-', 1, 1, 1, '-' FROM devices WHERE uid LIKE :pattern"
+            ),
+            {"tambak_id": tambak_id, "pattern": _PREFIX + "%"}
+        )
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO sensor_data (device_id, timestamp, {", ".join(f'"{f}"' for f in models.SENSOR_FIELDS)})
+                SELECT d.id, NOW() - make_interval(mins => n), 28, 7.5, 5, 400, 0.1, 15
+                FROM devices d, generate_series(1, :readings) AS n
+                WHERE d.uid LIKE :pattern
+                """
+            ),
+            {"readings": readings, "pattern": _PREFIX + "%"}
+        )
+        conn.execute(text("ANALYZE sensor_data"))
+    return user_id
+
+
+def cleanup() -> None:
+    with engine.begin() as conn:
+        ids = "SELECT id FROM devices WHERE uid LIKE :pattern"
+        params = {"pattern": _PREFIX + "%"}
+        conn.execute(text(f"DELETE FROM sensor_data WHERE device_id IN ({ids})"), params)
+        for table in ("sensor_rollup_1m", "sensor_rollup_1h", "sensor_rollup_1d", "device_latest"):
+            conn.execute(text(f"DELETE FROM {table} WHERE device_id IN ({ids})"), params)
+        conn.execute(text(f"DELETE FROM kolam WHERE device_id IN ({ids})"), params)
+        conn.execute(text("DELETE FROM devices WHERE uid LIKE :pattern"), params)
+        conn.execute(text("DELETE FROM tambak WHERE user_id IN (SELECT id FROM users WHERE email = :email)"),
+                     {"email": _EMAIL})
+        conn.execute(text("DELETE FROM users WHERE email = :email"), {"email": _EMAIL})
+
+
+def per_kolam(db, device_ids, last_n: int) -> None:
+    for device_id in device_ids:
+        db.query(models.SensorData).filter(
+            models.SensorData.device_id == device_id
+        ).order_by(models.SensorData.timestamp.desc()).limit(last_n).all()
+
+
+def batched(db, device_ids, last_n: int) -> None:
+    recent_readings(db, device_ids, last_n)
+
+
+def _time(func, device_ids, last_n: int, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            func(db, device_ids, last_n)
+            samples.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kolams", default="1,10,50,200", help="Jumlah kolam yang diuji, dipisah koma")
+    parser.add_argument("--readings", type=int, default=2000, help="Pembacaan per device")
+    parser.add_argument("--last-n", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    counts = sorted(int(value) for value in args.kolams.split(","))
+    cleanup()
+    seed(counts[-1], args.readings)
+    try:
+        with engine.connect() as conn:
+            all_ids = [
+                device_id for (device_id,) in conn.execute(
+                    text("SELECT id FROM devices WHERE uid LIKE :pattern ORDER BY id"),
+                    {"pattern": _PREFIX + "%"}
+                )
+            ]
+        print(f"{'kolams':>7} {'per-kolam ms':>13} {'lateral ms':>11} {'speedup':>8}")
+        for count in counts:
+            device_ids = all_ids[:count]
+            old = _time(per_kolam, device_ids, args.last_n, args.rounds)
+            new = _time(batched, device_ids, args.last_n, args.rounds)
+            print(f"{count:>7} {old * 1000:>13.2f} {new * 1000:>11.2f} {old / new:>7.1f}x")
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Bandingkan jalur baca histori dan export: instance ORM + validasi
+response_model pydantic + json (pola lama) vs baris Row kolom + orjson
+(sensor_history.render) dan Row kolom untuk CSV export.
+
+Membuat device `bench-read-0` berisi pembacaan sintetis di database
+DATABASE_URL, lalu menghapusnya lagi di akhir.
+
+    python -m benchmarks.bench_read_path --readings 20000 --limit 5000
+"""
+import argparse
+import csv
+import io
+import json
+import statistics
+import time
+from datetime import datetime
+from typing import List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import select, text
+
+from app import models, schemas, sensor_history
+from app.database import SessionLocal, engine
+
+_UID = "bench-read-0"
+
+_response_adapter = TypeAdapter(List[schemas.SensorDataResponse])
+
+
+def seed(readings: int) -> int:
+    with engine.begin() as conn:
+        device_id = conn.execute(
+            text(
+                "INSERT INTO devices (uid, name, status, is_active) "
+                "VALUES (:uid, 'bench', 'online', TRUE) RETURNING id"
+            ),
+            {"uid": _UID}
+        ).scalar()
+        conn.execute(
+            text(
+                f"""
+                INSERT INTO sensor_data (device_id, timestamp, {", ".join(f'"{f}"' for f in models.SENSOR_FIELDS)})
+                SELECT :device_id, TIMESTAMP '2026-01-01' + make_interval(mins => n),
+                       28 + random(), 7 + random(), 5 + random(), 400 + random(), random(), 15 + random()
+                FROM generate_series(1, :readings) AS n
+                """
+            ),
+            {"device_id": device_id, "readings": readings}
+        )
+        conn.execute(text("ANALYZE sensor_data"))
+    return device_id
+
+
+def cleanup() -> None:
+    with engine.begin() as conn:
+        ids = "SELECT id FROM devices WHERE uid = :uid"
+        params = {"uid": _UID}
+        conn.execute(text(f"DELETE FROM sensor_data WHERE device_id IN ({ids})"), params)
+        for table in ("sensor_rollup_1m", "sensor_rollup_1h", "sensor_rollup_1d", "device_latest"):
+            conn.execute(text(f"DELETE FROM {table} WHERE device_id IN ({ids})"), params)
+        conn.execute(text("DELETE FROM devices WHERE uid = :uid"), params)
+
+
+def history_orm(db, device_id: int, limit: int) -> int:
+    # Seperti FastAPI dengan response_model: validasi, serialisasi, json.dumps
+    rows, _, _ = sensor_history.fetch_page(db, device_id, None, None, limit)
+    content = _response_adapter.dump_python(_response_adapter.validate_python(rows), mode="json")
+    body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    return len(body)
+
+
+def _history_rows(format: str):
+    def run(db, device_id: int, limit: int) -> int:
+        fields = list(models.SENSOR_FIELDS)
+        rows, _, _ = sensor_history.fetch_page(db, device_id, None, None, limit, fields=fields)
+        return len(sensor_history.render(Response(), rows, fields, format).body)
+    return run
+
+
+def _write_csv(rows) -> int:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for data in rows:
+        writer.writerow([data.timestamp.isoformat(), data.suhu, data.ph, data.do, data.tds, data.ammonia, data.salinitas])
+    return len(output.getvalue())
+
+
+def export_orm(db, device_id: int, limit: int) -> int:
+    return _write_csv(
+        db.query(models.SensorData).filter(
+            models.SensorData.device_id == device_id,
+            models.SensorData.timestamp >= datetime(2000, 1, 1)
+        ).order_by(models.SensorData.timestamp).limit(limit).all()
+    )
+
+
+def export_rows(db, device_id: int, limit: int) -> int:
+    return _write_csv(
+        db.execute(
+            select(
+                models.SensorData.timestamp,
+                *(getattr(models.SensorData, field) for field in models.SENSOR_FIELDS)
+            ).where(
+                models.SensorData.device_id == device_id,
+                models.SensorData.timestamp >= datetime(2000, 1, 1)
+            ).order_by(models.SensorData.timestamp).limit(limit)
+        ).all()
+    )
+
+
+def _time(func, device_id: int, limit: int, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            func(db, device_id, limit)
+            samples.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=5000, help="Baris per respons")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    cases = [
+        ("history orm+pydantic", history_orm),
+        ("history rows+orjson", _history_rows("rows")),
+        ("history columnar", _history_rows("columnar")),
+        ("export orm", export_orm),
+        ("export rows", export_rows),
+    ]
+    cleanup()
+    device_id = seed(args.readings)
+    try:
+        # Sekali tanpa diukur untuk memanaskan koneksi dan cache query
+        for _, func in cases:
+            _time(func, device_id, args.limit, 1)
+        print(f"{'path':<22} {'ms':>8} {'rows/s':>10}")
+        for name, func in cases:
+            elapsed = _time(func, device_id, args.limit, args.rounds)
+            print(f"{name:<22} {elapsed * 1000:>8.2f} {args.limit / elapsed:>10.0f}")
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Simulasi armada device terhadap app.ingest_gateway di localhost.
+
+Setiap device membuka satu koneksi TCP dan mengirim pembacaan berulang
+(format baris atau biner), menunggu ack tiap pembacaan, lalu dilaporkan
+throughput dan latensi ack.
+
+    python -m app.ingest_gateway &
+    python -m benchmarks.gateway_fleet --devices 2000 --readings 10 --register
+
+--register membuat device `sim-<n>` di database (butuh DATABASE_URL) agar
+pembacaan lolos validasi registry; tanpa itu semua pembacaan dibalas
+"unknown" yang tetap berguna untuk mengukur jalur jaringan.
+"""
+import argparse
+import asyncio
+import random
+import resource
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import reading_codec
+from app.database import engine
+from app.ingest_gateway import STATUS_CODES
+
+_EPOCH = datetime(1970, 1, 1)
+_STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+
+def register_devices(count: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO devices (uid, name, status, is_active) "
+                "SELECT 'sim-' || n, 'Simulated ' || n, 'offline', TRUE "
+                "FROM generate_series(0, :last) AS n "
+                "ON CONFLICT (uid) DO NOTHING"
+            ),
+            {"last": count - 1}
+        )
+
+
+def _values():
+    return [
+        round(random.uniform(26, 32), 2),
+        round(random.uniform(6.5, 8.5), 2),
+        round(random.uniform(3, 8), 2),
+        round(random.uniform(200, 600), 1),
+        round(random.uniform(0, 0.5), 3),
+        round(random.uniform(5, 30), 2),
+    ]
+
+
+async def _device(index: int, args, start: datetime, latencies: list, results: dict) -> None:
+    uid = f"sim-{index}"
+    port = args.binary_port if args.binary else args.line_port
+    try:
+        reader, writer = await asyncio.open_connection(args.host, port)
+    except OSError:
+        results["connect_failed"] = results.get("connect_failed", 0) + 1
+        return
+
+    try:
+        for i in range(args.readings):
+            ts = start + timedelta(minutes=i, milliseconds=index)
+            values = _values()
+            if args.binary:
+                payload = reading_codec.encode_record(uid, int((ts - _EPOCH).total_seconds()), values)
+            else:
+                payload = (",".join([uid, ts.isoformat()] + [str(v) for v in values]) + "\n").encode()
+
+            sent = time.perf_counter()
+            writer.write(payload)
+            await writer.drain()
+            if args.binary:
+                ack = _STATUS_NAMES.get((await reader.readexactly(1))[0], "error")
+            else:
+                ack = (await reader.readline()).decode().strip()
+            latencies.append(time.perf_counter() - sent)
+            results[ack] = results.get(ack, 0) + 1
+            if args.interval:
+                await asyncio.sleep(args.interval)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        results["disconnected"] = results.get("disconnected", 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(args) -> None:
+    start = datetime.utcnow().replace(microsecond=0)
+    latencies = []
+    results = {}
+
+    # Buka koneksi bertahap supaya backlog listen tidak meluap
+    tasks = []
+    started = time.perf_counter()
+    for index in range(args.devices):
+        tasks.append(asyncio.ensure_future(_device(index, args, start, latencies, results)))
+        if index % args.ramp == args.ramp - 1:
+            await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"devices={args.devices} readings={total} elapsed={elapsed:.2f}s "
+          f"throughput={total / elapsed:.0f} readings/s")
+    if total:
+        print(f"ack latency p50={latencies[total // 2] * 1000:.1f}ms "
+              f"p99={latencies[int(total * 0.99)] * 1000:.1f}ms "
+              f"max={latencies[-1] * 1000:.1f}ms")
+    print("results:", dict(sorted(results.items())))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--line-port", type=int, default=9100)
+    parser.add_argument("--binary-port", type=int, default=9101)
+    parser.add_argument("--binary", action="store_true", help="Kirim record biner 64 byte")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--readings", type=int, default=10, help="Pembacaan per device")
+    parser.add_argument("--interval", type=float, default=0, help="Jeda antar pembacaan (detik)")
+    parser.add_argument("--ramp", type=int, default=500, help="Koneksi baru per iterasi event loop")
+    parser.add_argument("--register", action="store_true", help="Daftarkan device sim-<n> ke database")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    if args.register:
+        register_devices(args.devices)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
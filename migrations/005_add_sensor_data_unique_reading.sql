@@ -0,0 +1,4 @@
+-- Unique reading per device and device timestamp (idempotent ingest).
+-- Remove existing duplicates first: python -m app.compact_sensor_data
+ALTER TABLE sensor_data
+ADD CONSTRAINT uq_sensor_data_device_timestamp UNIQUE (device_id, timestamp);
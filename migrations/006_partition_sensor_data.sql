@@ -0,0 +1,48 @@
+-- Convert sensor_data to monthly RANGE partitions on timestamp.
+-- Single transaction, suitable for small tables only. For large tables use
+-- the batched migration instead: python -m app.partitioning migrate
+-- Monthly partitions are created afterwards by: python -m app.partitioning maintain
+BEGIN;
+
+LOCK TABLE sensor_data IN EXCLUSIVE MODE;
+
+CREATE TABLE sensor_data_new (
+    id INTEGER NOT NULL DEFAULT nextval('sensor_data_id_seq'),
+    device_id INTEGER REFERENCES devices (id) ON DELETE CASCADE,
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    suhu DOUBLE PRECISION,
+    ph DOUBLE PRECISION,
+    "do" DOUBLE PRECISION,
+    tds DOUBLE PRECISION,
+    ammonia DOUBLE PRECISION,
+    salinitas DOUBLE PRECISION,
+    CONSTRAINT sensor_data_new_pkey PRIMARY KEY (id, timestamp),
+    CONSTRAINT sensor_data_new_device_timestamp_key UNIQUE (device_id, timestamp)
+) PARTITION BY RANGE (timestamp);
+CREATE INDEX sensor_data_new_timestamp_idx ON sensor_data_new (timestamp);
+CREATE TABLE sensor_data_default PARTITION OF sensor_data_new DEFAULT;
+
+INSERT INTO sensor_data_new (id, device_id, timestamp, suhu, ph, "do", tds, ammonia, salinitas)
+SELECT id, device_id, timestamp, suhu, ph, "do", tds, ammonia, salinitas
+FROM sensor_data
+WHERE timestamp IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE sensor_data RENAME TO sensor_data_legacy;
+ALTER INDEX IF EXISTS sensor_data_pkey RENAME TO sensor_data_legacy_pkey;
+ALTER INDEX IF EXISTS uq_sensor_data_device_timestamp RENAME TO uq_sensor_data_legacy_device_timestamp;
+ALTER INDEX IF EXISTS ix_sensor_data_device_timestamp RENAME TO ix_sensor_data_legacy_device_timestamp;
+ALTER INDEX IF EXISTS ix_sensor_data_timestamp RENAME TO ix_sensor_data_legacy_timestamp;
+ALTER INDEX IF EXISTS ix_sensor_data_id RENAME TO ix_sensor_data_legacy_id;
+ALTER TABLE sensor_data_legacy ALTER COLUMN id DROP DEFAULT;
+
+ALTER TABLE sensor_data_new RENAME TO sensor_data;
+ALTER TABLE sensor_data RENAME CONSTRAINT sensor_data_new_pkey TO sensor_data_pkey;
+ALTER TABLE sensor_data RENAME CONSTRAINT sensor_data_new_device_timestamp_key TO uq_sensor_data_device_timestamp;
+ALTER TABLE sensor_data RENAME CONSTRAINT sensor_data_new_device_id_fkey TO sensor_data_device_id_fkey;
+ALTER INDEX sensor_data_new_timestamp_idx RENAME TO ix_sensor_data_timestamp;
+ALTER SEQUENCE sensor_data_id_seq OWNED BY sensor_data.id;
+
+COMMIT;
+
+-- After verification: DROP TABLE sensor_data_legacy;
@@ -0,0 +1,38 @@
+-- Per-device rollups of sensor_data (1 minute, 1 hour, 1 day buckets).
+-- Backfill existing readings afterwards: python -m app.rollups recompute
+CREATE TABLE IF NOT EXISTS sensor_rollup_1m (
+    device_id INTEGER NOT NULL REFERENCES devices (id) ON DELETE CASCADE,
+    bucket TIMESTAMP NOT NULL,
+    count INTEGER NOT NULL,
+    suhu_min DOUBLE PRECISION, suhu_max DOUBLE PRECISION, suhu_sum DOUBLE PRECISION,
+    ph_min DOUBLE PRECISION, ph_max DOUBLE PRECISION, ph_sum DOUBLE PRECISION,
+    do_min DOUBLE PRECISION, do_max DOUBLE PRECISION, do_sum DOUBLE PRECISION,
+    tds_min DOUBLE PRECISION, tds_max DOUBLE PRECISION, tds_sum DOUBLE PRECISION,
+    ammonia_min DOUBLE PRECISION, ammonia_max DOUBLE PRECISION, ammonia_sum DOUBLE PRECISION,
+    salinitas_min DOUBLE PRECISION, salinitas_max DOUBLE PRECISION, salinitas_sum DOUBLE PRECISION,
+    PRIMARY KEY (device_id, bucket)
+);
+CREATE TABLE IF NOT EXISTS sensor_rollup_1h (
+    device_id INTEGER NOT NULL REFERENCES devices (id) ON DELETE CASCADE,
+    bucket TIMESTAMP NOT NULL,
+    count INTEGER NOT NULL,
+    suhu_min DOUBLE PRECISION, suhu_max DOUBLE PRECISION, suhu_sum DOUBLE PRECISION,
+    ph_min DOUBLE PRECISION, ph_max DOUBLE PRECISION, ph_sum DOUBLE PRECISION,
+    do_min DOUBLE PRECISION, do_max DOUBLE PRECISION, do_sum DOUBLE PRECISION,
+    tds_min DOUBLE PRECISION, tds_max DOUBLE PRECISION, tds_sum DOUBLE PRECISION,
+    ammonia_min DOUBLE PRECISION, ammonia_max DOUBLE PRECISION, ammonia_sum DOUBLE PRECISION,
+    salinitas_min DOUBLE PRECISION, salinitas_max DOUBLE PRECISION, salinitas_sum DOUBLE PRECISION,
+    PRIMARY KEY (device_id, bucket)
+);
+CREATE TABLE IF NOT EXISTS sensor_rollup_1d (
+    device_id INTEGER NOT NULL REFERENCES devices (id) ON DELETE CASCADE,
+    bucket TIMESTAMP NOT NULL,
+    count INTEGER NOT NULL,
+    suhu_min DOUBLE PRECISION, suhu_max DOUBLE PRECISION, suhu_sum DOUBLE PRECISION,
+    ph_min DOUBLE PRECISION, ph_max DOUBLE PRECISION, ph_sum DOUBLE PRECISION,
+    do_min DOUBLE PRECISION, do_max DOUBLE PRECISION, do_sum DOUBLE PRECISION,
+    tds_min DOUBLE PRECISION, tds_max DOUBLE PRECISION, tds_sum DOUBLE PRECISION,
+    ammonia_min DOUBLE PRECISION, ammonia_max DOUBLE PRECISION, ammonia_sum DOUBLE PRECISION,
+    salinitas_min DOUBLE PRECISION, salinitas_max DOUBLE PRECISION, salinitas_sum DOUBLE PRECISION,
+    PRIMARY KEY (device_id, bucket)
+);
@@ -0,0 +1,3 @@
+-- Indexes used by the retention job (python -m app.retention run)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_notifications_timestamp ON notifications (timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_auth_tokens_expires_at ON auth_tokens (expires_at);
@@ -0,0 +1,27 @@
+-- Newest reading per device (by device timestamp), upserted on ingest.
+CREATE TABLE IF NOT EXISTS device_latest (
+    device_id INTEGER PRIMARY KEY REFERENCES devices (id) ON DELETE CASCADE,
+    sensor_data_id INTEGER,
+    timestamp TIMESTAMP NOT NULL,
+    suhu DOUBLE PRECISION,
+    ph DOUBLE PRECISION,
+    "do" DOUBLE PRECISION,
+    tds DOUBLE PRECISION,
+    ammonia DOUBLE PRECISION,
+    salinitas DOUBLE PRECISION,
+    updated_at TIMESTAMP
+);
+
+-- Backfill from existing readings
+INSERT INTO device_latest
+    (device_id, sensor_data_id, timestamp, suhu, ph, "do", tds, ammonia, salinitas, updated_at)
+SELECT d.id, s.id, s.timestamp, s.suhu, s.ph, s."do", s.tds, s.ammonia, s.salinitas, now() AT TIME ZONE 'utc'
+FROM devices AS d
+CROSS JOIN LATERAL (
+    SELECT id, timestamp, suhu, ph, "do", tds, ammonia, salinitas
+    FROM sensor_data
+    WHERE device_id = d.id AND timestamp IS NOT NULL
+    ORDER BY timestamp DESC
+    LIMIT 1
+) AS s
+ON CONFLICT (device_id) DO NOTHING;
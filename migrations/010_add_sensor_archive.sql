@@ -0,0 +1,11 @@
+-- Manifest of sensor_data months moved to the cold archive (app/archive.py).
+CREATE TABLE IF NOT EXISTS sensor_archive (
+    device_id INTEGER NOT NULL REFERENCES devices (id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    path VARCHAR(255) NOT NULL,
+    row_count INTEGER NOT NULL,
+    first_timestamp TIMESTAMP NOT NULL,
+    last_timestamp TIMESTAMP NOT NULL,
+    archived_at TIMESTAMP,
+    PRIMARY KEY (device_id, month)
+);
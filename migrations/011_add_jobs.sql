@@ -0,0 +1,17 @@
+-- Background job queue (app/jobs.py), e.g. chunked purge after device/user removal.
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    payload JSON NOT NULL,
+    progress JSON,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error VARCHAR(500),
+    created_by INTEGER REFERENCES users (id) ON DELETE SET NULL,
+    created_at TIMESTAMP,
+    started_at TIMESTAMP,
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_id ON jobs (id);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status);
@@ -0,0 +1,91 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+from fastapi import HTTPException
+
+from app import aggregates
+
+
+class AlignRangeTest(unittest.TestCase):
+    def test_rounds_outward_to_bucket(self):
+        start, end = aggregates.align_range(
+            datetime(2026, 9, 1, 6, 7, 30), datetime(2026, 9, 1, 8, 0, 1), timedelta(hours=1)
+        )
+        self.assertEqual(start, datetime(2026, 9, 1, 6))
+        self.assertEqual(end, datetime(2026, 9, 1, 9))
+
+    def test_keeps_aligned_bounds(self):
+        bounds = (datetime(2026, 9, 1, 0, 5), datetime(2026, 9, 1, 0, 20))
+        self.assertEqual(aggregates.align_range(*bounds, timedelta(minutes=5)), bounds)
+
+    def test_day_buckets_start_at_midnight(self):
+        start, end = aggregates.align_range(
+            datetime(2026, 9, 1, 23, 59), datetime(2026, 9, 2, 0, 0, 0, 1), timedelta(days=1)
+        )
+        self.assertEqual(start, datetime(2026, 9, 1))
+        self.assertEqual(end, datetime(2026, 9, 3))
+
+
+class ParseTest(unittest.TestCase):
+    def test_percentiles(self):
+        self.assertEqual(aggregates.parse_aggregates("avg, p50,p99.9,avg"), ["avg", "p50", "p99.9"])
+        for value in ("p101", "p", "median", ""):
+            with self.assertRaises(HTTPException):
+                aggregates.parse_aggregates(value)
+
+    def test_fields(self):
+        self.assertEqual(aggregates.parse_fields(None), list(aggregates.SENSOR_FIELDS))
+        with self.assertRaises(HTTPException):
+            aggregates.parse_fields("ph,oxygen")
+
+
+class AggregateColumnsTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        # Jarak acak 0-10 menit, sebagian nilai null dan satu bucket tanpa nilai
+        offsets = np.cumsum(rng.integers(0, 600, 400))
+        self.timestamps = np.datetime64("2026-09-01T00:00:00", "us") + offsets.astype("timedelta64[s]")
+        values = rng.normal(7, 0.5, len(offsets))
+        values[rng.random(len(offsets)) < 0.1] = np.nan
+        values[self.timestamps < np.datetime64("2026-09-01T01:00:00", "us")] = np.nan
+        self.values = values
+        self.width = timedelta(hours=1)
+
+    def _buckets(self):
+        keys = (self.timestamps - np.datetime64(aggregates.ORIGIN, "us")) // np.timedelta64(self.width, "us")
+        for key in np.unique(keys):
+            values = self.values[keys == key]
+            yield values[~np.isnan(values)]
+
+    def test_matches_numpy_per_bucket(self):
+        names = ["count", "avg", "min", "max", "stddev", "p5", "p50", "p99.9"]
+        result = aggregates.aggregate_columns(
+            {"timestamp": self.timestamps, "ph": self.values}, self.width, ["ph"], names
+        )
+        expected = list(self._buckets())
+        self.assertEqual(len(result), len(expected))
+        self.assertEqual(result[0]["bucket"], datetime(2026, 9, 1))
+        for item, values in zip(result, expected):
+            stats = item["ph"]
+            self.assertEqual(stats["count"], len(values))
+            if not len(values):
+                self.assertTrue(all(stats[name] is None for name in names if name != "count"))
+                continue
+            self.assertAlmostEqual(stats["avg"], values.mean())
+            self.assertEqual(stats["min"], values.min())
+            self.assertEqual(stats["max"], values.max())
+            if len(values) > 1:
+                self.assertAlmostEqual(stats["stddev"], np.std(values, ddof=1))
+            else:
+                self.assertIsNone(stats["stddev"])
+            for name, q in (("p5", 5), ("p50", 50), ("p99.9", 99.9)):
+                self.assertAlmostEqual(stats[name], np.percentile(values, q))
+
+    def test_empty(self):
+        columns = {"timestamp": np.array([], dtype="datetime64[us]"), "ph": np.array([])}
+        self.assertEqual(aggregates.aggregate_columns(columns, self.width, ["ph"], ["avg"]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import math
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import downsample, models
+
+
+def reference_lttb(x, y, threshold):
+    # Implementasi asli LTTB (Steinarsson) dengan loop biasa
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = math.floor((i + 1) * every) + 1
+        avg_end = min(math.floor((i + 2) * every) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(math.floor(i * every) + 1, math.floor((i + 1) * every) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+class LttbTest(unittest.TestCase):
+    def test_matches_reference(self):
+        rng = np.random.default_rng(3)
+        for n, threshold in ((10, 3), (100, 10), (1000, 37), (999, 998)):
+            x = np.cumsum(rng.uniform(1, 60, n))
+            y = np.cumsum(rng.normal(0, 1, n))
+            self.assertEqual(
+                downsample.lttb(x, y, threshold).tolist(),
+                reference_lttb(x.tolist(), y.tolist(), threshold),
+                (n, threshold)
+            )
+
+    def test_keeps_spike_and_ends(self):
+        x = np.arange(500, dtype=np.float64)
+        y = np.zeros(500)
+        y[123] = 50.0
+        selected = downsample.lttb(x, y, 20)
+        self.assertEqual(len(selected), 20)
+        self.assertEqual((selected[0], selected[-1]), (0, 499))
+        self.assertIn(123, selected)
+
+    def test_skips_nan(self):
+        x = np.arange(10, dtype=np.float64)
+        y = np.array([1, np.nan, 2, 3, np.nan, 4, 5, 6, 7, np.nan])
+        self.assertEqual(downsample.lttb(x, y, 50).tolist(), [0, 2, 3, 5, 6, 7, 8])
+        selected = downsample.lttb(x, y, 4)
+        self.assertEqual(len(selected), 4)
+        self.assertTrue(np.all(~np.isnan(y[selected])))
+
+
+class MinmaxTest(unittest.TestCase):
+    def test_min_and_max_per_bucket(self):
+        rng = np.random.default_rng(5)
+        y = rng.normal(0, 1, 1000)
+        y[rng.random(1000) < 0.05] = np.nan
+        y[200:250] = np.nan
+        x = np.arange(1000, dtype=np.float64)
+        selected = set(downsample.minmax(x, y, 40).tolist())
+
+        edges = np.floor(np.linspace(0, 1000, 21)).astype(int)
+        expected = set()
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            bucket = y[lo:hi]
+            if np.all(np.isnan(bucket)):
+                continue
+            expected.update((lo + int(np.nanargmin(bucket)), lo + int(np.nanargmax(bucket))))
+        self.assertEqual(selected, expected)
+
+    def test_short_series_unchanged(self):
+        y = np.array([1.0, np.nan, 3.0])
+        self.assertEqual(downsample.minmax(np.arange(3.0), y, 10).tolist(), [0, 2])
+
+
+class DownsampleRowsTest(unittest.TestCase):
+    def test_keeps_order_and_page_ends(self):
+        base = datetime(2026, 9, 1)
+        rows = [
+            models.SensorData(id=i, timestamp=base + timedelta(minutes=i), suhu=math.sin(i / 10),
+                              ph=None if i % 7 == 0 else 7 + math.cos(i / 13))
+            for i in range(1000)
+        ]
+        for method in downsample.METHODS:
+            result = downsample.downsample(rows, 100, method, ["suhu", "ph"])
+            ids = [row.id for row in result]
+            self.assertLessEqual(len(result), 102)
+            self.assertEqual(ids, sorted(set(ids)))
+            self.assertEqual((ids[0], ids[-1]), (0, 999))
+
+    def test_small_page_unchanged(self):
+        rows = [models.SensorData(id=i, timestamp=datetime(2026, 9, 1), suhu=1.0) for i in range(5)]
+        self.assertEqual(downsample.downsample(rows, 5), rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
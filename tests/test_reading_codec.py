@@ -0,0 +1,62 @@
+import math
+import struct
+import unittest
+from datetime import datetime
+
+from app import reading_codec
+
+UID = "3f2504e0-4f89-11d3-9a0c-0305e82c3301"
+
+
+class DecodeRecordsTest(unittest.TestCase):
+    def test_round_trip(self):
+        body = reading_codec.encode_records([
+            (UID, 1752818400, [28.5, 7.25, 5.1, 412.0, 0.125, 15.75]),
+            ("dev-2", 1752818700, [29.0, 7.5, 5.2, 420.5, 0.25, 16.0]),
+        ])
+        self.assertEqual(len(body), 2 * reading_codec.RECORD_SIZE)
+
+        first, second = reading_codec.decode_records(body)
+        self.assertEqual(first["uid"], UID)
+        self.assertEqual(second["uid"], "dev-2")
+        # Jam lokal device, tanpa konversi timezone
+        self.assertEqual(first["timestamp"], datetime(2025, 7, 18, 6, 0, 0))
+        self.assertEqual(second["timestamp"], datetime(2025, 7, 18, 6, 5, 0))
+        self.assertEqual(
+            [first[field] for field in reading_codec.SENSOR_FIELDS],
+            [28.5, 7.25, 5.1, 412.0, 0.125, 15.75]
+        )
+
+    def test_float32_rounded_to_json_value(self):
+        # 7.1 tidak bisa direpresentasikan persis sebagai float32
+        body = reading_codec.encode_record(UID, 0, [28.3, 7.1, 5.0, 400.0, 0.07, 15.2])
+        reading = reading_codec.decode_records(body)[0]
+        self.assertEqual(reading["ph"], 7.1)
+        self.assertEqual(reading["ammonia"], 0.07)
+
+    def test_non_finite_values_become_none(self):
+        body = reading_codec.encode_record(UID, 0, [math.nan, math.inf, -math.inf, 400.0, 0.1, 15.0])
+        reading = reading_codec.decode_records(body)[0]
+        self.assertIsNone(reading["suhu"])
+        self.assertIsNone(reading["ph"])
+        self.assertIsNone(reading["do"])
+        self.assertEqual(reading["tds"], 400.0)
+
+    def test_rejects_partial_record(self):
+        body = reading_codec.encode_record(UID, 0, [1, 2, 3, 4, 5, 6])
+        with self.assertRaises(ValueError):
+            reading_codec.decode_records(body[:-1])
+        with self.assertRaises(ValueError):
+            reading_codec.decode_records(body + b"\0")
+        with self.assertRaises(ValueError):
+            reading_codec.decode_records(b"")
+
+    def test_encode_checks_value_count(self):
+        with self.assertRaises(ValueError):
+            reading_codec.encode_record(UID, 0, [1, 2, 3])
+        with self.assertRaises(struct.error):
+            reading_codec.encode_record(UID, -1, [1, 2, 3, 4, 5, 6])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import math
+import os
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app import models, reading_codec, rollups
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+EPOCH = datetime(2026, 9, 1)
+
+
+def _decoded(*records):
+    # Pembacaan biner (NaN = probe gagal) seperti yang masuk ke ingest
+    body = b"".join(
+        reading_codec.encode_record("dev-1", int((EPOCH - datetime(1970, 1, 1)).total_seconds()) + offset, values)
+        for offset, values in records
+    )
+    return reading_codec.decode_records(body)
+
+
+class SummaryTest(unittest.TestCase):
+    def test_average_uses_field_count(self):
+        bucket = models.SensorRollup1h(bucket=EPOCH, count=10, ph_min=7.0, ph_max=8.0, ph_sum=37.5, ph_count=5)
+        self.assertEqual(rollups.to_summary(bucket)["ph"]["avg"], 7.5)
+
+    def test_all_null_field_has_no_average(self):
+        bucket = models.SensorRollup1h(bucket=EPOCH, count=3, do_sum=None, do_count=0)
+        self.assertIsNone(rollups.to_summary(bucket)["do"]["avg"])
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL (PostgreSQL) not set")
+class ApplyReadingsTest(unittest.TestCase):
+    """
+    apply_readings di PostgreSQL, di schema sementara dalam satu transaksi
+    yang di-rollback di akhir test.
+    """
+
+    def setUp(self):
+        engine = create_engine(TEST_DATABASE_URL)
+        self.addCleanup(engine.dispose)
+        self.conn = engine.connect()
+        self.addCleanup(self.conn.close)
+        transaction = self.conn.begin()
+        self.addCleanup(transaction.rollback)
+        self.conn.execute(text("CREATE SCHEMA rollup_test"))
+        self.conn.execute(text("SET LOCAL search_path TO rollup_test"))
+        models.Base.metadata.create_all(self.conn, tables=[
+            models.User.__table__, models.Device.__table__,
+            *(model.__table__ for model, _, _ in rollups.RESOLUTIONS.values())
+        ])
+        self.device_id = self.conn.execute(
+            text("INSERT INTO devices (uid) VALUES ('dev-1') RETURNING id")
+        ).scalar()
+        self.db = Session(bind=self.conn)
+
+    def _apply(self, readings):
+        rows = [
+            {"device_id": self.device_id, "timestamp": reading["timestamp"],
+             **{field: reading[field] for field in models.SENSOR_FIELDS}}
+            for reading in readings
+        ]
+        rollups.apply_readings(self.db, rows)
+
+    def _hour(self):
+        return rollups.query_rollups(self.db, self.device_id, "1h", EPOCH, EPOCH + timedelta(hours=1))[0]
+
+    def test_nan_field_does_not_change_average(self):
+        # Insert pertama lalu merge ke bucket yang sama
+        self._apply(_decoded((0, [28, 7.0, 5, 400, 0.1, 15]), (10, [28, math.nan, 5, 400, 0.1, 15])))
+        self._apply(_decoded((20, [28, math.nan, 5, 400, 0.1, 15]), (30, [28, 8.0, 5, 400, 0.1, 15])))
+        summary = self._hour()
+        self.assertEqual(summary["count"], 4)
+        self.assertEqual(summary["ph"], {"min": 7.0, "max": 8.0, "avg": 7.5})
+        self.assertEqual(summary["suhu"]["avg"], 28.0)
+
+    def test_all_nan_field_stays_null_after_merge(self):
+        self._apply(_decoded((0, [28, 7.0, math.nan, 400, 0.1, 15])))
+        self._apply(_decoded((10, [28, 7.0, math.nan, 400, 0.1, 15])))
+        self.assertEqual(self._hour()["do"], {"min": None, "max": None, "avg": None})
+        self.assertIsNone(self.db.query(models.SensorRollup1h.do_sum).scalar())
+
+
+if __name__ == "__main__":
+    unittest.main()
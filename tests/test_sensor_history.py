@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app import models, sensor_history
+
+BASE = datetime(2026, 9, 1)
+
+
+class CursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        row = models.SensorData(id=42, timestamp=datetime(2026, 9, 1, 6, 30, 15, 250000))
+        for direction in ("next", "prev"):
+            for descending in (True, False):
+                value = sensor_history.encode_cursor(row, direction, descending)
+                self.assertNotIn("=", value)
+                self.assertEqual(
+                    sensor_history.decode_cursor(value, descending),
+                    (row.timestamp, 42, direction, descending)
+                )
+
+    def test_rejects_other_sort_dir(self):
+        value = sensor_history.encode_cursor(models.SensorData(id=1, timestamp=BASE), "next", True)
+        with self.assertRaises(HTTPException) as raised:
+            sensor_history.decode_cursor(value, False)
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_rejects_garbage(self):
+        for value in ("", "not-a-cursor", "eyJ0IjoxfQ"):
+            with self.assertRaises(HTTPException) as raised:
+                sensor_history.decode_cursor(value, True)
+            self.assertEqual(raised.exception.status_code, 400)
+
+
+class KeysetPagingTest(unittest.TestCase):
+    """
+    fetch_page terhadap SQLite in-memory (tanpa arsip). sensor_data dibuat
+    tanpa unique (device_id, timestamp), seperti tabel terpartisi lama
+    sebelum constraint dipasang (app/compact_sensor_data.py), sehingga ada
+    banyak baris dengan timestamp sama dan id menjadi pemecah seri.
+    """
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        models.Base.metadata.create_all(engine, tables=[models.SensorArchive.__table__])
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"""
+                CREATE TABLE sensor_data (
+                    id INTEGER PRIMARY KEY, device_id INTEGER, timestamp DATETIME,
+                    {", ".join(f'"{field}" FLOAT' for field in models.SENSOR_FIELDS)}
+                )
+                """
+            ))
+        self.db = Session(engine)
+        self.addCleanup(self.db.close)
+        # Tiga baris per timestamp, id tidak searah dengan timestamp
+        rows = []
+        for i in range(12):
+            for j in range(3):
+                rows.append(models.SensorData(
+                    id=100 - 3 * i + j, device_id=1,
+                    timestamp=BASE + timedelta(minutes=i), suhu=float(i)
+                ))
+        rows.append(models.SensorData(id=500, device_id=2, timestamp=BASE, suhu=0.0))
+        self.db.add_all(rows)
+        self.db.commit()
+
+    def _keys(self, rows):
+        return [(row.timestamp, row.id) for row in rows]
+
+    def _walk(self, descending, limit):
+        # Cursor selalu lewat encode/decode, seperti header X-Next-Cursor
+        pages = []
+        cursor = None
+        while True:
+            rows, next_cursor, _ = sensor_history.fetch_page(self.db, 1, None, None, limit, descending, cursor)
+            pages.append(self._keys(rows))
+            if not next_cursor:
+                return pages
+            cursor = sensor_history.decode_cursor(next_cursor, descending)
+
+    def test_next_pages_cover_all_rows_once(self):
+        for descending in (True, False):
+            expected = sorted(
+                self._keys(self.db.query(models.SensorData).filter(models.SensorData.device_id == 1)),
+                reverse=descending
+            )
+            for limit in (1, 2, 4, 5, 36, 50):
+                pages = self._walk(descending, limit)
+                self.assertEqual([key for page in pages for key in page], expected, (descending, limit))
+                self.assertTrue(all(len(page) == limit for page in pages[:-1]))
+
+    def test_prev_returns_previous_page(self):
+        limit = 5
+        first, next_cursor, prev_cursor = sensor_history.fetch_page(self.db, 1, None, None, limit, True)
+        self.assertIsNone(prev_cursor)
+        second, _, prev_cursor = sensor_history.fetch_page(
+            self.db, 1, None, None, limit, True, sensor_history.decode_cursor(next_cursor, True)
+        )
+        back, _, before = sensor_history.fetch_page(
+            self.db, 1, None, None, limit, True, sensor_history.decode_cursor(prev_cursor, True)
+        )
+        self.assertEqual(self._keys(back), self._keys(first))
+        self.assertIsNone(before)
+        self.assertTrue(set(self._keys(first)).isdisjoint(self._keys(second)))
+
+    def test_range_is_inclusive(self):
+        start, end = BASE + timedelta(minutes=2), BASE + timedelta(minutes=4)
+        rows, next_cursor, _ = sensor_history.fetch_page(self.db, 1, start, end, 100, False)
+        self.assertIsNone(next_cursor)
+        self.assertEqual(len(rows), 9)
+        self.assertEqual(rows[0].timestamp, start)
+        self.assertEqual(rows[-1].timestamp, end)
+
+
+if __name__ == "__main__":
+    unittest.main()
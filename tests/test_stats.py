@@ -0,0 +1,99 @@
+import statistics
+import unittest
+
+import numpy as np
+
+from app import stats
+
+
+def reference_rolling(values, index, steps, size):
+    # Jendela bergulir dengan loop biasa: titik ke-i = langkah i-size+1 .. i
+    result = {"mean": [], "stddev": [], "min": [], "max": []}
+    for i in range(steps):
+        window = [
+            value for value, step in zip(values, index)
+            if i - size < step <= i and not np.isnan(value)
+        ]
+        result["mean"].append(statistics.fmean(window) if window else None)
+        result["stddev"].append(statistics.stdev(window) if len(window) > 1 else None)
+        result["min"].append(min(window) if window else None)
+        result["max"].append(max(window) if window else None)
+    return result
+
+
+class RollingTest(unittest.TestCase):
+    def assertSeriesEqual(self, actual, expected, places=9):
+        self.assertEqual(len(actual), len(expected))
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            if e is None:
+                self.assertIsNone(a, i)
+            else:
+                self.assertAlmostEqual(a, e, places=places, msg=i)
+
+    def _check(self, values, index, steps, size, places=9):
+        series = stats.Series(values, np.ones(len(values)))
+        result = stats._rolling(series, index, steps, size)
+        expected = reference_rolling(values.tolist(), index.tolist(), steps, size)
+        for name in ("mean", "stddev", "min", "max"):
+            self.assertSeriesEqual(result[name], expected[name], places)
+
+    def test_matches_plain_loop(self):
+        rng = np.random.default_rng(11)
+        index = np.sort(rng.integers(0, 60, 500))
+        # Langkah 20-29 kosong
+        index = index[(index < 20) | (index >= 30)]
+        values = rng.normal(28, 1.5, len(index))
+        values[rng.random(len(index)) < 0.1] = np.nan
+        for size in (1, 3, 12, 100):
+            self._check(values, index, 60, size)
+
+    def test_single_reading_has_no_stddev(self):
+        result = stats._rolling(stats.Series(np.array([7.0]), np.ones(1)), np.array([2]), 4, 2)
+        self.assertEqual(result["mean"], [None, None, 7.0, 7.0])
+        self.assertEqual(result["stddev"], [None, None, None, None])
+
+    def test_small_spread_on_large_level(self):
+        # Varians kecil dibanding nilainya tidak boleh hilang karena cancellation
+        rng = np.random.default_rng(13)
+        index = np.repeat(np.arange(50), 10)
+        values = 1e6 + rng.normal(0, 1e-3, len(index))
+        series = stats.Series(values, np.ones(len(values)))
+        result = stats._rolling(series, index, 50, 3)
+        expected = reference_rolling(values.tolist(), index.tolist(), 50, 3)
+        for actual, wanted in zip(result["stddev"], expected["stddev"]):
+            self.assertAlmostEqual(actual / wanted, 1.0, places=6)
+
+    def test_rollup_series_weighted_mean_without_stddev(self):
+        # Dua jam: rata-rata 2 dari 3 pembacaan dan 5 dari 1 pembacaan
+        series = stats.Series(np.array([2.0, 5.0]), np.array([3.0, 1.0]),
+                              np.array([1.0, 5.0]), np.array([3.0, 5.0]))
+        result = stats._rolling(series, np.array([0, 1]), 2, 2)
+        self.assertEqual(result["mean"], [2.0, 2.75])
+        self.assertEqual(result["stddev"], [None, None])
+        self.assertEqual(result["min"], [1.0, 1.0])
+        self.assertEqual(result["max"], [3.0, 5.0])
+
+
+class SummaryTest(unittest.TestCase):
+    def test_matches_numpy(self):
+        rng = np.random.default_rng(17)
+        values = rng.normal(7, 0.4, 300)
+        values[::9] = np.nan
+        result = stats._summary(stats.Series(values, np.ones(len(values))), 6.5, 7.5)
+        valid = values[~np.isnan(values)]
+        self.assertEqual(result["count"], len(valid))
+        self.assertAlmostEqual(result["mean"], valid.mean())
+        self.assertAlmostEqual(result["stddev"], np.std(valid, ddof=1))
+        for p in stats.PERCENTILES:
+            self.assertAlmostEqual(result[f"p{p}"], np.percentile(valid, p))
+        self.assertAlmostEqual(result["time_in_range"], np.mean((valid >= 6.5) & (valid <= 7.5)))
+
+    def test_empty(self):
+        result = stats._summary(stats.Series(np.array([np.nan]), np.ones(1)), None, None)
+        self.assertEqual(result["count"], 0)
+        self.assertIsNone(result["mean"])
+        self.assertIsNone(result["time_in_range"])
+
+
+if __name__ == "__main__":
+    unittest.main()